@@ -0,0 +1,119 @@
+""" Benchmarks `CommandDispatcher.dispatch` without connecting to Discord.
+
+Usage:
+    python benchmarks/bench_dispatch.py [-n MESSAGES] [--handlers N] [--commands N] [--concurrent]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dyphanbot.dispatcher import CommandDispatcher
+from dyphanbot.guildsettings import GuildSettingsStore
+from dyphanbot.metrics import Metrics
+from dyphanbot.ratelimit import RateLimiter
+
+BOT_ID = 123456789012345678
+
+class FakeUser(object):
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+    def mentioned_in(self, message):
+        return self.mention in message.content
+
+class FakeGuild(object):
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.me = FakeUser(BOT_ID)
+
+class FakeMessage(object):
+    def __init__(self, message_id, content, guild):
+        self.id = message_id
+        self.content = content
+        self.guild = guild
+        self.author = FakeUser(1)
+
+class FakeBotController(object):
+    def __init__(self):
+        self.settings = GuildSettingsStore({"1": {"prefix": "!"}})
+
+    def _get_record(self, guild):
+        return self.settings.get(guild.id)
+
+    async def _process_command(self, message, cmd, args, prefix=None):
+        return None
+
+class FakeBot(object):
+    def __init__(self):
+        self.user = FakeUser(BOT_ID)
+        self.bot_controller = FakeBotController()
+        self.metrics = Metrics()
+        self.ratelimiter = RateLimiter()
+
+    def is_botmaster(self, user):
+        return False
+
+def make_command():
+    async def command(client, message, args):
+        return None
+    return command
+
+def make_handler():
+    async def handler(client, message):
+        return None
+    return handler
+
+def build_dispatcher(bot, handler_count, command_count, concurrent=False):
+    dispatcher = CommandDispatcher(bot, {"concurrent": concurrent})
+    for i in range(command_count):
+        dispatcher.add_command(f"cmd{i}", make_command())
+    for i in range(handler_count):
+        dispatcher.add_message_handler(make_handler(), raw=(i % 2 == 0))
+    return dispatcher
+
+def build_messages(count, command_count):
+    guild = FakeGuild(1)
+    mention = f"<@{BOT_ID}>"
+    templates = [
+        lambda: "just chatting about nothing in particular",
+        lambda: "lol",
+        lambda: f"!cmd{random.randrange(command_count)} some args here",
+        lambda: f"{mention} cmd{random.randrange(command_count)} more args",
+    ]
+    # roughly what a busy guild looks like: mostly plain chatter
+    weights = [70, 20, 7, 3]
+    return [FakeMessage(i, random.choices(templates, weights)[0](), guild)
+            for i in range(count)]
+
+async def run(dispatcher, messages):
+    start = time.perf_counter()
+    for message in messages:
+        await dispatcher.dispatch(message)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--messages", type=int, default=200000)
+    parser.add_argument("--handlers", type=int, default=8)
+    parser.add_argument("--commands", type=int, default=50)
+    parser.add_argument("--concurrent", action="store_true",
+                        help="run message handlers concurrently")
+    args = parser.parse_args()
+
+    random.seed(0)
+    bot = FakeBot()
+    dispatcher = build_dispatcher(bot, args.handlers, args.commands, args.concurrent)
+    messages = build_messages(args.messages, args.commands)
+    elapsed = asyncio.run(run(dispatcher, messages))
+    print("dispatched {} messages in {:.3f}s ({:.2f} us/message)".format(
+        len(messages), elapsed, elapsed / len(messages) * 1e6))
+
+if __name__ == '__main__':
+    main()
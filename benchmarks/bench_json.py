@@ -0,0 +1,85 @@
+""" Benchmarks DyphanBot's JSON codec against the `json` module on
+    `guildsettings.json`-sized documents.
+
+Usage:
+    python benchmarks/bench_json.py [--guilds N] [-n ROUNDS] [--file PATH]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dyphanbot.utils import JSONCodec
+
+def build_settings(guild_count):
+    """ Builds a `guildsettings.json`-like document, with some guilds also
+        carrying Moderation-style settings
+    """
+    guilds = {}
+    for i in range(guild_count):
+        guild_id = str(100000000000000000 + i)
+        settings = {
+            "prefix": random.choice([None, "!", "?", "d!", "ñ"]),
+            "ext-prefix": random.choice(["+", "$"]),
+            "disabled_commands": random.sample(["help", "plugins", "echo", "play", "ban"], 2),
+            "roles": [str(random.getrandbits(60)) for _ in range(random.randrange(1, 6))],
+        }
+        if i % 3 == 0:
+            settings["farewell"] = {
+                "enabled": True,
+                "message": ["Goodbye, {user}! 👋", "{user} left {guild}."],
+                "channel_id": str(random.getrandbits(60)),
+            }
+        guilds[guild_id] = settings
+    return {"guilds": guilds}
+
+def timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, default=5000)
+    parser.add_argument("-n", "--rounds", type=int, default=50)
+    parser.add_argument("--file", help="benchmark an existing JSON file instead")
+    args = parser.parse_args()
+
+    random.seed(0)
+    if args.file:
+        with open(args.file, 'rb') as fd:
+            data = json.loads(fd.read())
+    else:
+        data = build_settings(args.guilds)
+
+    stdlib = JSONCodec(native=False)
+    native = JSONCodec()
+    text = stdlib.dumps(data)
+    compact = stdlib.dumps_compact(data)
+    print("document: {:.1f} KiB ({:.1f} KiB compact); codec: {}".format(
+        len(text.encode()) / 1024, len(compact.encode()) / 1024, native.name))
+
+    # file output must not depend on the codec
+    assert native.dumps(data) == text
+    assert native.loads(text) == data
+    assert native.loads(native.dumps_compact(data)) == data
+
+    cases = [
+        ("loads", lambda codec: lambda: codec.loads(text)),
+        ("dumps (file)", lambda codec: lambda: codec.dumps(data)),
+        ("dumps_compact", lambda codec: lambda: codec.dumps_compact(data)),
+    ]
+    print("{:<16}{:>12}{:>12}{:>10}".format("", "json", native.name, "speedup"))
+    for name, case in cases:
+        base = timeit(case(stdlib), args.rounds)
+        fast = timeit(case(native), args.rounds)
+        print("{:<16}{:>10.3f}ms{:>10.3f}ms{:>9.1f}x".format(name, base * 1e3, fast * 1e3, base / fast))
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,75 @@
 import os
+import asyncio
 import logging
 import pathlib
 import argparse
 
-from dyphanbot.dyphanbot import DyphanBot
+from dyphanbot.dyphanbot import DyphanBot, ShardedDyphanBot
+from dyphanbot.cluster import ClusterCoordinator
+from dyphanbot.storage.migrate import JSONMigration
+from dyphanbot.startupprofile import StartupProfiler
 
 def main(args):
-    dyphanbot = DyphanBot(**args)
+    command = args.pop('command')
+    profile_path = args.pop('profile_startup')
+    if command == "cluster":
+        args.pop('sharded')
+        return ClusterCoordinator(**args).run()
+    if command == "migrate":
+        return JSONMigration(**args).run()
+
+    bot_class = ShardedDyphanBot if args.pop('sharded') else DyphanBot
+    if profile_path:
+        return profile_startup(bot_class, profile_path, **args)
+    dyphanbot = bot_class(**args)
     dyphanbot.run()
 
+def profile_startup(bot_class, profile_path, **args):
+    """ Starts the bot without connecting to Discord, timing each phase of
+        its startup, then writes the profile and exits
+    """
+    profiler = StartupProfiler()
+    dyphanbot = bot_class(profiler=profiler, **args)
+    asyncio.run(dyphanbot.pluginloader.start_plugins())
+    profiler.finish()
+    dyphanbot.data.close()
+
+    print(profiler.write(profile_path), end="")
+    print("Wrote the startup profile to '{0}' and '{1}'.".format(
+        profile_path, os.path.splitext(profile_path)[0] + ".txt"))
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbose", help="shows debug log messages",
                         action="store_true")
     parser.add_argument("-d", "--dev-mode", help="halt when plugin exception occurs",
                         action="store_true")
+    parser.add_argument("-s", "--sharded", help="run multiple shards (see the `sharding` config)",
+                        action="store_true")
+    parser.add_argument("--profile-startup", metavar="PATH", nargs="?", const="startup_profile.json",
+                        help="time each startup phase, plugin import and plugin init, write the "
+                             "profile as JSON to PATH (default: startup_profile.json) and a report "
+                             "next to it, then exit without connecting")
     parser.add_argument("-c", "--config", dest="config_path", type=pathlib.Path,
                         help="path to config file (will search default paths if not specified)")
+
+    subparsers = parser.add_subparsers(dest="command")
+    cluster_parser = subparsers.add_parser(
+        "cluster", help="run shards across multiple worker processes",
+        description="Runs the bot's shards across multiple worker processes. "
+                    "The coordinator only serves the cluster's /health and /metrics; "
+                    "workers don't start the web API, so its endpoints (including "
+                    "plugin endpoints and OAuth login) aren't available in a cluster.")
+    cluster_parser.add_argument("-w", "--workers", type=int,
+                                help="number of worker processes (default: `cluster.workers` config or CPU count)")
+    cluster_parser.add_argument("--shard-count", type=int,
+                                help="total number of shards (default: one per worker)")
+    cluster_parser.add_argument("--host", help="address the cluster API listens on")
+    cluster_parser.add_argument("--port", type=int, help="port the cluster API listens on")
+    cluster_parser.add_argument("--fake-gateway", action="store_true",
+                                help="feed workers synthetic events instead of connecting to Discord")
+    migrate_parser = subparsers.add_parser("migrate", help="import JSON data files into the configured storage backend")
+    migrate_parser.add_argument("--overwrite", action="store_true",
+                                help="replace data that already exists in the backend")
     args = vars(parser.parse_args())
     main(args)
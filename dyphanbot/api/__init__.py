@@ -9,8 +9,15 @@ from aiohttp_session import setup as setup_session, get_session
 from aiohttp_session.cookie_storage import EncryptedCookieStorage
 import discord
 
+from dyphanbot.utils import json_codec
+
 from . import routes
 
+def json_response(data, **kwargs):
+    """ `web.json_response()` encoded with DyphanBot's JSON codec """
+    kwargs.setdefault('dumps', json_codec.dumps_compact)
+    return web.json_response(data, **kwargs)
+
 class APIUser(discord.User):
     """ Represents the authenticated user """
     __slots__ = ('_data', '_dyphanbot', 'name', 'id', 'discriminator',
@@ -62,6 +69,8 @@ class WebAPI(object):
         self.config = config
 
         self.plugin_subapps = {}
+        self._subapp_startups = {}
+        self._loop = None
 
         if not self._check_config():
             self._disabled = True
@@ -91,8 +100,73 @@ class WebAPI(object):
         return True
 
     def register_plugin(self, plugin_name, app):
-        """ Resgisters plugin as a subapp """
+        """ Resgisters plugin as a subapp, replacing the plugin's previous
+            one (e.g. when it's reloaded)
+
+        Once the server is running, the new subapp is started and the one
+        it replaces is shut down on the event loop. Can be called from any
+        thread.
+        """
+        plugin_name = plugin_name.lower()
+        old_app = self.plugin_subapps.get(plugin_name)
         self.plugin_subapps[plugin_name] = app
+        if self._loop is not None and old_app is not app:
+            self._loop.call_soon_threadsafe(self._swap_subapps, old_app, app)
+
+    def _swap_subapps(self, old_app, app):
+        self.start_subapp(app)
+        if old_app is not None and old_app in self._subapp_startups:
+            asyncio.ensure_future(self.stop_subapp(old_app))
+
+    def start_subapp(self, app):
+        """ Freezes a subapp and runs its `on_startup` signal, once
+
+        Must be called on the event loop.
+
+        Returns:
+            :obj:`asyncio.Future`: Done once the subapp has started
+
+        """
+        startup = self._subapp_startups.get(app)
+        if startup is None:
+            app.freeze()
+            startup = self._subapp_startups[app] = asyncio.ensure_future(app.startup())
+            startup.add_done_callback(self._check_startup)
+        return startup
+
+    def _check_startup(self, startup):
+        if not startup.cancelled() and startup.exception() is not None:
+            self.logger.error("A plugin's web app failed to start.", exc_info=startup.exception())
+
+    async def stop_subapp(self, app):
+        """ Runs a started subapp's `on_shutdown` and `on_cleanup` signals """
+        startup = self._subapp_startups.pop(app, None)
+        if startup is None:
+            return
+        try:
+            try:
+                await startup
+                await app.shutdown()
+            finally:
+                await app.cleanup()
+        except Exception:
+            self.logger.exception("A plugin's web app failed to shut down.")
+
+    async def plugin_proxy(self, request):
+        """ Routes `/plugin/<name>/<path>` to the plugin's subapp
+
+        The subapps are looked up on every request instead of being added
+        to the server's app, which can't be changed once it's running, so
+        plugins can be reloaded or loaded on first use. Requests are handled
+        by the subapp itself, so they go through its middlewares, and its
+        signals are sent by `start_subapp()` and `stop_subapp()`.
+        """
+        plugin_app = self.plugin_subapps.get(request.match_info['plugin'].lower())
+        if plugin_app is None:
+            raise web.HTTPNotFound()
+        await asyncio.shield(self.start_subapp(plugin_app))
+        rel_url = request.rel_url.with_path("/" + request.match_info['tail']).with_query(request.rel_url.query)
+        return await plugin_app._handle(request.clone(rel_url=rel_url))
     
     async def get_user(self, request):
         session = await get_session(request)
@@ -134,6 +208,7 @@ class WebAPI(object):
         for ws in set(app.get('websockets', [])):
             await ws.close(code=WSCloseCode.GOING_AWAY,
                            message="Server shutdown: Closing websockets.")
+        await asyncio.gather(*(self.stop_subapp(subapp) for subapp in list(self._subapp_startups)))
     
     async def _run(self, app, host, port):
         try:
@@ -141,6 +216,8 @@ class WebAPI(object):
             await runner.setup()
             site = web.TCPSite(runner, host, port)
             await site.start()
+            for subapp in list(self.plugin_subapps.values()):
+                self.start_subapp(subapp)
         except (web.GracefulExit, KeyboardInterrupt):
             await runner.cleanup()
     
@@ -151,7 +228,7 @@ class WebAPI(object):
             try:
                 return await handler(request)
             except web.HTTPException as err:
-                return web.json_response({
+                return json_response({
                     "error": {
                         "status_code": err.status_code,
                         "reason": err.reason,
@@ -169,6 +246,7 @@ class WebAPI(object):
         port = self.config.get('port', "3580")
         
         loop = self.dyphanbot.loop or asyncio.get_event_loop()
+        self._loop = loop
 
         app = web.Application(logger=self.logger, middlewares=[self.error_middleware()])
         fernet_key = fernet.Fernet.generate_key()
@@ -177,9 +255,8 @@ class WebAPI(object):
         app.add_routes(self.api_router.get_routes())
         app.on_shutdown.append(self.on_shutdown)
 
-        # register all plugin subapps
-        for plugin_name, plugin_app in self.plugin_subapps.items():
-            app.add_subapp(f"/plugin/{plugin_name.lower()}/", plugin_app)
+        # route requests to plugin subapps
+        app.router.add_route('*', "/plugin/{plugin}/{tail:.*}", self.plugin_proxy)
 
         loop.create_task(self._run(app, host, port))
         self.logger.info(f"Web API server now listening at {host}:{port}")
\ No newline at end of file
@@ -1,10 +1,11 @@
-import json
 from aiohttp import web
 from aiohttp_session import get_session
 
 import discord
 
 import dyphanbot.api as api
+from dyphanbot.exceptions import PluginReloadError
+from dyphanbot.utils import json_codec
 
 class APIRouter(object):
     """ Handles main API routes """
@@ -18,11 +19,14 @@ class APIRouter(object):
         return [
             web.get("/", self.index),
             web.get("/plugins", self.list_plugins),
+            web.post("/plugins/{plugin}/reload", self.reload_plugin),
             web.get("/commands", self.list_commands),
             web.get("/guilds", self.list_guilds),
             web.get("/guilds/user", self.user_guilds),
             web.get("/guilds/bot", self.bot_guilds),
             web.get("/guilds/mutual", self.mutual_guilds),
+            web.get("/cache", self.cache_stats),
+            web.get("/metrics", self.metrics),
             web.get("/oauth", self.oauth)
         ]
     
@@ -30,7 +34,7 @@ class APIRouter(object):
         """ Responds with the bot's basic info """
         release_info = self.dyphanbot.release_info()
         user = await self.api_client.get_user(request)
-        return web.json_response({
+        return api.json_response({
             "name": release_info['name'],
             "version": release_info['version'],
             "bot_user": str(self.dyphanbot.user) if self.dyphanbot.user else None,
@@ -47,7 +51,7 @@ class APIRouter(object):
             auth_client.params['redirect_uri'] = redirect_uri or str(request.url.with_query(''))
             
             if auth_client.shared_key not in request.url.query:
-                return web.json_response({
+                return api.json_response({
                     "is_authorized": False,
                     "oauth_url": auth_client.get_authorize_url(
                         scope="identify email guilds"
@@ -60,7 +64,7 @@ class APIRouter(object):
             _, user = await auth_client.user_info()
             session['user'] = user
         
-        return web.json_response({
+        return api.json_response({
             "is_authorized": True,
             "user_info": user
         })
@@ -69,21 +73,34 @@ class APIRouter(object):
         """ Responds with a list of loaded plugins """
         plugins = self.dyphanbot.pluginloader.get_plugins()
         plugin_list = [plugin_name.lower() for plugin_name in plugins.keys()]
-        return web.json_response({
+        return api.json_response({
             "plugins": plugin_list
         })
     
+    async def reload_plugin(self, request):
+        """ Reloads a plugin from its source (botmaster only) """
+        await self.api_client.require_perm(request, "botmaster")
+        try:
+            result = await self.dyphanbot.pluginloader.reload_plugin(request.match_info['plugin'])
+        except PluginReloadError as err:
+            raise web.HTTPBadRequest(reason=str(err))
+        return api.json_response({
+            "reloaded": result
+        })
+    
     async def list_commands(self, request):
         commands = self.dyphanbot.commands
         user = await self.api_client.get_user(request)
         listing = {}
 
+        help_catalog = self.dyphanbot.bot_controller.help_catalog
+
         for cmd_name, cmd_func in commands.items():
             plugin = cmd_func.__dict__.get('plugin')
-            pname  = type(plugin).__name__ if plugin else "(etc)"
+            pname  = (getattr(plugin, "name", None) or type(plugin).__name__) if plugin else "(etc)"
 
             if not listing.get(pname):
-                phelp  = await plugin.help(None, [pname]) if plugin else {}
+                phelp  = (await help_catalog.get_summary(pname, plugin) or {}) if plugin else {}
                 listing[pname] = {
                     "title": phelp.get("title"),
                     "shorthelp": phelp.get("shorthelp"),
@@ -106,7 +123,7 @@ class APIRouter(object):
             if user and user.bot_master:
                 listing[pname]["commands"][cmd_name]["botmaster"] = cmd_botmaster
         
-        return web.json_response(listing)
+        return api.json_response(listing)
 
     async def list_guilds(self, request):
         await self.api_client.require_auth(request)
@@ -114,10 +131,10 @@ class APIRouter(object):
         for func in [self.mutual_guilds, self.bot_guilds, self.user_guilds]:
             try:
                 resp = await func(request)
-                returned[func.__name__] = json.loads(resp.text)[func.__name__]
+                returned[func.__name__] = json_codec.loads(resp.text)[func.__name__]
             except Exception:
                 pass
-        return web.json_response(returned)
+        return api.json_response(returned)
 
     async def mutual_guilds(self, request):
         user = await self.api_client.require_auth(request)
@@ -133,7 +150,7 @@ class APIRouter(object):
             guild_dict['permissions_user'] = member.guild_permissions.value
             guild_dict['owner'] = str(guild.owner_id) == str(member.id)
             mutual_guilds.append(guild_dict)
-        return web.json_response({
+        return api.json_response({
             "mutual_guilds": mutual_guilds
         })
 
@@ -148,7 +165,7 @@ class APIRouter(object):
                 guild_dict[k] = getattr(guild, k)
             guild_dict['permissions'] = guild.me.guild_permissions.value
             bot_guilds.append(guild_dict)
-        return web.json_response({
+        return api.json_response({
             "bot_guilds": bot_guilds
         })
 
@@ -156,6 +173,27 @@ class APIRouter(object):
         auth_client = self.api_client.discord_oauth
         user = await self.api_client.require_auth(request)
         guilds = await auth_client.request('GET', 'users/@me/guilds')
-        return web.json_response({
+        return api.json_response({
             "user_guilds": guilds
         })
+
+    async def cache_stats(self, request):
+        await self.api_client.require_perm(request, "botmaster")
+        guild_id = request.query.get("guild")
+        if guild_id is not None and not guild_id.isdigit():
+            raise web.HTTPBadRequest(reason="'guild' must be a guild ID")
+        report = self.dyphanbot.cache_policy.report(
+            self.dyphanbot, int(guild_id) if guild_id else None)
+        for guild in report["guilds"]:
+            guild["id"] = str(guild["id"])
+        return api.json_response({
+            "cache": report
+        })
+
+    async def metrics(self, request):
+        await self.api_client.require_perm(request, "botmaster")
+        return api.json_response({
+            "counters": self.dyphanbot.metrics.snapshot(),
+            "shards": self.dyphanbot.shard_stats(),
+            "rate_limits": self.dyphanbot.ratelimiter.stats()
+        })
@@ -1,34 +1,42 @@
+import asyncio
 import logging
 import discord
 
+from dyphanbot.exceptions import PluginReloadError
+from dyphanbot.guildsettings import GuildSettingsStore
+from dyphanbot.helpcatalog import HelpCatalog
+
 class BotController:
     def __init__(self, dyphanbot):
         self.logger = logging.getLogger(__name__)
         self.dyphanbot = dyphanbot
         self._guildsettings_fn = "guildsettings.json"
-        self.guildsettings = self.dyphanbot.data.load_json(self._guildsettings_fn, {})
+        self.guild_settings = self.dyphanbot.data.guild_settings(self._guildsettings_fn)
+        self.settings = GuildSettingsStore(self.guild_settings)
+        self.logger.debug("Guild settings: %s", self.guild_settings.stats())
+        self.help_catalog = HelpCatalog(dyphanbot)
+        self.guild_settings.add_listener(self._settings_changed)
+
+    def _settings_changed(self, guild_id):
+        """ Called when guild settings are reloaded or dropped from memory """
+        if guild_id is None:
+            # possibly changed by another process
+            self.help_catalog.invalidate()
 
-    def _save_settings(self, data):
-        return self.dyphanbot.data.save_json(self._guildsettings_fn, data)
+    def _get_record(self, guild):
+        """ Returns the guild's :obj:`dyphanbot.guildsettings.GuildSettings` """
+        return self.settings.get(guild.id)
 
     def _get_prefix(self, guild):
-        guild_id = str(guild.id)
-        prefix = None
-        if self.guildsettings.get(guild_id):
-            prefix = self.guildsettings[guild_id].get("prefix")
-        return prefix
+        return self.settings.get(guild.id).prefix
 
     def _get_ext_prefix(self, guild):
-        guild_id = str(guild.id)
-        ext_prefix = '+'
-        if self.guildsettings.get(guild_id):
-            ext_prefix = self.guildsettings[guild_id].get("ext-prefix", '+')
-        return ext_prefix
+        return self.settings.get(guild.id).ext_prefix
     
     def _get_settings_for_guild(self, guild, key=None):
-        guild_id = str(guild.id)
-        if guild_id in self.guildsettings:
-            return self.guildsettings[guild_id].get(key, None) if key else self.guildsettings[guild_id]
+        settings = self.guild_settings.get(guild.id)
+        if settings is not None:
+            return settings.get(key, None) if key else settings
         return None
 
     async def _process_command(self, message, cmd, args, prefix=None):
@@ -38,18 +46,25 @@ class BotController:
         general_cmds = ['help', 'commands', 'plugins']
         if cmd.startswith('_') or (prefix and cmd not in general_cmds):
             return None
-        try:
-            return await getattr(self, cmd)(message, args)
-        except AttributeError:
+        handler = getattr(self, cmd, None)
+        if not asyncio.iscoroutinefunction(handler):
             return None
+        return await handler(message, args)
 
     async def plugins(self, message, args):
         """ Sends an embed listing available plugins """
+        prefix = self._get_prefix(message.guild)
+        embed = await self.help_catalog.get_embed(
+            ("plugins", prefix), lambda: self._render_plugins(message))
+        await message.channel.send(embed=embed)
+
+    async def _render_plugins(self, message):
         plugins = self.dyphanbot.pluginloader.get_plugins()
         pliststr = ""
         unlisted_count = 0
         for pname, plugin in plugins.items():
             try:
+                plugin = await self.dyphanbot.pluginloader.aload_plugin(plugin)
                 phelp = await plugin.help(message, [pname]) # pass default args since we only want the title and short description
                 if 'unlisted' in phelp and phelp['unlisted']:
                     unlisted_count += 1
@@ -75,48 +90,20 @@ class BotController:
         if unlisted_count > 0:
             pliststr += "\nUnlisted plugins: {0}".format(unlisted_count)
 
-        embed = discord.Embed(
+        return discord.Embed(
             title="Available Plugins",
             description=pliststr,
             colour=discord.Colour(0x7289DA)
         )
-        await message.channel.send(embed=embed)
 
     async def help(self, message, args):
         """ Sends an embed providing general or plugin help """
         plugins = self.dyphanbot.pluginloader.get_plugins()
-        release_info = self.dyphanbot.release_info()
-        version = release_info["version"]
+        guild_prefix = self._get_prefix(message.guild)
         
         if len(args) < 1:
-            prefix = self._get_prefix(message.guild) or "@{0} ".format(self.dyphanbot.user.name)
-            help_txt = "Use the following commands to learn more about how to use {0}.".format(self.dyphanbot.user.name)
-            embed = discord.Embed(
-                title="{0} Help".format(self.dyphanbot.user.name),
-                description=help_txt,
-                colour=discord.Colour(0x7289DA)
-            )
-            embed.add_field(
-                name="`{0}plugins`".format(prefix),
-                value="Lists available plugins that provide help, as well as an optional short description for each plugin.",
-                inline=False
-            )
-            embed.add_field(
-                name="`{0}commands [plugin]`".format(prefix),
-                value="Only lists the plugin's available commands (useful for a general overview of the commands rather than a complete help doc).",
-                inline=False
-            )
-            embed.add_field(
-                name="`{0}help [plugin/command]`".format(prefix),
-                value="Displays more info about the plugin. If a command is specified, displays info about the command's plugin.",
-                inline=False
-            )
-            embed.set_footer(
-                text="Running {0}{1}".format(
-                    release_info["name"],
-                    f" v{version}" if version else ""
-                )
-            )
+            embed = await self.help_catalog.get_embed(
+                ("help", guild_prefix), lambda: self._render_help(guild_prefix))
             await message.channel.send(embed=embed)
         else:
             plugin = None
@@ -130,28 +117,71 @@ class BotController:
             if not plugin:
                 return await message.channel.send("Plugin not found or can't find command's plugin..")
 
+            try:
+                plugin = await self.dyphanbot.pluginloader.aload_plugin(plugin)
+            except ImportError as e:
+                return await message.channel.send("Plugin failed to load... ```py\n{}\n```".format(e))
+
             if not hasattr(plugin, 'help'):
                 await message.channel.send("Plugin provides no help or usage information...")
             else:
                 try:
-                    phelp = await plugin.help(message, args)
-                    embed = discord.Embed(
-                        title=phelp['title'] if 'title' in phelp else type(plugin).__name__,
-                        description=phelp['helptext'] if 'helptext' in phelp else "*N/A*",
-                        colour=phelp['color'] if 'color' in phelp else discord.Colour(0x7289DA)
-                    )
-
-                    if 'sections' in phelp and phelp['sections']:
-                        for section in phelp['sections']:
-                            embed.add_field(
-                                name=section['name'],
-                                value=section['value'],
-                                inline=section['inline'] if 'inline' in section else True
-                            )
-                    
+                    embed = await self.help_catalog.get_embed(
+                        ("plugin", getattr(plugin, "name", None) or type(plugin).__name__, tuple(args), guild_prefix),
+                        lambda: self._render_plugin_help(plugin, message, args))
                     await message.channel.send(embed=embed)
                 except Exception as e:
                     await message.channel.send("Whoops! Something went wrong... ```py\n{}: {}\n```".format(type(e).__name__, e))
+
+    async def _render_help(self, guild_prefix):
+        release_info = self.dyphanbot.release_info()
+        version = release_info["version"]
+        prefix = guild_prefix or "@{0} ".format(self.dyphanbot.user.name)
+        help_txt = "Use the following commands to learn more about how to use {0}.".format(self.dyphanbot.user.name)
+        embed = discord.Embed(
+            title="{0} Help".format(self.dyphanbot.user.name),
+            description=help_txt,
+            colour=discord.Colour(0x7289DA)
+        )
+        embed.add_field(
+            name="`{0}plugins`".format(prefix),
+            value="Lists available plugins that provide help, as well as an optional short description for each plugin.",
+            inline=False
+        )
+        embed.add_field(
+            name="`{0}commands [plugin]`".format(prefix),
+            value="Only lists the plugin's available commands (useful for a general overview of the commands rather than a complete help doc).",
+            inline=False
+        )
+        embed.add_field(
+            name="`{0}help [plugin/command]`".format(prefix),
+            value="Displays more info about the plugin. If a command is specified, displays info about the command's plugin.",
+            inline=False
+        )
+        embed.set_footer(
+            text="Running {0}{1}".format(
+                release_info["name"],
+                f" v{version}" if version else ""
+            )
+        )
+        return embed
+
+    async def _render_plugin_help(self, plugin, message, args):
+        phelp = await plugin.help(message, args)
+        embed = discord.Embed(
+            title=phelp['title'] if 'title' in phelp else getattr(plugin, "name", None) or type(plugin).__name__,
+            description=phelp['helptext'] if 'helptext' in phelp else "*N/A*",
+            colour=phelp['color'] if 'color' in phelp else discord.Colour(0x7289DA)
+        )
+
+        if 'sections' in phelp and phelp['sections']:
+            for section in phelp['sections']:
+                embed.add_field(
+                    name=section['name'],
+                    value=section['value'],
+                    inline=section['inline'] if 'inline' in section else True
+                )
+        return embed
     
     async def commands(self, message, args):
         """ Sends an embed listing available commands in a plugin """
@@ -164,44 +194,35 @@ class BotController:
             return await message.channel.send("Plugin not found.")
         
         pname = args[0]
-        pcmds = []
-        for cmd_name, command in self.dyphanbot.commands.items():
-            if 'plugin' not in command.__dict__ or not command.plugin:
-                continue
+        embed = await self.help_catalog.get_embed(
+            ("commands", pname, None), lambda: self._render_commands(pname))
+        await message.channel.send(embed=embed)
 
-            if pname.strip() == type(command.plugin).__name__:
-                pcmds.append(cmd_name)
+    async def _render_commands(self, pname):
+        pcmds = self.help_catalog.get_commands(pname.strip())
         
         pcmdstr = "Plugin has no available commands."
         if len(pcmds) > 0:
             pcmdstr = ', '.join(["`{0}`".format(x) for x in pcmds])
         
-        embed = discord.Embed(
+        return discord.Embed(
             title="{0} Commands".format(pname),
             description=pcmdstr,
             colour=discord.Colour(0x7289DA)
         )
-        await message.channel.send(embed=embed)
 
     async def prefix(self, message, args):
-        guild_id = str(message.guild.id)
+        guild_id = message.guild.id
+        record = self.settings.get(guild_id)
         if len(args) < 1:
-            prefix = None
-            ext_prefix = '+'
-            if self.guildsettings.get(guild_id):
-                prefix = self.guildsettings[guild_id].get("prefix")
-                ext_prefix = self.guildsettings[guild_id].get("ext-prefix", '+')
             await message.channel.send(
                 "Command prefix: `{0}`\nExtension prefix: `{1}`".format(
-                    prefix if prefix else "<Unset>",
-                    ext_prefix if ext_prefix else "<Unset>"
+                    record.prefix if record.prefix else "<Unset>",
+                    record.ext_prefix if record.ext_prefix else "<Unset>"
                 )
             )
         elif len(args) <= 1 and args[0] == "ext":
-            ext_prefix = '+'
-            if self.guildsettings.get(guild_id):
-                ext_prefix = self.guildsettings[guild_id].get("ext-prefix", '+')
-            await message.channel.send("Extension prefix: `{0}`".format(ext_prefix if ext_prefix else "<Unset>"))
+            await message.channel.send("Extension prefix: `{0}`".format(record.ext_prefix if record.ext_prefix else "<Unset>"))
         else:
             ext_arg = False
             if args[0] == "ext":
@@ -213,40 +234,79 @@ class BotController:
                 args = ' '.join(args[1:])
             else:
                 args = ' '.join(args)
-            if not self.guildsettings.get(guild_id):
-                self.guildsettings[guild_id] = {}
-            if ext_arg and args == self.guildsettings[guild_id].get("prefix"):
+            if ext_arg and args == record.prefix:
                 return await message.channel.send("Extension prefix can't be the same as the command prefix!!")
-            self.guildsettings[guild_id]["ext-prefix" if ext_arg else "prefix"] = args
-            self.guildsettings = self._save_settings(self.guildsettings)
-            await message.channel.send("The {0} prefix for this guild was set to `{1}`".format("extension" if ext_arg else "command", self.guildsettings[guild_id]["ext-prefix" if ext_arg else "prefix"]))
+            self.settings.set(guild_id, "ext-prefix" if ext_arg else "prefix", args)
+            await message.channel.send("The {0} prefix for this guild was set to `{1}`".format("extension" if ext_arg else "command", args))
+
+    async def cache(self, message, args):
+        """ Reports the number of cached objects per guild (botmaster only) """
+        if not self.dyphanbot.is_botmaster(message.author):
+            return None
+        guild_id = int(args[0]) if args and args[0].isdigit() else None
+        report = self.dyphanbot.cache_policy.report(self.dyphanbot, guild_id)
+        guilds = sorted(report["guilds"], key=lambda g: g["bytes"], reverse=True)
+
+        lines = ["Cached messages: {0}/{1} (~{2} KiB)".format(
+                    report["messages"], report["max_messages"], report["messages_bytes"] // 1024),
+                 "Cached users: {0}".format(report["users"]),
+                 "Member cache: {0}".format(', '.join(
+                    [flag for flag, val in report["member_cache_flags"].items() if val]) or "off"),
+                 ""]
+        for guild in guilds[:10]:
+            lines.append("{name} ({id}): {members}/{member_count} members, {channels} channels, "
+                         "{roles} roles, {messages} messages, ~{kib} KiB".format(
+                            kib=guild["bytes"] // 1024, **guild))
+        if len(guilds) > 10:
+            lines.append("...and {0} more guilds".format(len(guilds) - 10))
+        await message.channel.send("```\n{0}\n```".format('\n'.join(lines)))
+
+    async def shards(self, message, args):
+        """ Reports each shard's latency, event rate and reconnects
+            (botmaster only)
+        """
+        if not self.dyphanbot.is_botmaster(message.author):
+            return None
+        lines = []
+        for shard in self.dyphanbot.shard_stats():
+            latency = "{0:.0f}ms".format(shard["latency"] * 1000) if shard["latency"] is not None else "n/a"
+            lines.append("Shard {id}: {latency} latency, {guilds} guilds, {rate:.1f} events/s, "
+                         "{reconnects} reconnects".format(
+                            latency=latency, rate=shard["events_per_second"], **shard))
+        await message.channel.send("```\n{0}\n```".format('\n'.join(lines) or "No shards connected."))
+
+    async def reload(self, message, args):
+        """ Reloads a plugin from its source without restarting the bot
+            (botmaster only)
+        """
+        if not self.dyphanbot.is_botmaster(message.author):
+            return None
+        if not args:
+            return await message.channel.send("Which plugin? (e.g. `reload audio`)")
+        try:
+            result = await self.dyphanbot.pluginloader.reload_plugin(args[0])
+        except PluginReloadError as err:
+            return await message.channel.send(str(err))
+        await message.channel.send("Reloaded `{name}` in {total_ms:.0f}ms "
+                                   "(its commands were held for {paused_ms:.0f}ms).".format(**result))
 
     async def disable(self, message, args):
-        guild_id = str(message.guild.id)
+        guild_id = message.guild.id
         if not message.author.guild_permissions.manage_guild:
             return await message.channel.send("You don't have permission to disable commands for this server!!")
         if len(args) < 1:
-            disabled_cmds_lst = []
-            if self.guildsettings.get(guild_id):
-                disabled_cmds = self.guildsettings[guild_id].get("disabled_commands") or []
-                disabled_cmds_lst = disabled_cmds
+            disabled_cmds_lst = (self.settings.raw(guild_id) or {}).get("disabled_commands") or []
             await message.channel.send("Disabled commands: {0}.".format(', '.join(["`{0}`".format(x) for x in disabled_cmds_lst])) if len(disabled_cmds_lst) > 0 else "No commands disabled on this server.")
         elif len(args) > 1:
-            if not self.guildsettings.get(guild_id):
-                self.guildsettings[guild_id] = {}
-            if not "disabled_commands" in self.guildsettings[guild_id]:
-                self.guildsettings[guild_id]["disabled_commands"] = []
+            disabled_cmds = (self.settings.raw(guild_id) or {}).get("disabled_commands") or []
             if args[0] == "add":
-                self.guildsettings[guild_id]["disabled_commands"] += list(args[1:])
-                self.guildsettings = self._save_settings(self.guildsettings)
+                self.settings.set(guild_id, "disabled_commands", disabled_cmds + list(args[1:]))
                 await message.channel.send("Successfully disabled commands: {0}.".format(', '.join(["`{0}`".format(x) for x in args[1:]])))
             elif args[0] == "rem":
-                disabled_cmds = self.guildsettings[guild_id]["disabled_commands"]
                 new_list = [x for x in disabled_cmds if x not in args[1:]]
-                self.guildsettings[guild_id]["disabled_commands"] = new_list
-                self.guildsettings = self._save_settings(self.guildsettings)
+                self.settings.set(guild_id, "disabled_commands", new_list)
                 await message.channel.send("Successfully enabled commands: {0}.".format(', '.join(["`{0}`".format(x) for x in args[1:]])))
             else:
                 await message.channel.send("Invalid subcommand.\nUsage: `@{0} disable [<add|rem> <commands...>]`".format(self.dyphanbot.user.name))
         else:
-            await message.channel.send("Adds/Removes commands to/from the disabled commands list on this server.\nUsage: `@{0} disable [<add|rem> <commands...>]`".format(self.dyphanbot.user.name))
\ No newline at end of file
+            await message.channel.send("Adds/Removes commands to/from the disabled commands list on this server.\nUsage: `@{0} disable [<add|rem> <commands...>]`".format(self.dyphanbot.user.name))
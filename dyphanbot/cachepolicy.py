@@ -0,0 +1,143 @@
+""" This module contains the CachePolicy class, which builds the client's member
+    and message cache options from the configuration and reports how much the
+    caches hold.
+"""
+
+import sys
+import logging
+import discord
+
+from collections import Counter
+
+class CachePolicy(object):
+    """ Member and message cache settings for the client
+
+    Only the configured options are passed to the client, so anything left
+    out keeps the library's default (members are cached according to the
+    enabled intents, the last 1000 messages are kept and guilds are chunked
+    at startup if the `members` intent is enabled).
+
+    Attributes:
+        member_cache_flags (:obj:`discord.MemberCacheFlags`): The member cache
+            flags, or None to derive them from the intents
+        max_messages (int): The number of messages to cache, or None to
+            disable the message cache
+        chunk_guilds_at_startup (bool): Whether to request every guild's
+            members at startup, or None to chunk if the `members` intent is
+            enabled
+
+    Args:
+        config (dict): The `cache` configuration, which may contain
+            `member_cache` (a member cache flag to boolean mapping),
+            `max_messages` and `chunk_guilds_at_startup`
+        intents (:obj:`discord.Intents`): The intents the bot runs with
+
+    """
+
+    def __init__(self, config, intents):
+        self.logger = logging.getLogger(__name__)
+        self.intents = intents
+        self._options = {}
+
+        self.member_cache_flags = self._parse_member_cache(config.get('member_cache'))
+        if self.member_cache_flags is not None:
+            self._options['member_cache_flags'] = self.member_cache_flags
+
+        self.max_messages = 1000
+        if 'max_messages' in config:
+            max_messages = config['max_messages']
+            if max_messages is not None and (not isinstance(max_messages, int) or max_messages <= 0):
+                self.logger.warning(
+                    "Invalid `max_messages` cache setting `%s` (must be a positive "
+                    "integer or null); using the default", max_messages)
+            else:
+                self.max_messages = self._options['max_messages'] = max_messages
+
+        self.chunk_guilds_at_startup = None
+        chunk = config.get('chunk_guilds_at_startup')
+        if chunk is not None:
+            if chunk and not intents.members:
+                self.logger.warning(
+                    "Can't chunk guilds at startup without the `members` intent")
+                chunk = False
+            self.chunk_guilds_at_startup = self._options['chunk_guilds_at_startup'] = bool(chunk)
+
+    def _parse_member_cache(self, config):
+        if not config:
+            return None
+
+        flags = discord.MemberCacheFlags.from_intents(self.intents)
+        for flag, value in config.items():
+            if flag in discord.MemberCacheFlags.VALID_FLAGS and isinstance(value, bool):
+                setattr(flags, flag, value)
+            else:
+                self.logger.warning(
+                    "Skipping invalid member cache flag `%s` with value `%s`", flag, value)
+
+        try:
+            flags._verify_intents(self.intents)
+        except ValueError as err:
+            self.logger.warning("Ignoring member cache flags: %s", err)
+            return None
+        return flags
+
+    def options(self):
+        """ Returns the keyword arguments to pass to `discord.Client` """
+        return dict(self._options)
+
+    @staticmethod
+    def approx_size(objects):
+        """ Returns the approximate number of bytes used by `objects`,
+            counting each object and its direct attributes
+        """
+        size = 0
+        for obj in objects:
+            size += sys.getsizeof(obj)
+            for slot in getattr(type(obj), '__slots__', ()):
+                size += sys.getsizeof(getattr(obj, slot, None))
+        return size
+
+    def guild_stats(self, guild, message_count=0):
+        """ Returns the number of cached objects in a guild and their
+            approximate memory footprint
+        """
+        members = guild._members.values()
+        return {
+            "id": guild.id,
+            "name": guild.name,
+            "member_count": guild.member_count,
+            "members": len(members),
+            "channels": len(guild._channels),
+            "roles": len(guild._roles),
+            "emojis": len(guild.emojis),
+            "voice_states": len(guild._voice_states),
+            "messages": message_count,
+            "bytes": self.approx_size(members) + self.approx_size(guild._channels.values())
+                     + self.approx_size(guild._roles.values())
+        }
+
+    def report(self, client, guild_id=None):
+        """ Returns the cache settings and per-guild cache sizes
+
+        Args:
+            client (:obj:`discord.Client`): The client whose caches to measure
+            guild_id (int, optional): Only report this guild
+
+        """
+        messages = client.cached_messages
+        per_guild = Counter(msg.guild.id for msg in messages if msg.guild)
+
+        guilds = client.guilds
+        if guild_id is not None:
+            guilds = [guild for guild in guilds if guild.id == guild_id]
+
+        flags = client._connection.member_cache_flags
+        return {
+            "max_messages": client._connection.max_messages,
+            "member_cache_flags": dict(iter(flags)),
+            "chunk_guilds_at_startup": client._connection._chunk_guilds,
+            "messages": len(messages),
+            "messages_bytes": self.approx_size(messages),
+            "users": len(client.users),
+            "guilds": [self.guild_stats(guild, per_guild[guild.id]) for guild in guilds]
+        }
@@ -0,0 +1,388 @@
+""" This module contains the cluster launcher, which runs DyphanBot's shards
+    across several worker processes supervised by a coordinator.
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+import multiprocessing
+
+from collections import Counter
+
+from aiohttp import web
+
+from dyphanbot.datamanager import ConfigManager
+from dyphanbot.utils import json_codec
+
+# Seconds between stats reports sent by each worker
+DEFAULT_HEARTBEAT_INTERVAL = 5.0
+
+# Seconds without a report after which a worker is considered hung and killed
+DEFAULT_HEARTBEAT_TIMEOUT = 60.0
+
+# Initial and maximum delay (in seconds) before restarting a crashed worker
+DEFAULT_RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 60.0
+
+# A worker that stays up this long (in seconds) resets its restart backoff
+STABLE_UPTIME = 60.0
+
+def split_shards(shard_count, workers):
+    """ Splits shard IDs `0..shard_count-1` into `workers` contiguous ranges """
+    workers = max(1, min(workers, shard_count))
+    per_worker, extra = divmod(shard_count, workers)
+    groups, start = [], 0
+    for i in range(workers):
+        end = start + per_worker + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+class FakeEvent(object):
+    """ A stand-in raw gateway event carrying only a guild ID """
+
+    __slots__ = ('guild_id',)
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+
+class FakeGateway(object):
+    """ Feeds synthetic gateway events to a bot instead of connecting to
+        Discord, so a cluster can be run and observed locally
+
+    Each shard is "connected" once, then events are dispatched for guilds
+    spread evenly across the worker's shards. No event handlers exist for
+    the synthetic `fake_gateway_event` event; it only exercises the bot's
+    dispatch path and shard metrics.
+
+    Args:
+        dyphanbot (:obj:`dyphanbot.DyphanBot`): The bot to dispatch events to
+        shard_ids (:obj:`list` of int): The worker's shards
+        shard_count (int): The total number of shards in the cluster
+        rate (float, optional): Events dispatched per second
+
+    """
+
+    def __init__(self, dyphanbot, shard_ids, shard_count, rate=50.0):
+        self.dyphanbot = dyphanbot
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.rate = rate
+
+    def event_for_shard(self, shard_id, n):
+        """ Returns an event for the `n`th fake guild living on a shard """
+        return FakeEvent((n * self.shard_count + shard_id) << 22)
+
+    async def run(self):
+        await self.dyphanbot.pluginloader.start_plugins()
+        for shard_id in self.shard_ids:
+            self.dyphanbot.dispatch("shard_connect", shard_id)
+        n = 0
+        while True:
+            shard_id = self.shard_ids[n % len(self.shard_ids)]
+            self.dyphanbot.dispatch("fake_gateway_event", self.event_for_shard(shard_id, n))
+            n += 1
+            await asyncio.sleep(1 / self.rate)
+
+class WorkerReporter(object):
+    """ Periodically sends a worker's health and metrics to the coordinator
+
+    Args:
+        worker_id (int): The worker's index in the cluster
+        dyphanbot (:obj:`dyphanbot.DyphanBot`): The worker's bot
+        conn (:obj:`multiprocessing.connection.Connection`): The worker's end
+            of the pipe to the coordinator
+        interval (float, optional): Seconds between reports
+
+    """
+
+    def __init__(self, worker_id, dyphanbot, conn, interval=DEFAULT_HEARTBEAT_INTERVAL):
+        self.logger = logging.getLogger(__name__)
+        self.worker_id = worker_id
+        self.dyphanbot = dyphanbot
+        self.conn = conn
+        self.interval = interval
+
+    def report(self):
+        """ Returns the stats sent to the coordinator """
+        return {
+            "worker": self.worker_id,
+            "pid": os.getpid(),
+            "ready": self.dyphanbot.is_ready(),
+            "guilds": len(self.dyphanbot.guilds),
+            "counters": self.dyphanbot.metrics.snapshot(),
+            "shards": self.dyphanbot.shard_stats()
+        }
+
+    async def run(self):
+        while True:
+            try:
+                self.conn.send(self.report())
+            except (BrokenPipeError, EOFError, OSError):
+                self.logger.error("Lost connection to the cluster coordinator; exiting.")
+                os._exit(1)
+            await asyncio.sleep(self.interval)
+
+def run_worker(worker_id, options, conn):
+    """ Entry point of a worker process; runs a sharded bot for a subset of
+        the cluster's shards and reports to the coordinator through `conn`
+    """
+    from dyphanbot.dyphanbot import ShardedDyphanBot
+
+    dyphanbot = ShardedDyphanBot(
+        options.get('config_path'),
+        sharding={
+            "shard_ids": options['shard_ids'],
+            "shard_count": options['shard_count']
+        },
+        verbose=options.get('verbose'),
+        dev_mode=options.get('dev_mode'),
+        web_api=False)
+
+    reporter = WorkerReporter(worker_id, dyphanbot, conn, options.get('heartbeat_interval', DEFAULT_HEARTBEAT_INTERVAL))
+    loop = dyphanbot.loop
+    loop.create_task(reporter.run())
+    if options.get('fake_gateway'):
+        gateway = FakeGateway(dyphanbot, options['shard_ids'], options['shard_count'])
+        try:
+            loop.run_until_complete(gateway.run())
+        except KeyboardInterrupt:
+            pass
+    else:
+        dyphanbot.run()
+
+class Worker(object):
+    """ The coordinator's handle on a worker process
+
+    Attributes:
+        worker_id (int): The worker's index in the cluster
+        shard_ids (:obj:`list` of int): The shards the worker runs
+        process (:obj:`multiprocessing.Process`): The running process
+        conn (:obj:`multiprocessing.connection.Connection`): The
+            coordinator's end of the pipe to the worker
+        stats (dict): The last report received from the worker
+        restarts (int): How many times the worker has been restarted
+
+    """
+
+    def __init__(self, worker_id, shard_ids):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.conn = None
+        self.stats = {}
+        self.restarts = 0
+        self.failures = 0
+        self.started = None
+        self.last_report = None
+        self.restart_at = None
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def to_dict(self, now):
+        return {
+            "worker": self.worker_id,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "ready": self.stats.get("ready", False),
+            "shard_ids": self.shard_ids,
+            "guilds": self.stats.get("guilds", 0),
+            "restarts": self.restarts,
+            "uptime": now - self.started if self.alive else None,
+            "last_report": now - self.last_report if self.last_report else None
+        }
+
+class ClusterCoordinator(object):
+    """ Starts, supervises and aggregates a cluster of worker processes
+
+    The cluster's shards are split into contiguous ranges, one per worker,
+    and each worker runs a :obj:`dyphanbot.dyphanbot.ShardedDyphanBot` for
+    its range with its own web API disabled. Workers report their health
+    and metrics over a pipe; the coordinator restarts workers that exit or
+    stop reporting (with exponential backoff) and serves the aggregated
+    reports over HTTP at `/health` and `/metrics`. The web API isn't
+    served in a cluster: its endpoints work on a single bot's view of
+    Discord and its sessions, so they aren't proxied to the workers.
+
+    Settings are read from the `cluster` config key (`workers`,
+    `shard_count`, `host`, `port`, `heartbeat_interval`,
+    `heartbeat_timeout`, `restart_delay`); keyword arguments override it.
+
+    Args:
+        config_path (str, optional): Path to the config file
+        workers (int, optional): Number of worker processes
+        shard_count (int, optional): Total number of shards (defaults to
+            one shard per worker)
+        fake_gateway (bool, optional): Feed workers synthetic events instead
+            of connecting to Discord
+
+    """
+
+    def __init__(self, config_path=None, workers=None, shard_count=None,
+                 fake_gateway=False, host=None, port=None, **kwargs):
+        self.logger = logging.getLogger(__name__)
+        self.config = ConfigManager(self, config_path)
+        config = self.config.config.cluster
+
+        workers = workers or config.get('workers') or os.cpu_count() or 1
+        self.shard_count = shard_count or config.get('shard_count') or workers
+        self.host = host or config.get('host', "127.0.0.1")
+        self.port = port or config.get('port', 3590)
+        self.heartbeat_interval = config.get('heartbeat_interval', DEFAULT_HEARTBEAT_INTERVAL)
+        self.heartbeat_timeout = config.get('heartbeat_timeout', DEFAULT_HEARTBEAT_TIMEOUT)
+        self.restart_delay = config.get('restart_delay', DEFAULT_RESTART_DELAY)
+
+        self.worker_options = {
+            "config_path": str(config_path) if config_path else None,
+            "verbose": kwargs.get('verbose'),
+            "dev_mode": kwargs.get('dev_mode'),
+            "fake_gateway": fake_gateway,
+            "shard_count": self.shard_count,
+            "heartbeat_interval": self.heartbeat_interval
+        }
+        self.workers = [Worker(i, shard_ids) for i, shard_ids in
+                        enumerate(split_shards(self.shard_count, workers))]
+
+        self._mp = multiprocessing.get_context("spawn")
+        self._stopping = None
+
+    def start_worker(self, worker):
+        """ Starts (or restarts) a worker process """
+        loop = asyncio.get_event_loop()
+        if worker.conn is not None:
+            loop.remove_reader(worker.conn.fileno())
+            worker.conn.close()
+
+        conn, worker_conn = self._mp.Pipe()
+        options = dict(self.worker_options, shard_ids=worker.shard_ids)
+        worker.process = self._mp.Process(
+            target=run_worker, args=(worker.worker_id, options, worker_conn),
+            name="dyphanbot-worker-{0}".format(worker.worker_id), daemon=True)
+        worker.process.start()
+        worker_conn.close()
+
+        worker.conn = conn
+        worker.stats = {}
+        worker.started = time.monotonic()
+        worker.last_report = None
+        worker.restart_at = None
+        loop.add_reader(conn.fileno(), self._receive, worker)
+        self.logger.info("Started worker %d (pid %d) with shards %s",
+                         worker.worker_id, worker.process.pid, worker.shard_ids)
+
+    def _receive(self, worker):
+        try:
+            while worker.conn.poll():
+                worker.stats = worker.conn.recv()
+                worker.last_report = time.monotonic()
+        except (EOFError, OSError):
+            asyncio.get_event_loop().remove_reader(worker.conn.fileno())
+
+    def supervise(self, worker, now):
+        """ Restarts the worker if it exited or stopped reporting """
+        if worker.restart_at is not None:
+            if now >= worker.restart_at:
+                worker.restarts += 1
+                self.start_worker(worker)
+            return
+
+        last_seen = worker.last_report or worker.started
+        if worker.alive and now - last_seen > self.heartbeat_timeout:
+            self.logger.warning("Worker %d hasn't reported in %.0f seconds; killing it.",
+                                worker.worker_id, now - last_seen)
+            worker.process.kill()
+            worker.process.join()
+
+        if not worker.alive:
+            if now - worker.started >= STABLE_UPTIME:
+                worker.failures = 0
+            delay = min(self.restart_delay * 2 ** worker.failures, MAX_RESTART_DELAY)
+            worker.failures += 1
+            worker.restart_at = now + delay
+            self.logger.warning("Worker %d exited with code %s; restarting in %.0f seconds.",
+                                worker.worker_id, worker.process.exitcode, delay)
+
+    def health(self):
+        """ Returns the state of every worker """
+        now = time.monotonic()
+        workers = [worker.to_dict(now) for worker in self.workers]
+        return {
+            "healthy": all(w["alive"] and w["last_report"] is not None
+                           and w["last_report"] <= self.heartbeat_interval * 3
+                           for w in workers),
+            "shard_count": self.shard_count,
+            "workers": workers
+        }
+
+    def metrics(self):
+        """ Returns every worker's counters summed up and every shard's stats """
+        counters = Counter()
+        shards = []
+        for worker in self.workers:
+            counters.update(worker.stats.get("counters", {}))
+            shards.extend(worker.stats.get("shards", []))
+        return {
+            "counters": dict(counters),
+            "guilds": sum(worker.stats.get("guilds", 0) for worker in self.workers),
+            "shards": sorted(shards, key=lambda shard: shard["id"])
+        }
+
+    async def health_handler(self, request):
+        health = self.health()
+        return web.json_response(health, status=200 if health["healthy"] else 503,
+                                 dumps=json_codec.dumps_compact)
+
+    async def metrics_handler(self, request):
+        return web.json_response(self.metrics(), dumps=json_codec.dumps_compact)
+
+    async def run_async(self):
+        loop = asyncio.get_event_loop()
+        self._stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        app = web.Application(logger=self.logger)
+        app.add_routes([
+            web.get("/health", self.health_handler),
+            web.get("/metrics", self.metrics_handler)
+        ])
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        self.logger.info("Cluster API listening at %s:%s", self.host, self.port)
+        self.logger.info("The web API isn't available in a cluster; only /health and /metrics are served.")
+
+        for worker in self.workers:
+            self.start_worker(worker)
+
+        try:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                for worker in self.workers:
+                    self.supervise(worker, now)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.logger.info("Stopping %d workers...", len(self.workers))
+            for worker in self.workers:
+                if worker.alive:
+                    worker.process.terminate()
+            for worker in self.workers:
+                if worker.process is not None:
+                    worker.process.join(10)
+                    if worker.process.is_alive():
+                        worker.process.kill()
+            await runner.cleanup()
+
+    def run(self):
+        """ Runs the cluster until interrupted """
+        asyncio.run(self.run_async())
@@ -0,0 +1,107 @@
+""" This module contains DyphanBot's typed configuration objects, built once
+    from the config file at startup.
+"""
+
+from collections import namedtuple
+
+from dyphanbot.exceptions import InvalidConfigurationError
+
+# The type and default of each section of the config file
+SECTIONS = {
+    'bot_masters': (list, []),
+    'disabled_plugins': (list, []),
+    'plugin_dirs': (list, []),
+    'lazy_plugins': (bool, False),
+    'plugin_init_workers': (int, 4),
+    'intents': (dict, {}),
+    'cache': (dict, {}),
+    'storage': (dict, {}),
+    'sharding': (dict, {}),
+    'cluster': (dict, {}),
+    'dispatch': (dict, {}),
+    'rate_limits': (dict, {}),
+    'web_api': (dict, {}),
+}
+
+# How each type is described in validation errors
+TYPE_NAMES = {list: "a list", dict: "an object", bool: "true or false", int: "a number"}
+
+def _section(raw, key):
+    expected, default = SECTIONS[key]
+    value = raw.get(key)
+    if value is None:
+        return type(default)(default)
+    if not isinstance(value, expected):
+        raise InvalidConfigurationError(key, "Must be {0}".format(TYPE_NAMES[expected]))
+    return value
+
+class Config(namedtuple('Config', [
+        'bot_masters', 'disabled_plugins', 'plugin_dirs', 'lazy_plugins',
+        'plugin_init_workers', 'intents', 'cache', 'storage', 'sharding',
+        'cluster', 'dispatch', 'rate_limits'])):
+    """ DyphanBot's configuration, validated once at startup
+
+    Missing sections get their defaults, so reading one is a plain
+    attribute access. The token and web API credentials aren't part of it
+    (see :obj:`ProtectedConfig`).
+
+    Attributes:
+        bot_masters (frozenset): The bot masters' user IDs, as strings
+        disabled_plugins (list): Names of plugins not to load
+        plugin_dirs (list): Extra directories to load plugins from
+        lazy_plugins (bool): Whether plugins are imported on first use
+        plugin_init_workers (int): Threads initializing plugins at startup
+        intents (dict): Gateway intent overrides
+        cache (dict): The `cache` section
+        storage (dict): The `storage` section
+        sharding (dict): The `sharding` section
+        cluster (dict): The `cluster` section
+        dispatch (dict): The `dispatch` section
+        rate_limits (dict): The `rate_limits` section
+
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, raw):
+        """ Validates a parsed config file and builds its config
+
+        Raises:
+            InvalidConfigurationError: If a section has the wrong type
+
+        """
+        return cls(
+            bot_masters=frozenset(str(user_id) for user_id in _section(raw, 'bot_masters')),
+            **{key: _section(raw, key) for key in cls._fields if key != 'bot_masters'}
+        )
+
+class ProtectedConfig(namedtuple('ProtectedConfig', ['token', 'web_api'])):
+    """ The parts of the configuration plugins shouldn't read
+
+    Each field is handed out once per config manager (see
+    `ConfigManager.protected()`), to whoever asks first: the web API
+    credentials to the web API during setup and the token to
+    `DyphanBot.run()`.
+
+    Attributes:
+        token (str): The Discord API token
+        web_api (dict): The `web_api` section, including its OAuth secrets
+
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, raw):
+        """ Validates a parsed config file and builds its protected config
+
+        Raises:
+            InvalidConfigurationError: If the token is missing or a section
+                has the wrong type
+
+        """
+        token = raw.get('token')
+        if not token or not isinstance(token, str):
+            raise InvalidConfigurationError('token', "Required Discord API token is not defined")
+        return cls(token=token, web_api=_section(raw, 'web_api'))
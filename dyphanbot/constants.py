@@ -12,6 +12,12 @@ DATA_DIRS = [
     "~/.config/dyphan"
 ]
 
+# Gateway intents the core needs to receive and read commands
+CORE_INTENTS = ["guilds", "messages", "message_content"]
+
+# Intents that must be enabled for the bot in the developer portal
+PRIVILEGED_INTENTS = ["members", "presences", "message_content"]
+
 # Possible plugin directories
 PLUGIN_DIRS = [os.path.join(ROOT_DIR, "plugins")]
 PLUGIN_DIRS += [os.path.join(os.path.expanduser(ddir), "plugins") for ddir in DATA_DIRS]
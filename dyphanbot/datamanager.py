@@ -1,37 +1,69 @@
 import os
 import sys
 import json
+import atexit
+import asyncio
+import inspect
 import logging
+import functools
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
+
+from dyphanbot.config import Config, ProtectedConfig
 from dyphanbot.constants import DATA_DIRS
-from dyphanbot.exceptions import InvalidConfigurationError
+from dyphanbot.exceptions import InvalidConfigurationError, ConfigAccessError, DocumentNotFoundError
+from dyphanbot.guildsettings import EagerGuildSettings, LazyGuildSettings, DEFAULT_CACHE_BYTES
+from dyphanbot.storage import create_backend
+from dyphanbot.storage.jsonfile import copy_document
+from dyphanbot.storage.journal import SettingsJournal, DEFAULT_COMPACT_THRESHOLD
+from dyphanbot.storage.writebehind import WriteBehindBuffer, DEFAULT_FLUSH_INTERVAL
+from dyphanbot.startupprofile import StartupProfiler
+
+# Default number of threads running asynchronous data I/O
+DEFAULT_IO_WORKERS = 4
 
 class ConfigManager(object):
-    """ Contains methods for accessing and managing DyphanBot's configuration file """
+    """ Contains methods for accessing and managing DyphanBot's configuration file
+
+    The config file is read and validated once. Its public sections are
+    available as `config` (a :obj:`dyphanbot.config.Config`); the token
+    and web API credentials are each handed out once, through
+    `protected()`, to keep them from plugins.
+
+    Attributes:
+        config (:obj:`dyphanbot.config.Config`): The validated configuration
+        data_dir (str): The active data directory
+        config_path (str): The path of the config file
+
+    """
 
     def __init__(self, dyphanbot, config_path=None):
         self.logger = logging.getLogger(__name__)
         self.dyphanbot = dyphanbot
+        # times the config lookup when profiling DyphanBot's startup
+        self.profiler = getattr(dyphanbot, 'profiler', None) or StartupProfiler(enabled=False)
         self.data_dir = None
         self._config_fn = "config.json"
         self._config_template = {
             "token": "_YOUR_DISCORD_API_TOKEN_HERE_"
         }
 
-        self._config = self._setup_config(config_path)
-
-    def __getattribute__(self, name):
-        # This class' "protected" methods should only be called by either
-        # `DyphanBot` or itself. This is to prevent plugins from normally
-        # calling these methods.
-        caller_class_name = object.__getattribute__(sys._getframe().f_back.f_locals["self"], "__class__").__name__
-        this_class_name = object.__getattribute__(self, "__class__").__name__
-        dyphanbot_class_name = object.__getattribute__(self, "dyphanbot").__class__.__name__
-        if name.startswith("_"):
-            if caller_class_name in [this_class_name, dyphanbot_class_name]:
-                return object.__getattribute__(self, name)
-        else:
-            return object.__getattribute__(self, name)
+        self.config, protected = self._setup_config(config_path)
+        self._protected = protected._asdict()
+
+    def protected(self, key):
+        """ Returns a field of the :obj:`dyphanbot.config.ProtectedConfig`
+            (`token` or `web_api`); only the first caller gets it, and the
+            config manager keeps no copy
+
+        Raises:
+            ConfigAccessError: If it was already handed out
+
+        """
+        if key not in self._protected:
+            raise ConfigAccessError("The protected configuration `{0}` was already claimed".format(key))
+        return self._protected.pop(key)
 
     def _err(self, *args, **kwargs):
         print(*args, **kwargs)
@@ -71,9 +103,11 @@ class ConfigManager(object):
 
     def _setup_config(self, config_path=None):
         if not config_path:
-            config_path = self._find_config()
+            with self.profiler.phase("find config", "config"):
+                config_path = self._find_config()
         if not self.data_dir:
             self.data_dir = os.path.dirname(config_path)
+        self.config_path = config_path
         with open(config_path, 'r+') as fd:
             raw_data = fd.read()
             if raw_data.strip() == "":
@@ -91,59 +125,288 @@ class ConfigManager(object):
             self._err("Configuration file is located at '{0}' but has not been set up yet.\n".format(config_path),
                       "Please provide the required Discord API token for DyphanBot to run.")
 
-        self.logger.info("Using configuration file located at '%s'.", config_path)
-        return config
+        try:
+            validated = (Config.from_dict(config), ProtectedConfig.from_dict(config))
+        except InvalidConfigurationError as e:
+            self._err("{}: {}".format(type(e).__name__, e))
 
-    def _get_key(self, key, default=None):
-        if key in self._config:
-            return self._config[key]
-        else:
-            return default
+        self.logger.info("Using configuration file located at '%s'.", config_path)
+        return validated
 
 class DataManager(ConfigManager):
-    """ Handles data files relative to the active data dir """
+    """ Handles data files relative to the active data dir
+
+    Documents are read and written through the storage backend selected by
+    the `storage` config (JSON files in the data directory by default).
+    Components keeping a document in memory can `watch()` it to reload
+    their copy when another process changes it.
+
+    Saves made while the event loop is running are buffered and written
+    off the loop a short while later (see
+    :obj:`dyphanbot.storage.writebehind.WriteBehindBuffer`); anything still
+    pending is written when the bot closes or the interpreter exits.
+
+    Coroutines should prefer `aload_json()` and `asave_json()`, which read,
+    decode, encode and write documents on a bounded pool of I/O threads
+    instead of the event loop. Writes to the same document are serialized
+    by a per-document lock. `load_json()` and `save_json()` remain for
+    synchronous code.
+
+    Settings documents changed a value at a time should be kept in a
+    :obj:`dyphanbot.storage.journal.SettingsJournal` (see `journal()`),
+    which appends each change to a journal instead of rewriting the file.
+    Per-guild settings should be read and changed through
+    `guild_settings()`, which can also load guilds on demand.
+    """
 
     def __init__(self, dyphanbot, config_path=None):
         super().__init__(dyphanbot, config_path)
+        storage_config = self.config.storage
+        self.storage_config = storage_config
+        with self.profiler.phase("storage backend", "storage"):
+            self.backend = create_backend(storage_config, self.data_dir)
+        self.watchers = {}
+        self.backend.subscribe(self.on_change)
+        self.logger.info("Using the '%s' storage backend.", self.backend.name)
+
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=storage_config.get('io_workers', DEFAULT_IO_WORKERS),
+            thread_name_prefix="dyphanbot-io")
+        self.file_locks = {}
+        self.journals = {}
+        self._journals_lock = threading.Lock()
+
+        self.write_buffer = None
+        flush_interval = storage_config.get('flush_interval', DEFAULT_FLUSH_INTERVAL)
+        if flush_interval:
+            self.write_buffer = WriteBehindBuffer(
+                self.backend, flush_interval, self.io_executor, self.file_lock)
+            atexit.register(self.write_buffer.flush_sync)
+
+    def running_loop(self):
+        """ Returns the bot's event loop if it's running, otherwise None """
+        loop = getattr(self.dyphanbot, 'loop', None)
+        if loop is not None and loop.is_running():
+            return loop
+        return None
+
+    def on_loop(self):
+        """ Returns True if called from the thread running the bot's event
+            loop (and not, e.g., from a plugin being initialized on a
+            worker thread)
+        """
+        loop = self.running_loop()
+        if loop is None:
+            return False
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def find_json(self, filename, **kwargs):
+        """ Loads JSON from a filename in the data directory, or returns None
+            if the file doesn't exist (without creating it)
+        """
+        if self.write_buffer is not None:
+            pending = self.write_buffer.get(filename)
+            if pending is not None:
+                return copy_document(pending[0])
+        try:
+            return self.backend.load(filename, **kwargs)
+        except DocumentNotFoundError:
+            return None
 
     def load_json(self, filename, initial_data={}, save_json=None, **kwargs):
         """ Loads JSON from a filename in the data directory.
         If the file doesn't exist, save a new one with the initial data using
         either the default save method or a specified one.
         """
-        filepath = os.path.join(self.data_dir, filename)
+        if self.write_buffer is not None:
+            pending = self.write_buffer.get(filename)
+            if pending is not None:
+                return copy_document(pending[0])
         try:
-            with open(filepath, 'r') as fd:
-                return json.load(fd, **kwargs)
-        except (OSError, IOError):
+            return self.backend.load(filename, **kwargs)
+        except DocumentNotFoundError:
             if not save_json:
                 save_json = self.save_json
             return save_json(filename, initial_data)
 
     def save_json(self, filename, data, **kwargs):
         """ Saves JSON to a filename in the data directory and returns the data.
+        The file is written later, off the event loop, if this is called on
+        the running loop; other threads write it right away.
         """
-        filepath = os.path.join(self.data_dir, filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as fd:
-            json.dump(data, fd, **kwargs)
-
+        if self.write_buffer is not None and self.on_loop():
+            self.write_buffer.save(filename, data, **kwargs)
+        else:
+            if self.write_buffer is not None:
+                self.write_buffer.discard(filename)
+            self.backend.save(filename, data, **kwargs)
         return data
 
+    def file_lock(self, filename):
+        """ Returns the :obj:`asyncio.Lock` serializing writes to a file """
+        lock = self.file_locks.get(filename)
+        if lock is None:
+            lock = self.file_locks[filename] = asyncio.Lock()
+        return lock
+
+    async def run_io(self, func, *args, **kwargs):
+        """ Runs `func` on the I/O thread pool and returns its result """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, functools.partial(func, *args, **kwargs))
+
+    async def aload_json(self, filename, initial_data={}, save_json=None, **kwargs):
+        """ Loads JSON from a filename in the data directory without blocking
+            the event loop
+
+        Reading and decoding happen on the I/O thread pool. If the file
+        doesn't exist, a new one is saved with the initial data using
+        either `asave_json()` or the specified save method (which may be a
+        coroutine function).
+        """
+        if self.write_buffer is not None:
+            pending = self.write_buffer.get(filename)
+            if pending is not None:
+                return copy_document(pending[0])
+        try:
+            return await self.run_io(self.backend.load, filename, **kwargs)
+        except DocumentNotFoundError:
+            if not save_json:
+                save_json = self.asave_json
+            data = save_json(filename, initial_data)
+            if inspect.isawaitable(data):
+                data = await data
+            return data
+
+    async def asave_json(self, filename, data, **kwargs):
+        """ Saves JSON to a filename in the data directory and returns the data
+
+        Unlike `save_json()`, the file has been written once this returns.
+        Encoding and writing happen on the I/O thread pool, so `data`
+        shouldn't be changed until then. Any buffered save of the same file
+        is superseded.
+        """
+        async with self.file_lock(filename):
+            if self.write_buffer is not None:
+                self.write_buffer.discard(filename)
+            await self.run_io(self.backend.save, filename, data, **kwargs)
+        return data
 
+    def journal(self, filename, initial_data={}):
+        """ Returns the :obj:`dyphanbot.storage.journal.SettingsJournal` of a
+            settings document in the data directory, loading it (and
+            replaying its journal) the first time; plugins initialized on
+            separate threads get the same journal
+        """
+        with self._journals_lock:
+            journal = self.journals.get(filename)
+            if journal is None:
+                journal = self.journals[filename] = SettingsJournal(
+                    self, filename, initial_data,
+                    threshold=self.storage_config.get('compact_threshold', DEFAULT_COMPACT_THRESHOLD),
+                    enabled=self.storage_config.get('journal', True),
+                    fsync=self.storage_config.get('journal_fsync', False))
+        return journal
+
+    def guild_settings(self, filename, root=()):
+        """ Returns the source of the per-guild settings stored in a file
+
+        By default, the file is a single document kept in memory and
+        changed through its journal (see `journal()`), returned as a
+        :obj:`dyphanbot.guildsettings.EagerGuildSettings`. With the
+        `storage.lazy_guild_settings` config enabled, each guild gets its
+        own document instead (in a directory named after the file), loaded
+        on first access into a cache of `storage.guild_cache_bytes` bytes
+        (see :obj:`dyphanbot.guildsettings.LazyGuildSettings`); existing
+        files are split up the first time.
+
+        Args:
+            filename (str): The settings file in the data directory
+            root (tuple, optional): The keys leading to the dict of guilds
+                within the file (e.g. `("guilds",)`)
 
+        """
+        if self.storage_config.get('lazy_guild_settings', False):
+            return LazyGuildSettings(
+                self, os.path.splitext(filename)[0],
+                budget=self.storage_config.get('guild_cache_bytes', DEFAULT_CACHE_BYTES),
+                legacy=filename, root=root)
+
+        initial_data = {}
+        for part in reversed(root):
+            initial_data = {part: initial_data}
+        source = EagerGuildSettings(journal=self.journal(filename, initial_data), root=root)
+        self.watch(filename, source.reload)
+        return source
+
+    def get(self, namespace, key, guild=None, default=None):
+        """ Returns a single stored value
+
+        Unlike `load_json()`, the key-level methods read and write one value
+        at a time, which the SQLite backend does without touching any other
+        value.
+
+        Args:
+            namespace (str): The value's namespace (usually a plugin's name)
+            key (str): The value's key
+            guild (optional): The guild ID the value belongs to, if any
+            default (optional): Returned if no such value exists
 
+        """
+        return self.backend.get(namespace, key, guild, default)
 
+    def set(self, namespace, key, value, guild=None):
+        """ Stores a single JSON-serializable value """
+        self.backend.set(namespace, key, value, guild)
 
+    def delete(self, namespace, key, guild=None):
+        """ Deletes a single value; returns True if it existed """
+        return self.backend.delete(namespace, key, guild)
 
+    def items(self, namespace, guild=None):
+        """ Returns a dict of every value stored in a namespace for a guild """
+        return self.backend.items(namespace, guild)
 
+    async def flush(self):
+        """ Writes every pending save """
+        if self.write_buffer is not None:
+            await self.write_buffer.flush()
 
+    def watch(self, filename, callback):
+        """ Calls `callback(filename)` on the event loop whenever another
+            process changes the file (or, if `filename` ends with a path
+            separator, any file directly in that directory)
+        """
+        self.watchers.setdefault(filename, []).append(callback)
 
+    def unwatch(self, filename, callback):
+        """ Stops calling `callback` about changes to the file """
+        callbacks = self.watchers.get(filename, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
 
-
-
-
-
-
-
-#
+    def on_change(self, filename):
+        """ Runs the file's watchers; called by the storage backend, possibly
+            from another thread
+        """
+        callbacks = list(self.watchers.get(filename, ()))
+        callbacks += self.watchers.get(os.path.dirname(filename) + os.sep, [])
+        if not callbacks:
+            return
+        loop = self.running_loop()
+        for callback in callbacks:
+            if loop is not None:
+                loop.call_soon_threadsafe(callback, filename)
+            else:
+                callback(filename)
+
+    def close(self):
+        """ Writes pending saves and closes the storage backend """
+        for journal in self.journals.values():
+            journal.close()
+        if self.write_buffer is not None:
+            self.write_buffer.flush_sync()
+        self.backend.close()
+        self.io_executor.shutdown()
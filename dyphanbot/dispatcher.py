@@ -0,0 +1,370 @@
+""" This module contains the CommandDispatcher class responsible for routing
+    messages to command and message handlers.
+"""
+
+import asyncio
+import logging
+
+from collections import OrderedDict
+
+from async_timeout import timeout
+
+from dyphanbot.utils import ParsedMessage
+
+# Message classifications
+PLAIN = "plain"
+MENTIONED = "mentioned"
+PREFIXED = "prefixed"
+
+# Number of recently parsed messages kept for plugins to reuse
+PARSE_CACHE_SIZE = 256
+
+# Defaults for the `dispatch` configuration
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_HANDLER_TIMEOUT = 30.0
+
+def handler_name(handler):
+    """ Returns a handler's name, looking through `functools.partial` """
+    handler = getattr(handler, 'func', handler)
+    return getattr(handler, '__name__', None) or repr(handler)
+
+def handler_owner(handler):
+    """ Returns the name of the plugin a handler belongs to """
+    handler = getattr(handler, 'func', handler)
+    owner = getattr(handler, '__self__', None)
+    if owner is None:
+        return getattr(handler, '__module__', None) or "<unknown>"
+    return getattr(owner, 'name', None) or type(owner).__name__
+
+class HandlerPool(object):
+    """ Runs handlers concurrently under a global concurrency limit
+
+    Every handler call gets its own deadline; handlers still running when
+    it passes are cancelled and logged along with their plugin's name.
+    Exceptions are logged the same way so a failing handler can't stop
+    the others from running. Without a limit or a deadline, handlers are
+    simply awaited.
+
+    Args:
+        max_concurrency (int, optional): The maximum number of handlers
+            running at once across every message, or None for no limit
+        timeout (float, optional): Seconds each handler is allowed to run
+            for, or None to never cancel handlers
+
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_HANDLER_TIMEOUT):
+        self.logger = logging.getLogger(__name__)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout or None
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        "asyncio.Semaphore: The concurrency limit (created on the running loop)"
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, handler, *args, **kwargs):
+        """ Runs a single handler within the limit and deadline and returns
+            its result, or None if it timed out or raised an exception
+        """
+        if self.max_concurrency is None:
+            if self.timeout is None:
+                return await self.run_direct(handler, *args, **kwargs)
+            return await self._run(handler, *args, **kwargs)
+        async with self.semaphore:
+            return await self._run(handler, *args, **kwargs)
+
+    async def run_direct(self, handler, *args, **kwargs):
+        """ Runs a single handler without the limit or deadline and returns
+            its result, or None if it raised an exception
+        """
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            self.logger.exception(
+                "Handler '%s' of plugin '%s' raised an exception",
+                handler_name(handler), handler_owner(handler))
+        return None
+
+    async def _run(self, handler, *args, **kwargs):
+        try:
+            async with timeout(self.timeout):
+                return await handler(*args, **kwargs)
+        except asyncio.TimeoutError:
+            self.logger.warning(
+                "Cancelled handler '%s' of plugin '%s' after %.1f seconds",
+                handler_name(handler), handler_owner(handler), self.timeout)
+        except Exception:
+            self.logger.exception(
+                "Handler '%s' of plugin '%s' raised an exception",
+                handler_name(handler), handler_owner(handler))
+        return None
+
+    async def run_ordered(self, handlers, *args):
+        """ Runs handlers one after another in the given order """
+        for handler in handlers:
+            await self.run(handler, *args)
+
+    async def run_each(self, handlers, *args):
+        """ Runs handlers one after another without the limit or deadline """
+        for handler in handlers:
+            try:
+                await handler(*args)
+            except Exception:
+                self.logger.exception(
+                    "Handler '%s' of plugin '%s' raised an exception",
+                    handler_name(handler), handler_owner(handler))
+
+    async def fan_out(self, handlers, ordered=(), *args):
+        """ Runs `handlers` concurrently while the `ordered` handlers run
+            one after another alongside them
+        """
+        if not ordered and len(handlers) == 1:
+            return await self.run(handlers[0], *args)
+        if not handlers:
+            return await self.run_ordered(ordered, *args)
+        coros = [self.run(handler, *args) for handler in handlers]
+        if ordered:
+            coros.append(self.run_ordered(ordered, *args))
+        await asyncio.gather(*coros)
+
+class HandlerBucket(object):
+    """ A list of message handlers split by whether they must run in order
+
+    Attributes:
+        handlers (:obj:`list`): Every handler in registration order
+        concurrent (:obj:`list`): Handlers that may run concurrently
+        ordered (:obj:`list`): Handlers that must run in registration order
+
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self.concurrent = []
+        self.ordered = []
+
+    def __len__(self):
+        return len(self.handlers)
+
+    def __iter__(self):
+        return iter(self.handlers)
+
+    def add(self, handler, ordered=False):
+        self.handlers.append(handler)
+        (self.ordered if ordered else self.concurrent).append(handler)
+
+    def remove_owner(self, owner):
+        """ Removes every handler bound to `owner` """
+        keep = lambda handler: getattr(handler, '__self__', None) is not owner
+        self.handlers = list(filter(keep, self.handlers))
+        self.concurrent = list(filter(keep, self.concurrent))
+        self.ordered = list(filter(keep, self.ordered))
+
+class CommandDispatcher(object):
+    """ Routes messages to the command and message handlers registered by
+        plugins
+
+    The handler tables are filled while plugins are loaded, so a message is
+    classified only once (as prefixed, mentioned or plain) and only the
+    handler bucket that applies to its classification is invoked. Plain
+    messages never reach the command table.
+
+    By default, message handlers are awaited one after another in
+    registration order, which costs next to nothing per handler. With
+    `concurrent` enabled in the configuration, they run concurrently
+    through a :obj:`HandlerPool`, under its concurrency limit and
+    per-handler deadline; handlers registered with `ordered=True` still
+    run one after another.
+
+    Each message is tokenized once into a :obj:`dyphanbot.utils.ParsedMessage`
+    which is cached by message ID, so plugins calling `parse()` (through
+    `DyphanBot.parse_message()`) reuse it instead of parsing it again.
+
+    Attributes:
+        dyphanbot (:obj:`dyphanbot.DyphanBot`): The main DyphanBot object
+        commands (dict): A command name to command handler table
+        raw_handlers (:obj:`HandlerBucket`): Message handlers called for
+            every message
+        message_handlers (:obj:`HandlerBucket`): Every message handler,
+            called for prefixed or mentioned messages
+        concurrent (bool): Whether message handlers run concurrently
+        pool (:obj:`HandlerPool`): Runs message handlers
+
+    Args:
+        dyphanbot (:obj:`dyphanbot.DyphanBot`): The main DyphanBot object
+        config (dict, optional): The `dispatch` configuration, which may
+            contain `concurrent`, `max_concurrency` and `handler_timeout`
+
+    """
+
+    def __init__(self, dyphanbot, config={}):
+        self.logger = logging.getLogger(__name__)
+        self.dyphanbot = dyphanbot
+
+        self.commands = {}
+        self.raw_handlers = HandlerBucket()
+        self.message_handlers = HandlerBucket()
+
+        self.concurrent = config.get('concurrent', False)
+        self.pool = HandlerPool(
+            max_concurrency=config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            timeout=config.get('handler_timeout', DEFAULT_HANDLER_TIMEOUT))
+
+        self._parsed = OrderedDict()
+
+    def add_command(self, command, handler, permissions=None, plugin=None, rate=None):
+        """ Registers a command handler under the command name, optionally
+            rate limited to `rate` (a `(calls, seconds)` pair) per user
+        """
+        handler.__dict__['plugin'] = plugin
+        handler.__dict__['permissions'] = permissions
+        self.commands[command] = handler
+        if rate:
+            self.dyphanbot.ratelimiter.set_command_limit(command, rate)
+
+    def add_message_handler(self, handler, raw=False, ordered=False):
+        """ Registers a message handler in the bucket(s) it belongs to """
+        handler.__dict__['raw'] = raw
+        handler.__dict__['ordered'] = ordered
+        self.message_handlers.add(handler, ordered)
+        if raw:
+            self.raw_handlers.add(handler, ordered)
+
+    def remove_handlers(self, plugin):
+        """ Unregisters every command and message handler of a plugin """
+        for command in [command for command, handler in self.commands.items()
+                        if handler.__dict__.get('plugin') is plugin]:
+            del self.commands[command]
+        self.raw_handlers.remove_owner(plugin)
+        self.message_handlers.remove_owner(plugin)
+
+    def parse(self, message, settings=None):
+        """ Returns the cached :obj:`dyphanbot.utils.ParsedMessage` for the
+            message, parsing it if it wasn't parsed yet or was edited since
+
+        Args:
+            message (:obj:`discord.Message`): The message to parse
+            settings (:obj:`dyphanbot.guildsettings.GuildSettings`, optional):
+                The guild's settings, if they were already looked up
+
+        """
+        parsed = self._parsed.get(message.id)
+        if parsed is not None and parsed.content == message.content:
+            return parsed
+
+        prefix = ext_prefix = None
+        if message.guild:
+            if settings is None:
+                settings = self.dyphanbot.bot_controller._get_record(message.guild)
+            prefix, ext_prefix = settings.prefix, settings.ext_prefix
+
+        parsed = ParsedMessage(self.dyphanbot, message.content, prefix, ext_prefix)
+        self._parsed[message.id] = parsed
+        if len(self._parsed) > PARSE_CACHE_SIZE:
+            self._parsed.popitem(last=False)
+        return parsed
+
+    def classify(self, parsed):
+        """ Returns whether the parsed message mentions the bot, starts with
+            the guild's command prefix, or is a plain message
+        """
+        if parsed.mentioned:
+            return MENTIONED
+        if parsed.prefix_kind is ParsedMessage.PREFIX:
+            return PREFIXED
+        return PLAIN
+
+    async def dispatch(self, message):
+        """ Classifies the message and invokes the handlers that apply to it """
+        if not message.content.strip():
+            # don't process empty messages (e.g. attachments only)
+            return
+
+        settings = None
+        if message.guild:
+            settings = self.dyphanbot.bot_controller._get_record(message.guild)
+        parsed = self.parse(message, settings)
+        kind = self.classify(parsed)
+
+        if kind is PLAIN:
+            return await self.run_handlers(self.raw_handlers, message)
+
+        if not parsed.command:
+            # don't process if there's no command (happens when bot gets
+            # mentioned without a command or only the prefix was sent)
+            return
+
+        # extension calls (e.g. `@bot +ext`) are left to message handlers
+        if parsed.prefix_kind is not ParsedMessage.EXT_PREFIX:
+            if await self.process_command(message, parsed.command, parsed.args,
+                                          kind is PREFIXED, settings):
+                return
+
+        await self.run_handlers(self.message_handlers, message)
+
+    async def run_handlers(self, bucket, message):
+        """ Runs every handler in the bucket for the message """
+        if not bucket:
+            return
+        if not self.concurrent:
+            return await self.pool.run_each(bucket.handlers, self.dyphanbot, message)
+        await self.pool.fan_out(bucket.concurrent, bucket.ordered, self.dyphanbot, message)
+
+    async def process_command(self, message, cmd, args, prefix=False, settings=None):
+        """ Runs the command handler for `cmd` if the guild and the author
+            are allowed to use it
+        """
+        self.logger.info("Got command `%s` with args `%s`", cmd, ' '.join(args))
+        bot_controller = self.dyphanbot.bot_controller
+        if await bot_controller._process_command(message, cmd, args, prefix):
+            return None
+
+        handler = self.commands.get(cmd)
+        if handler is None:
+            return None
+
+        # handle commands disabled by the guild settings
+        if message.guild:
+            if settings is None:
+                settings = bot_controller._get_record(message.guild)
+            if cmd in settings.disabled_commands:
+                return None
+
+        cmd_perms = handler.permissions
+        if cmd_perms:
+            # handle permissions (botmaster and guild)
+            self.logger.info("Command `%s` has permissions `%s`", cmd, cmd_perms)
+            if cmd_perms.get("botmaster"):
+                if not self.dyphanbot.is_botmaster(message.author):
+                    return None
+            elif "guild_perms" in cmd_perms:
+                member_perms = message.channel.permissions_for(message.author)
+                for perms in cmd_perms["guild_perms"]:
+                    if not getattr(member_perms, perms):
+                        return None
+
+        if not self.admit(message, cmd):
+            return None
+
+        self.dyphanbot.metrics.incr("commands_processed", command=cmd)
+        return await handler(self.dyphanbot, message, args)
+
+    def admit(self, message, cmd):
+        """ Returns True if the rate limits admit a call to `cmd` by the
+            message's author, or False (and records the rejection) if not;
+            also used by plugins handling calls outside `process_command()`
+        """
+        ratelimiter = self.dyphanbot.ratelimiter
+        if not ratelimiter.enabled:
+            return True
+        guild_id = message.guild.id if message.guild else None
+        rejected_by = ratelimiter.admit(cmd, message.author.id, guild_id)
+        if rejected_by:
+            self.logger.debug("Rate limited command `%s` from %s (%s limit)",
+                              cmd, message.author.id, rejected_by)
+            self.dyphanbot.metrics.incr("commands_rejected", scope=rejected_by, command=cmd)
+            return False
+        return True
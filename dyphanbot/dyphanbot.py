@@ -1,14 +1,23 @@
 import os
 import json
+import asyncio
 import random
 import logging
+import functools
 import discord
 
 import dyphanbot.utils as utils
-from dyphanbot.constants import CB_NAME
+from dyphanbot.constants import CB_NAME, CORE_INTENTS
 from dyphanbot.datamanager import DataManager
 from dyphanbot.botcontroller import BotController
+from dyphanbot.cachepolicy import CachePolicy
+from dyphanbot.dispatcher import CommandDispatcher
+from dyphanbot.events import EventBus
+from dyphanbot.metrics import Metrics
+from dyphanbot.ratelimit import RateLimiter
+from dyphanbot.shards import ShardMonitor
 from dyphanbot.pluginloader import PluginLoader
+from dyphanbot.startupprofile import StartupProfiler
 from dyphanbot.api import WebAPI
 from dyphanbot import __version__
 
@@ -25,36 +34,49 @@ class DyphanBot(discord.Client):
         self.logger = logging.getLogger(__name__)
         self.debug = kwargs.get('verbose')
         self.dev_mode = kwargs.get('dev_mode')
+        self.serve_web_api = kwargs.get('web_api', True)
+        self.profiler = kwargs.get('profiler') or StartupProfiler(enabled=False)
         if self.debug:
             logging.getLogger("dyphanbot").setLevel(logging.DEBUG)
         
         self.setup(config_path)
-        super().__init__(intents=self._intents)
+        with self.profiler.phase("client"):
+            super().__init__(**self.client_options())
     
     def setup(self, config_path):
         """ Initializes core DyphanBot components and loads plugins """
-        self.data = DataManager(self, config_path)
-        self.api_config = self.data._get_key('web_api', {})
-        self.web_api = WebAPI(self, self.api_config)
-        self.bot_controller = BotController(self)
-        self.pluginloader = PluginLoader(self,
-            disabled_plugins=self.data._get_key('disabled_plugins', []),
-            user_plugin_dirs=self.data._get_key('plugin_dirs', []),
-            dev_mode=self.dev_mode)
+        profiler = self.profiler
+        with profiler.phase("data manager"):
+            self.data = DataManager(self, config_path)
+        config = self.data.config
+        with profiler.phase("web api"):
+            self.web_api = WebAPI(self, self.data.protected('web_api'))
+        with profiler.phase("core components"):
+            self.bot_controller = BotController(self)
+            self.metrics = Metrics()
+            self.shard_monitor = ShardMonitor(self, self.metrics)
+            self.ratelimiter = RateLimiter(config.rate_limits)
+            self.dispatcher = CommandDispatcher(self, config.dispatch)
+            self.events = EventBus()
+            self.pluginloader = PluginLoader(self,
+                disabled_plugins=config.disabled_plugins,
+                user_plugin_dirs=config.plugin_dirs,
+                dev_mode=self.dev_mode,
+                lazy=config.lazy_plugins,
+                init_workers=config.plugin_init_workers)
         
-        self._intents = discord.Intents.all() # fuck intents
+        # plugins add the intents they require on top of the core ones
+        self._intents = discord.Intents(**{intent: True for intent in CORE_INTENTS})
         
-        self.commands = {}
+        self.commands = self.dispatcher.commands
 
-        # TODO: make this into one dict with all the handlers
-        self.msg_handlers = []
-        self.ready_handlers = []
-        self.mjoin_handlers = []
-
-        self.pluginloader.load_plugins()
+        with profiler.phase("plugins"):
+            self.pluginloader.load_plugins()
+        with profiler.phase("help catalog"):
+            self.bot_controller.help_catalog.rebuild()
 
         # config overrides plugin intents
-        for intent, val in self.data._get_key('intents', {}).items():
+        for intent, val in config.intents.items():
             if intent in discord.Intents.VALID_FLAGS and isinstance(val, bool):
                 setattr(self._intents, intent, val)
             else:
@@ -63,41 +85,89 @@ class DyphanBot(discord.Client):
                     "with value `{}` (must be valid intent with boolean value)"
                     .format(intent, val))
 
-    def run(self):
-        super().run(self.data._get_key('token'))
+        self.cache_policy = CachePolicy(config.cache, self._intents)
 
-    def add_command_handler(self, command, handler, permissions=None, plugin=None):
-        handler.__dict__['plugin'] = plugin
-        handler.__dict__['permissions'] = permissions
-        self.commands[command] = handler
+    async def close(self):
+        await self.data.flush()
+        await super().close()
+        self.data.close()
 
-    def add_message_handler(self, handler, raw=False):
-        handler.__dict__['raw'] = raw
-        self.msg_handlers.append(handler)
+    async def start(self, token, *, reconnect=True):
+        await self.pluginloader.start_plugins()
+        await super().start(token, reconnect=reconnect)
+
+    def client_options(self):
+        """ Returns the keyword arguments passed to the underlying client """
+        return dict(intents=self._intents, **self.cache_policy.options())
+
+    def run(self):
+        super().run(self.data.protected('token'))
+
+    def add_command_handler(self, command, handler, permissions=None, plugin=None, rate=None):
+        self.dispatcher.add_command(command, handler, permissions, plugin, rate)
+
+    def add_message_handler(self, handler, raw=False, ordered=False):
+        self.dispatcher.add_message_handler(handler, raw, ordered)
+
+    def add_event_handler(self, handler, event=None, priority=0, owner=None):
+        """ Subscribes a coroutine to a gateway event on the event bus
+
+        Args:
+            handler: The coroutine function to call with the event's arguments
+            event (str, optional): The event name without the `on_` prefix.
+                Defaults to the handler's name (e.g. `on_member_join`).
+            priority (int, optional): Handlers with a higher priority run
+                before the ones with a lower priority
+            owner (optional): The plugin the handler belongs to (defaults to
+                the object the handler is bound to)
+
+        """
+        if not asyncio.iscoroutinefunction(handler):
+            raise TypeError("event handler must be a coroutine function")
+        if event is None:
+            if not handler.__name__.startswith("on_"):
+                raise ValueError("event handler names must start with 'on_'")
+            event = handler.__name__[3:]
+        if owner is None:
+            owner = getattr(handler, '__self__', None)
+        return self.events.subscribe(event, handler, priority, owner)
 
     def add_ready_handler(self, handler):
         self.logger.debug("On ready handler called for '%s'", handler.__name__)
-        self.ready_handlers.append(handler)
+        self.events.subscribe("ready", functools.partial(handler, self),
+                              owner=getattr(handler, '__self__', None))
     
     def add_mjoin_handler(self, handler):
-        self.mjoin_handlers.append(handler)
+        self.events.subscribe("member_join", functools.partial(handler, self),
+                              owner=getattr(handler, '__self__', None))
+
+    def dispatch(self, event, *args, **kwargs):
+        self.shard_monitor.record(event, args)
+        super().dispatch(event, *args, **kwargs)
+        self.events.dispatch(event, *args, **kwargs)
 
     def bot_mention(self, msg):
         """Returns a mention string for the bot"""
         server = msg.guild if msg else None
         return '{0.mention}'.format(server.me if server else self.user)
 
+    def parse_message(self, message):
+        """ Returns the :obj:`dyphanbot.utils.ParsedMessage` for a message,
+            parsed once and shared by the core and every plugin
+        """
+        return self.dispatcher.parse(message)
+
     def get_avatar_url(self):
         """Returns a URL for the bot's avatar"""
         return utils.get_user_avatar_url(self.user)
 
     def get_bot_masters(self):
         """ Returns a list of configured Bot Masters' user IDs """
-        return self.data._get_key('bot_masters', [])
+        return list(self.data.config.bot_masters)
     
     def is_botmaster(self, user):
         """ Returns True if the user is a botmaster, False otherwise """
-        return str(user.id) in self.get_bot_masters()
+        return str(user.id) in self.data.config.bot_masters
     
     def release_info(self):
         """ Returns a dict containing release name and version information """
@@ -106,69 +176,60 @@ class DyphanBot(discord.Client):
             "name": CB_NAME
         }
 
+    def shard_stats(self):
+        """ Returns a list of dicts with each shard's latency, event rate and
+            reconnect counts
+        """
+        return self.shard_monitor.snapshot()
+
     async def process_command(self, message, cmd, args, prefix=False):
-        self.logger.info("Got command `%s` with args `%s`", cmd, ' '.join(args))
-        if await self.bot_controller._process_command(message, cmd, args, prefix):
-            return None
-        if cmd in self.commands:
-            # handle commands disabled by the guild settings
-            disabled_commands = self.bot_controller._get_settings_for_guild(message.guild, "disabled_commands")
-            if disabled_commands and (cmd in disabled_commands):# and not message.author.guild_permissions.manage_guild:
-                return None
-            
-            if self.commands[cmd].permissions:
-                # handle permissions (botmaster and guild)
-                cmd_perms = self.commands[cmd].permissions
-                self.logger.info("Command `%s` has permissions `%s`", cmd, cmd_perms)
-                if "botmaster" in cmd_perms and cmd_perms["botmaster"]:
-                    return (await self.commands[cmd](self, message, args) if self.is_botmaster(message.author) else None)
-                if "guild_perms" in cmd_perms:
-                    member_perms = message.channel.permissions_for(message.author)
-                    for perms in cmd_perms["guild_perms"]:
-                        if not getattr(member_perms, perms):
-                            return None
-            
-            return await self.commands[cmd](self, message, args)
-        return None
+        return await self.dispatcher.process_command(message, cmd, args, prefix)
 
     async def on_ready(self):
-        self.logger.debug("Found %d ready handlers: %s", len(self.ready_handlers), self.ready_handlers)
-        for handler in self.ready_handlers:
-            await handler(self)
+        ready_handlers = self.events.get_handlers("ready")
+        self.logger.debug("Found %d ready handlers: %s", len(ready_handlers), ready_handlers)
 
         intents = dict(iter(self.intents))
         self.logger.info("Enabled intents: %s", ' '.join([x for x in intents if intents[x]]))
         self.logger.info("Disabled intents: %s", ' '.join([x for x in intents if not intents[x]]))
 
-        self.web_api.start_server()
+        if self.serve_web_api:
+            self.web_api.start_server()
 
         release_name = CB_NAME
         if __version__:
             release_name += f"@{__version__}"
         self.logger.info("Initialized %s (%s) running %s", self.user.name, self.user.id, release_name)
     
-    async def on_member_join(self, member):
-        for handler in self.mjoin_handlers:
-            await handler(self, member)
-
     async def on_message(self, message):
         # Disable DMs until we support them
         if isinstance(message.channel, discord.DMChannel):
             if message.author != self.user:
                 return await message.channel.send("Direct messages are not fully supported yet.. Still have to work out bugs and stuff")
             return
-        cmd_handler = None
-        prefix = self.bot_controller._get_prefix(message.guild)
-        full_cmd, args = utils.parse_command(self, message, prefix)
-        if len(full_cmd) < 1:
-            # don't process if there's no command (happens when bot gets mentioned without a command or only the prefix was sent)
-            return
-        if self.user.mentioned_in(message) or (message.guild and message.guild.me.mentioned_in(message)):
-            cmd_handler = await self.process_command(message, full_cmd[0], args)
-        elif prefix and message.content.startswith(prefix):
-            cmd_handler = await self.process_command(message, full_cmd[0], args, True)
-        if not cmd_handler:
-            for handler in self.msg_handlers:
-                # Good luck reading this! lol
-                if handler.raw or (not handler.raw and ((prefix and message.content.startswith(prefix)) or (self.bot_mention(message) in message.content))):
-                    await handler(self, message)
+        await self.dispatcher.dispatch(message)
+
+class ShardedDyphanBot(DyphanBot, discord.AutoShardedClient):
+    """
+    DyphanBot running multiple shards in a single process
+
+    The shards are configured through the `sharding` config key, which may
+    contain `shard_count` and `shard_ids` (if left out, Discord's recommended
+    shard count is used and every shard is launched). A `sharding` keyword
+    argument of the same form overrides the config (used by cluster workers).
+    """
+    def __init__(self, config_path=None, sharding=None, **kwargs):
+        self._sharding = sharding
+        super().__init__(config_path, **kwargs)
+
+    def client_options(self):
+        options = super().client_options()
+        sharding = self._sharding or self.data.config.sharding
+        if sharding.get('shard_count'):
+            options['shard_count'] = sharding['shard_count']
+        if sharding.get('shard_ids'):
+            options['shard_ids'] = sharding['shard_ids']
+        return options
+
+    async def on_shard_ready(self, shard_id):
+        self.logger.info("Shard %d is ready (%d/%d)", shard_id, len(self.shards), self.shard_count)
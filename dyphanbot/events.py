@@ -0,0 +1,120 @@
+""" This module contains the EventBus class responsible for delivering gateway
+    events to plugin handlers.
+"""
+
+import asyncio
+import logging
+
+from dyphanbot.dispatcher import HandlerPool
+
+class EventHandler(object):
+    """ A handler subscribed to an event
+
+    Attributes:
+        callback: The coroutine function called with the event's arguments
+        priority (int): Handlers with a higher priority run first
+        owner: The object (usually a plugin) the handler belongs to
+
+    """
+
+    __slots__ = ('callback', 'priority', 'owner')
+
+    def __init__(self, callback, priority=0, owner=None):
+        self.callback = callback
+        self.priority = priority
+        self.owner = owner
+
+    def __repr__(self):
+        return "<EventHandler callback={0.callback!r} priority={0.priority}>".format(self)
+
+class EventBus(object):
+    """ Delivers events to any number of handlers per event name
+
+    Handlers are grouped by priority when they are attached or detached,
+    so delivering an event costs a single lookup by its name. Priority
+    groups run from the highest priority to the lowest; the handlers within
+    a group run concurrently through the handler pool.
+
+    By default, the bus has a pool of its own without a concurrency limit
+    or a timeout, so long-running handlers (e.g. a `ready` handler starting
+    a background loop) aren't cancelled and events don't wait on message
+    handlers.
+
+    Event names are given without the `on_` prefix, the same way
+    `discord.Client.dispatch()` receives them (e.g. `member_join`).
+
+    Args:
+        pool (:obj:`dyphanbot.dispatcher.HandlerPool`, optional): Runs the
+            handlers
+
+    """
+
+    def __init__(self, pool=None):
+        self.logger = logging.getLogger(__name__)
+        self.pool = pool or HandlerPool(max_concurrency=None, timeout=None)
+
+        self._handlers = {}
+        self._groups = {}
+        self._owners = {}
+        self._tasks = set()
+
+    def _rebuild(self, event):
+        """ Regroups a single event's handlers by descending priority """
+        handlers = self._handlers.get(event)
+        if not handlers:
+            self._handlers.pop(event, None)
+            self._groups.pop(event, None)
+            return
+
+        groups = {}
+        for handler in handlers:
+            groups.setdefault(handler.priority, []).append(handler.callback)
+        self._groups[event] = tuple(
+            groups[priority] for priority in sorted(groups, reverse=True))
+
+    def subscribe(self, event, callback, priority=0, owner=None):
+        """ Attaches a handler to an event and returns its :obj:`EventHandler` """
+        handler = EventHandler(callback, priority, owner)
+        self._handlers.setdefault(event, []).append(handler)
+        self._owners.setdefault(id(owner), set()).add(event)
+        self._rebuild(event)
+        self.logger.debug("Subscribed %r to event '%s'", callback, event)
+        return handler
+
+    def unsubscribe(self, event, callback):
+        """ Detaches a handler from an event """
+        handlers = self._handlers.get(event, [])
+        self._handlers[event] = [h for h in handlers if h.callback != callback]
+        self._rebuild(event)
+
+    def detach(self, owner):
+        """ Detaches every handler that belongs to `owner` """
+        for event in self._owners.pop(id(owner), ()):
+            handlers = self._handlers.get(event, [])
+            self._handlers[event] = [h for h in handlers if h.owner is not owner]
+            self._rebuild(event)
+
+    def has_handlers(self, event):
+        """ Returns True if any handler is attached to the event """
+        return event in self._groups
+
+    def get_handlers(self, event):
+        """ Returns a list of the event's :obj:`EventHandler` objects """
+        return list(self._handlers.get(event, []))
+
+    async def emit(self, event, *args, **kwargs):
+        """ Delivers the event to its handlers and waits for them to finish """
+        for group in self._groups.get(event, ()):
+            if len(group) == 1:
+                await self.pool.run(group[0], *args, **kwargs)
+            else:
+                await asyncio.gather(
+                    *[self.pool.run(callback, *args, **kwargs) for callback in group])
+
+    def dispatch(self, event, *args, **kwargs):
+        """ Schedules delivery of the event if it has any handlers """
+        if event not in self._groups:
+            return
+        task = asyncio.ensure_future(self.emit(event, *args, **kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -17,5 +17,20 @@ class InvalidConfigurationError(DyphanBotError):
     def __str__(self):
         return "{0}: '{1}'".format(self.message, self.key)
 
+class ConfigAccessError(DyphanBotError):
+    """ Raised when the protected configuration was already handed out """
+
 class PluginError(DyphanBotError):
     """ Raised by plugins """
+
+class PluginReloadError(DyphanBotError):
+    """ Raised when a plugin can't be reloaded """
+
+class DocumentNotFoundError(DyphanBotError):
+    """ Raised by storage backends when a document doesn't exist """
+    def __init__(self, name):
+        super().__init__("No such document")
+        self.name = name
+
+    def __str__(self):
+        return "{0}: '{1}'".format(self.message, self.name)
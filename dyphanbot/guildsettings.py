@@ -0,0 +1,376 @@
+""" This module contains the GuildSettingsStore class, an index of the
+    per-guild settings read on every message, and the sources it reads raw
+    guild settings from.
+"""
+
+import os
+import sys
+import logging
+
+from collections import namedtuple, OrderedDict
+
+DEFAULT_EXT_PREFIX = '+'
+
+# Default memory budget, in bytes, of a lazily loaded settings source
+DEFAULT_CACHE_BYTES = 8 * 1024 * 1024
+
+class GuildSettings(namedtuple('GuildSettings', ['guild_id', 'prefix', 'ext_prefix', 'disabled_commands'])):
+    """ An immutable view of a guild's core settings
+
+    Attributes:
+        guild_id (int): The guild's ID
+        prefix (str): The command prefix, or None if unset
+        ext_prefix (str): The extension prefix
+        disabled_commands (frozenset): Commands disabled in the guild
+
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, guild_id, data):
+        """ Builds a record from the guild's entry in `guildsettings.json` """
+        return cls(
+            guild_id=guild_id,
+            prefix=data.get("prefix"),
+            ext_prefix=data.get("ext-prefix", DEFAULT_EXT_PREFIX),
+            disabled_commands=frozenset(data.get("disabled_commands") or ())
+        )
+
+def approx_size(obj):
+    """ Returns the approximate number of bytes used by a JSON-like object """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += sys.getsizeof(key) + approx_size(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            size += approx_size(value)
+    return size
+
+def set_path(target, path, value):
+    """ Sets a value in nested dicts, creating missing dicts along `path` """
+    *parents, key = path
+    for part in parents:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    target[key] = value
+
+def delete_path(target, path):
+    """ Deletes a value from nested dicts if it exists """
+    *parents, key = path
+    for part in parents:
+        target = target.get(part)
+        if not isinstance(target, dict):
+            return
+    target.pop(key, None)
+
+class EagerGuildSettings(object):
+    """ Raw per-guild settings kept in one document, all in memory
+
+    This is the default source of guild settings. Changes are recorded in
+    the document's journal, if it has one.
+
+    Args:
+        data (dict, optional): The document, if it has no journal
+        journal (:obj:`dyphanbot.storage.journal.SettingsJournal`, optional):
+            The journal holding the document
+        root (tuple, optional): The keys leading to the dict of guilds
+            within the document (e.g. `("guilds",)`)
+
+    """
+
+    def __init__(self, data=None, journal=None, root=()):
+        self.data = data if data is not None else {}
+        self.journal = journal
+        self.root = tuple(root)
+        self.listeners = []
+
+    @property
+    def guilds(self):
+        """ dict: The guilds' settings, keyed by guild ID string """
+        target = self.journal.data if self.journal is not None else self.data
+        for part in self.root:
+            target = target.setdefault(part, {})
+        return target
+
+    def add_listener(self, callback):
+        """ Calls `callback(guild_id)` when a guild's cached settings are
+            dropped (with None when all of them are)
+        """
+        self.listeners.append(callback)
+
+    def get(self, guild_id):
+        """ Returns the guild's settings dict, or None if it has none """
+        return self.guilds.get(str(guild_id))
+
+    def set(self, guild_id, path, value):
+        """ Sets one of the guild's settings; `path` is the keys leading to
+            it within the guild's settings
+        """
+        path = (str(guild_id),) + tuple(path)
+        if self.journal is not None:
+            return self.journal.set(self.root + path, value)
+        set_path(self.guilds, path, value)
+        return value
+
+    def delete(self, guild_id, path):
+        """ Deletes one of the guild's settings """
+        path = (str(guild_id),) + tuple(path)
+        if self.journal is not None:
+            self.journal.delete(self.root + path)
+        else:
+            delete_path(self.guilds, path)
+
+    def reload(self, filename=None):
+        """ Reloads the document (e.g. after another process changed it) """
+        if self.journal is not None:
+            self.journal.load()
+        for callback in self.listeners:
+            callback(None)
+
+    def stats(self):
+        """ Returns the number of guilds with settings """
+        return {"guilds": len(self.guilds), "lazy": False}
+
+class LazyGuildSettings(object):
+    """ Raw per-guild settings kept in a document per guild, loaded on demand
+
+    Each guild's settings are stored as `<dirname>/<guild ID>.json`. A guild
+    is loaded the first time its settings are read and kept in an LRU
+    cache; the least recently used guilds are dropped once the cache
+    exceeds `budget` bytes. The storage backend isn't left holding its own
+    copy of loaded guilds, so the budget bounds their memory. Guilds without settings are cached too, so
+    they're only looked up once. A change saves just that guild's document.
+
+    If `dirname` hasn't been set up yet and the single-document `legacy`
+    file exists, its guilds (and journaled changes) are split into
+    per-guild documents first. The legacy file is left in place.
+
+    Args:
+        datamanager (:obj:`dyphanbot.datamanager.DataManager`): The data
+            manager documents are stored through
+        dirname (str): The directory of the per-guild documents
+        budget (int, optional): The cache's memory budget in bytes
+        legacy (str, optional): The single-document file to migrate from
+        root (tuple, optional): The keys leading to the dict of guilds
+            within the legacy document
+
+    """
+
+    def __init__(self, datamanager, dirname, budget=DEFAULT_CACHE_BYTES, legacy=None, root=()):
+        self.logger = logging.getLogger(__name__)
+        self.datamanager = datamanager
+        self.dirname = dirname
+        self.budget = budget
+        self.root = tuple(root)
+        self.listeners = []
+
+        self.cache = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        if legacy is not None:
+            self.migrate(legacy)
+        self.datamanager.watch(self.dirname + os.sep, self.reload)
+
+    def document(self, guild_id):
+        """ Returns the filename of a guild's document """
+        return os.path.join(self.dirname, "{0}.json".format(guild_id))
+
+    def migrate(self, legacy):
+        """ Splits the legacy single-document file into per-guild documents,
+            unless that's already been done
+        """
+        marker = os.path.join(self.dirname, "migrated.json")
+        if self.datamanager.find_json(marker) is not None:
+            return
+        if self.datamanager.find_json(legacy) is not None:
+            journal = self.datamanager.journal(legacy)
+            guilds = journal.data
+            for part in self.root:
+                guilds = guilds.get(part) or {}
+            self.logger.info("Splitting '%s' into per-guild documents (%d guilds)...", legacy, len(guilds))
+            for guild_id, settings in guilds.items():
+                if settings:
+                    self.datamanager.save_json(self.document(guild_id), settings)
+            journal.close()
+            self.datamanager.journals.pop(legacy, None)
+        self.datamanager.save_json(marker, {"from": legacy})
+
+    def add_listener(self, callback):
+        """ Calls `callback(guild_id)` when a guild's cached settings are
+            dropped (with None when all of them are)
+        """
+        self.listeners.append(callback)
+
+    def _store(self, guild_id, settings):
+        size = sys.getsizeof(guild_id) + approx_size(settings)
+        old = self.cache.pop(guild_id, None)
+        if old is not None:
+            self.size -= old[1]
+        self.cache[guild_id] = (settings, size)
+        self.size += size
+        while self.size > self.budget and len(self.cache) > 1:
+            evicted, (_, evicted_size) = self.cache.popitem(last=False)
+            self.size -= evicted_size
+            for callback in self.listeners:
+                callback(evicted)
+
+    def get(self, guild_id):
+        """ Returns the guild's settings dict, or None if it has none """
+        guild_id = str(guild_id)
+        cached = self.cache.get(guild_id)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(guild_id)
+            return cached[0]
+        self.misses += 1
+        settings = self.datamanager.find_json(self.document(guild_id))
+        self.datamanager.backend.forget(self.document(guild_id))
+        self._store(guild_id, settings)
+        return settings
+
+    def set(self, guild_id, path, value):
+        """ Sets one of the guild's settings and saves the guild's document;
+            `path` is the keys leading to it within the guild's settings
+        """
+        settings = self.get(guild_id)
+        if settings is None:
+            settings = {}
+        set_path(settings, tuple(path), value)
+        self.datamanager.save_json(self.document(guild_id), settings)
+        self._store(str(guild_id), settings)
+        return value
+
+    def delete(self, guild_id, path):
+        """ Deletes one of the guild's settings and saves the guild's
+            document
+        """
+        settings = self.get(guild_id)
+        if settings is None:
+            return
+        delete_path(settings, tuple(path))
+        self.datamanager.save_json(self.document(guild_id), settings)
+        self._store(str(guild_id), settings)
+
+    def reload(self, filename=None):
+        """ Drops a changed guild document from the cache (or every guild if
+            `filename` is None), so it's loaded again on its next access
+        """
+        guild_id = None
+        if filename is not None:
+            guild_id = os.path.splitext(os.path.basename(filename))[0]
+            if not guild_id.isdigit():
+                return
+            cached = self.cache.pop(guild_id, None)
+            if cached is not None:
+                self.size -= cached[1]
+        else:
+            self.cache.clear()
+            self.size = 0
+        for callback in self.listeners:
+            callback(guild_id)
+
+    def stats(self):
+        """ Returns the number of cached guilds, their memory footprint and
+            the cache's hit rate
+        """
+        return {
+            "guilds": len(self.cache),
+            "lazy": True,
+            "bytes": self.size,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+class GuildSettingsStore(object):
+    """ Keeps a :obj:`GuildSettings` record per guild, keyed by integer ID
+
+    Records are built from a guild's raw settings (read from an
+    :obj:`EagerGuildSettings` or :obj:`LazyGuildSettings` source) the first
+    time the guild is looked up, and rebuilt only when its settings are
+    changed through `set()`, so looking up a guild's prefixes and disabled
+    commands costs a single dict lookup. Records of guilds the source drops
+    from memory are dropped along with them.
+
+    Args:
+        source: The source of the guilds' raw settings, or a dict of raw
+            settings keyed by guild ID strings
+
+    """
+
+    def __init__(self, source):
+        self.logger = logging.getLogger(__name__)
+        if isinstance(source, dict):
+            source = EagerGuildSettings(source)
+        self.source = source
+        self.default = GuildSettings(None, None, DEFAULT_EXT_PREFIX, frozenset())
+        self._records = {}
+        self.source.add_listener(self.forget)
+
+    def get(self, guild_id):
+        """ Returns the guild's record, or the default record if the guild
+            has no settings
+        """
+        record = self._records.get(guild_id)
+        if record is None:
+            record = self._records[guild_id] = self._build(guild_id)
+        return record
+
+    def _build(self, guild_id):
+        settings = self.source.get(guild_id)
+        if not settings:
+            return self.default
+        try:
+            return GuildSettings.from_dict(int(guild_id), settings)
+        except (TypeError, ValueError, AttributeError):
+            self.logger.warning("Ignoring invalid settings of guild '%s'", guild_id)
+            return self.default
+
+    def raw(self, guild_id):
+        """ Returns the guild's raw settings dict, or None if it has none """
+        return self.source.get(guild_id)
+
+    def forget(self, guild_id=None):
+        """ Drops a guild's record (or every record if `guild_id` is None) """
+        if guild_id is None:
+            self._records.clear()
+        else:
+            self._records.pop(int(guild_id), None)
+
+    def rebuild(self, guild_id):
+        """ Rebuilds a guild's record from its raw settings """
+        self.forget(guild_id)
+        return self.get(guild_id)
+
+    def set(self, guild_id, key, value):
+        """ Sets a raw setting for the guild and rebuilds its record """
+        self.source.set(guild_id, (key,), value)
+        return self.rebuild(guild_id)
+
+    def __len__(self):
+        return len(self._records)
+
+    def memory_usage(self):
+        """ Returns the approximate number of bytes used by the records """
+        size = sys.getsizeof(self._records)
+        for guild_id, record in self._records.items():
+            size += sys.getsizeof(guild_id) + sys.getsizeof(record)
+            size += sys.getsizeof(record.prefix) + sys.getsizeof(record.ext_prefix)
+            size += sys.getsizeof(record.disabled_commands)
+            size += sum(sys.getsizeof(cmd) for cmd in record.disabled_commands)
+        return size
+
+    def stats(self):
+        """ Returns the number of indexed guilds, their memory footprint and
+            the source's statistics
+        """
+        return {
+            "guilds": len(self),
+            "bytes": self.memory_usage(),
+            "source": self.source.stats()
+        }
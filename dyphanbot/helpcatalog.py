@@ -0,0 +1,94 @@
+""" This module contains the HelpCatalog class, which indexes plugin commands
+    and caches rendered help embeds.
+"""
+
+import logging
+
+from collections import OrderedDict
+
+# Maximum number of rendered embeds kept in the cache
+EMBED_CACHE_SIZE = 1024
+
+class HelpCatalog(object):
+    """ Indexes each plugin's commands and caches rendered help
+
+    The plugin-to-commands index is built when plugins are loaded. Help
+    embeds and plugin help summaries are rendered on first use and cached
+    by the prefix they were rendered with, so repeated help requests cost
+    a dict lookup. The cache is cleared when plugins change; a guild
+    changing its prefix simply gets renders made with the new one.
+
+    Attributes:
+        commands_by_plugin (dict): A plugin name to list of command names
+            index
+
+    Args:
+        dyphanbot (:obj:`dyphanbot.DyphanBot`): The main DyphanBot object
+
+    """
+
+    def __init__(self, dyphanbot):
+        self.logger = logging.getLogger(__name__)
+        self.dyphanbot = dyphanbot
+
+        self.commands_by_plugin = {}
+        self._summaries = {}
+        self._embeds = OrderedDict()
+
+    def rebuild(self):
+        """ Rebuilds the command index and clears every cached render """
+        index = {}
+        for cmd_name, command in self.dyphanbot.commands.items():
+            plugin = command.__dict__.get('plugin')
+            if not plugin:
+                continue
+            index.setdefault(getattr(plugin, "name", None) or type(plugin).__name__, []).append(cmd_name)
+        self.commands_by_plugin = index
+        self.invalidate()
+
+    def invalidate(self):
+        """ Clears every cached render """
+        self._summaries.clear()
+        self._embeds.clear()
+
+    def get_commands(self, plugin_name):
+        """ Returns the names of the commands registered by a plugin """
+        return self.commands_by_plugin.get(plugin_name, [])
+
+    async def get_summary(self, plugin_name, plugin):
+        """ Returns the plugin's help dict rendered without a message (used
+            for listings), or None if its help method failed
+        """
+        if plugin_name in self._summaries:
+            return self._summaries[plugin_name]
+        try:
+            plugin = await self.dyphanbot.pluginloader.aload_plugin(plugin)
+            summary = await plugin.help(None, [plugin_name])
+        except Exception:
+            self.logger.warning("Plugin '%s' failed to render its help.", plugin_name)
+            return None
+        self._summaries[plugin_name] = summary
+        return summary
+
+    async def get_embed(self, key, render):
+        """ Returns the cached embed for `key`, rendering it with the
+            `render` coroutine function on a miss. `render` may return None
+            to skip caching (e.g. on errors).
+
+        `key` should include the prefix the embed was rendered with (e.g.
+        `("help", prefix)`), so guilds with different prefixes get their own
+        renders and a guild changing its prefix simply misses the cache.
+        Renders are only dropped when plugins change (see `invalidate()`)
+        or when the cache is full, least recently used first.
+        """
+        embed = self._embeds.get(key)
+        if embed is not None:
+            self._embeds.move_to_end(key)
+            return embed
+
+        embed = await render()
+        if embed is not None:
+            self._embeds[key] = embed
+            if len(self._embeds) > EMBED_CACHE_SIZE:
+                self._embeds.popitem(last=False)
+        return embed
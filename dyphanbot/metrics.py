@@ -0,0 +1,32 @@
+""" This module contains the Metrics class used to count bot activity. """
+
+from collections import Counter
+
+class Metrics(object):
+    """ In-memory counters for bot activity
+
+    Counters are identified by a name and optional labels, e.g.
+    `metrics.incr("commands_rejected", scope="user", command="audio")`.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+
+    @staticmethod
+    def _key(name, labels):
+        if not labels:
+            return name
+        return "{0}{{{1}}}".format(
+            name, ",".join("{0}={1}".format(k, labels[k]) for k in sorted(labels)))
+
+    def incr(self, name, amount=1, **labels):
+        """ Increments a counter by `amount` """
+        self.counters[self._key(name, labels)] += amount
+
+    def get(self, name, **labels):
+        """ Returns the current value of a counter """
+        return self.counters[self._key(name, labels)]
+
+    def snapshot(self):
+        """ Returns a dict of every counter and its current value """
+        return dict(self.counters)
@@ -2,16 +2,27 @@
 
 import os
 import sys
-import glob
+import time
+import types
+import asyncio
+import inspect
 import logging
 import functools
+import threading
 import importlib.util
+import discord
 
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from importlib.machinery import PathFinder
 
 from aiohttp import web
 
-from dyphanbot.constants import PLUGIN_DIRS
+from dyphanbot.constants import PLUGIN_DIRS, PRIVILEGED_INTENTS
+from dyphanbot.exceptions import PluginReloadError
+from dyphanbot.pluginmanifest import PluginDiscovery, PluginManifest
+
+# Seconds before loading a lazy plugin that failed to load is tried again
+LAZY_RETRY_INTERVAL = 30
 
 class Plugin(object):
     """ Superclass for DyphanBot plugins; plugins should subclass from this
@@ -19,12 +30,26 @@ class Plugin(object):
     Attributes:
         dyphanbot (:obj:`dyphanbot.DyphanBot`): The main DyphanBot object
         intents (:obj:`discord.Intents`): The intents the bot has access to
+        required_intents (:obj:`tuple` of :obj:`str`): Class attribute naming
+            the gateway intents the plugin needs (e.g. `("members",)`); the
+            bot enables the union of every plugin's intents at startup
+        lazy (bool): Class attribute; set it to False to always initialize
+            the plugin at startup, even when plugins are loaded lazily (e.g.
+            if it builds its handlers dynamically)
+        depends (:obj:`tuple` of :obj:`str`): Class attribute naming the
+            plugins (by class name) that must be initialized, and started,
+            before this one; plugins that don't depend on each other are
+            initialized concurrently on separate threads
     
     Args:
         dyphanbot (:obj:`dyphanbot.DyphanBot`): The main DyphanBot object
     
     """
 
+    required_intents = ()
+    lazy = True
+    depends = ()
+
     def __init__(self, dyphanbot):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.dyphanbot = dyphanbot
@@ -44,6 +69,36 @@ class Plugin(object):
         """
         pass
 
+    async def astart(self):
+        """ Called on the event loop before the bot connects (or, for a
+            plugin loaded on first use, before its first handler runs).
+            Override this for startup I/O instead of blocking in `start()`.
+        """
+        pass
+
+    def export_state(self):
+        """ Called when the plugin is about to be replaced by a reloaded
+            instance of itself (see `PluginLoader.reload_plugin()`)
+
+        Override this (optionally as a coroutine) to hand live state, such
+        as open connections or queues, to the new instance instead of
+        losing it. The plugin's handlers are already detached when it's
+        called.
+
+        Returns:
+            Anything; it's passed as is to the new instance's
+            `import_state()`
+
+        """
+        return None
+
+    def import_state(self, state):
+        """ Called on a reloaded plugin, before its handlers are attached,
+            with what the instance it replaces returned from
+            `export_state()`; may be a coroutine
+        """
+        pass
+
     def load_json(self, filename, initial_data={}, save_json=None, **kwargs):
         """ Loads JSON file as an object from the plugin's own data directory
 
@@ -56,6 +111,10 @@ class Plugin(object):
         `**kwargs` are passed to the internal `json.load()` function for
         extra control.
 
+        With the default JSON storage backend, a file is only parsed again
+        once it changes on disk, so calling this on every event is cheap.
+        Each call returns its own copy; save it after changing it.
+
         Args:
             filename (str): The filename found in the plugin's data directory
             initial_data (dict, optional): The default data to initialize a new
@@ -84,7 +143,87 @@ class Plugin(object):
         
         """
         return self.dyphanbot.data.save_json(os.path.join(self.__class__.__name__, filename), data, **kwargs)
+
+    async def aload_json(self, filename, initial_data={}, save_json=None, **kwargs):
+        """ Asynchronous counterpart of `load_json()`; prefer it in command
+            and event handlers
+
+        The file is read and decoded on the bot's I/O thread pool (see
+        `DataManager.aload_json()`), so a slow disk or a large file doesn't
+        block the event loop. `save_json` may be a coroutine function.
+        """
+        return await self.dyphanbot.data.aload_json(os.path.join(self.__class__.__name__, filename), initial_data, save_json, **kwargs)
+
+    async def asave_json(self, filename, data, **kwargs):
+        """ Asynchronous counterpart of `save_json()`; the file has been
+            written once it returns (see `DataManager.asave_json()`)
+        """
+        return await self.dyphanbot.data.asave_json(os.path.join(self.__class__.__name__, filename), data, **kwargs)
     
+    def journal_json(self, filename, initial_data={}):
+        """ Returns the journal of a settings file in the plugin's own data
+            directory
+
+        Changing the file's settings through the returned
+        :obj:`dyphanbot.storage.journal.SettingsJournal` appends one record
+        per change instead of saving the whole file (see
+        `DataManager.journal()`).
+
+        Args:
+            filename (str): The filename found in the plugin's data directory
+            initial_data (dict, optional): The settings to start with if the
+                file doesn't exist yet
+
+        """
+        return self.dyphanbot.data.journal(os.path.join(self.__class__.__name__, filename), initial_data)
+
+    def guild_settings(self, filename, root=()):
+        """ Returns the source of per-guild settings stored in a file in the
+            plugin's own data directory
+
+        The returned object's `get(guild_id)` returns a guild's settings
+        dict (or None), and `set(guild_id, path, value)` and
+        `delete(guild_id, path)` change them. Depending on the
+        `storage.lazy_guild_settings` config, guilds are either all kept in
+        memory or loaded on demand (see `DataManager.guild_settings()`).
+
+        Args:
+            filename (str): The filename found in the plugin's data directory
+            root (tuple, optional): The keys leading to the dict of guilds
+                within the file (e.g. `("guilds",)`)
+
+        """
+        return self.dyphanbot.data.guild_settings(os.path.join(self.__class__.__name__, filename), root)
+
+    def get_value(self, key, guild=None, default=None):
+        """ Returns a single value stored by the plugin, optionally scoped to
+            a guild (see `DataManager.get()`)
+        """
+        return self.dyphanbot.data.get(self.__class__.__name__, key, guild, default)
+
+    def set_value(self, key, value, guild=None):
+        """ Stores a single JSON-serializable value for the plugin """
+        self.dyphanbot.data.set(self.__class__.__name__, key, value, guild)
+
+    def delete_value(self, key, guild=None):
+        """ Deletes a single value stored by the plugin """
+        return self.dyphanbot.data.delete(self.__class__.__name__, key, guild)
+
+    def watch_json(self, filename, callback):
+        """ Calls `callback(filename)` whenever another process changes a JSON
+            file in the plugin's own data directory (only with storage
+            backends shared between processes)
+
+        Plugins that keep a loaded file in memory should use this to reload
+        it, so their copy doesn't go stale when the bot runs as a cluster.
+
+        Args:
+            filename (str): The filename found in the plugin's data directory
+            callback (func): Called on the event loop with the full filename
+
+        """
+        self.dyphanbot.data.watch(os.path.join(self.__class__.__name__, filename), callback)
+
     def get_local_prefix(self, message):
         """ Returns the prefix for the guild if assigned, otherwise, returns
             the bot mention
@@ -142,9 +281,17 @@ class Plugin(object):
         return handler
 
     @staticmethod
-    def event(handler):
+    def event(handler=None, *, priority=0):
+        """ Subscribes to the gateway event matching the handler's name
+            (e.g. `on_member_join`); handlers with a higher `priority` run
+            first
+        """
+        if not handler:
+            return functools.partial(Plugin.event, priority=priority)
+
         assert not handler.__name__.startswith('_'), "Handlers must be public"
         handler.__dict__['event_handler'] = True
+        handler.__dict__['priority'] = priority
         return handler
 
     @staticmethod
@@ -161,9 +308,12 @@ class Plugin(object):
         return handler
 
     @staticmethod
-    def command(handler=None, *, cmd=None, botmaster=False, perms=[]):
+    def command(handler=None, *, cmd=None, botmaster=False, perms=[], rate=None):
+        """ Registers a command handler; `rate` optionally limits how often
+            each user can call it, as a `(calls, seconds)` pair
+        """
         if not handler:
-            return functools.partial(Plugin.command, cmd=cmd, botmaster=botmaster, perms=perms)
+            return functools.partial(Plugin.command, cmd=cmd, botmaster=botmaster, perms=perms, rate=rate)
 
         if not cmd:
             cmd = handler.__name__
@@ -172,20 +322,214 @@ class Plugin(object):
         handler.__dict__['command'] = cmd
         handler.__dict__['botmaster'] = botmaster
         handler.__dict__['guild_perms'] = perms
+        handler.__dict__['rate'] = rate
 
         return handler
 
     @staticmethod
-    def on_message(handler=None, *, raw=False):
+    def on_message(handler=None, *, raw=False, ordered=False):
         if not handler:
-            return functools.partial(Plugin.on_message, raw=raw)
+            return functools.partial(Plugin.on_message, raw=raw, ordered=ordered)
 
         assert not handler.__name__.startswith('_'), "Handlers must be public"
         handler.__dict__['msg_handler'] = True
         handler.__dict__['raw'] = raw
+        handler.__dict__['ordered'] = ordered
 
         return handler
 
+def plugin_handlers(plugin_obj):
+    """ Yields the `(name, kind, options)` of each of a plugin's handlers,
+        as set by `Plugin`'s decorators
+    """
+    for name, method in plugin_obj.__class__.__dict__.items():
+        real_method = getattr(plugin_obj, name, None)
+        if not real_method or not callable(real_method):
+            continue
+        if hasattr(method, "ready_handler"):
+            yield name, "ready", {}
+        elif hasattr(method, "mjoin_handler"):
+            yield name, "member_join", {}
+        elif hasattr(method, "command"):
+            yield name, "command", {
+                "cmd": real_method.command,
+                "botmaster": real_method.botmaster,
+                "perms": real_method.guild_perms,
+                "rate": getattr(real_method, "rate", None)
+            }
+        elif hasattr(method, "msg_handler") and hasattr(method, "raw"):
+            yield name, "message", {
+                "raw": real_method.raw,
+                "ordered": getattr(real_method, "ordered", False)
+            }
+        elif hasattr(method, "event_handler"):
+            yield name, "event", {"priority": getattr(real_method, "priority", 0)}
+        elif hasattr(method, "endpoint_handler"):
+            yield name, "endpoint", {
+                "endpoint": real_method.endpoint,
+                "method": real_method.method
+            }
+
+def plugin_info(plugin_obj):
+    """ Describes an initialized plugin the way the plugin manifest does """
+    return {
+        "class": type(plugin_obj).__name__,
+        "required_intents": list(plugin_obj.required_intents),
+        "handlers": [{
+            "attr": name,
+            "kind": kind,
+            "coroutine": asyncio.iscoroutinefunction(getattr(plugin_obj, name)),
+            "options": options
+        } for name, kind, options in plugin_handlers(plugin_obj)]
+    }
+
+class LazyPlugin(object):
+    """ Stands in for a plugin that hasn't been imported yet
+
+    The loader registers a stub for each handler listed in the plugin's
+    manifest entry. The first time any of them is called, the plugin's
+    module is imported and the plugin initialized, and from then on the
+    stubs forward to the plugin's own handlers. Coroutine stubs import and
+    initialize the plugin on a worker thread, so the event loop isn't
+    blocked meanwhile, and wait for the plugin's `astart()` hook before the
+    first call is forwarded. Other attributes (e.g. `help()`) are looked up
+    on the plugin, which loads it too.
+
+    If the plugin fails to load, calls fail right away for the next
+    `LAZY_RETRY_INTERVAL` seconds; after that, the next call tries to load
+    it again. Reloading the plugin also retries right away.
+
+    The loader also uses these stubs to hold a plugin's calls while it's
+    being reloaded; then, `pending` is set and coroutine stubs wait for
+    the reloaded plugin instead of importing it.
+
+    Attributes:
+        name (str): The plugin's class name
+        module (str): The name of the plugin's module
+        info (dict): The plugin's manifest entry
+        instance: The initialized plugin, or None until it's loaded
+        error (:obj:`Exception`): Why the last attempt to load the plugin
+            failed, or None
+        pending (:obj:`asyncio.Future`): Resolves to the plugin being
+            swapped in, or None if the stubs aren't holding a reload
+
+    """
+
+    def __init__(self, loader, module, info, additional_paths):
+        self.loader = loader
+        self.module = module
+        self.info = info
+        self.additional_paths = additional_paths
+        self.name = info["class"]
+        self.instance = None
+        self.error = None
+        self.failed_at = None
+        self.pending = None
+        self.app = None
+        self._lock = threading.RLock()
+        self._loading = False
+        self._constructed = None
+        self._constructing = None
+
+    def _check(self):
+        """ Raises ImportError if the plugin can't be loaded right now """
+        if self.instance is None and self.pending is not None:
+            if not self.pending.done():
+                raise ImportError(f"Plugin {self.name!r} is being reloaded")
+            self.instance = self.pending.result()
+        if self.instance is None and self.error is not None:
+            if time.monotonic() - self.failed_at < LAZY_RETRY_INTERVAL:
+                raise ImportError(f"Plugin {self.name!r} failed to load: {self.error}")
+
+    def construct(self):
+        """ Imports and initializes the plugin without registering it; may
+            run on a worker thread
+
+        Raises:
+            ImportError: If the plugin failed to load
+
+        """
+        with self._lock:
+            if self.instance is not None:
+                return self.instance
+            if self._constructed is not None:
+                return self._constructed
+            if self._loading:
+                raise ImportError(f"Plugin {self.name!r} has a circular dependency")
+            self._loading = True
+            try:
+                self._constructed = self.loader.construct_lazy(self)
+            except Exception as err:
+                self.error = err
+                self.failed_at = time.monotonic()
+                self.loader.logger.warning("Unable to load plugin '%s': %s", self.name, err)
+                raise ImportError(f"Plugin {self.name!r} failed to load: {err}") from err
+            finally:
+                self._loading = False
+            self.error = None
+            return self._constructed
+
+    def _activate(self, plugin_obj):
+        with self._lock:
+            if self.instance is None:
+                self.instance = self.loader.activate(self, plugin_obj)
+                self._constructed = None
+            return self.instance
+
+    def load(self):
+        """ Returns the plugin, importing and initializing it if needed
+
+        Raises:
+            ImportError: If the plugin failed to load (now or recently)
+
+        """
+        self._check()
+        if self.instance is None:
+            self._activate(self.construct())
+        return self.instance
+
+    async def aload(self):
+        """ Returns the plugin once it's loaded and its `astart()` hook ran;
+            it's imported and initialized on a worker thread
+        """
+        if self.instance is None and self.pending is not None:
+            await asyncio.shield(self.pending)
+        self._check()
+        if self.instance is None:
+            if self._constructing is None:
+                self._constructing = asyncio.get_running_loop().run_in_executor(None, self.construct)
+                self._constructing.add_done_callback(lambda _: setattr(self, '_constructing', None))
+            self._activate(await asyncio.shield(self._constructing))
+        plugin = self.instance
+        await self.loader.start_plugin(plugin)
+        return plugin
+
+    def stub(self, handler):
+        """ Returns a bound stub for one of the plugin's manifest handlers """
+        attr = handler["attr"]
+        if handler["coroutine"]:
+            async def stub(self, *args, **kwargs):
+                return await getattr(await self.aload(), attr)(*args, **kwargs)
+        else:
+            def stub(self, *args, **kwargs):
+                return getattr(self.load(), attr)(*args, **kwargs)
+        stub.__name__ = stub.__qualname__ = attr
+        return types.MethodType(stub, self)
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        if self.instance is not None:
+            state = "loaded"
+        elif self.pending is not None:
+            state = "reloading"
+        else:
+            state = "not loaded"
+        return f"<LazyPlugin {self.name!r} ({state})>"
+
 class PluginLoader(object):
     """ Handles the loading and importing of plugins from each directory
 
@@ -196,6 +540,13 @@ class PluginLoader(object):
         plugin_dirs (:obj:`list` of :obj:`str`): A list of paths to
             plugin directories
         dev_mode (bool): If true, raises a plugin exception, otherwise skip it
+        lazy (bool): Whether plugins are imported on first use
+        manifest (:obj:`dyphanbot.pluginmanifest.PluginManifest`): The
+            plugin manifest, if plugins are loaded lazily
+        discovery (:obj:`dyphanbot.pluginmanifest.PluginDiscovery`): Finds
+            plugin modules in the plugin directories
+        init_times (dict): Seconds each plugin took to initialize
+        start_times (dict): Seconds each plugin's `astart()` hook took
     
     Args:
         dyphanbot (:obj:`dyphanbot.DyphanBot`): The main DyphanBot object
@@ -204,98 +555,399 @@ class PluginLoader(object):
         user_plugin_dirs (:obj:`list` of :obj:`str`): A list of user-defined
             paths to plugin directories (appended to built-in paths)
         dev_mode (bool): If true, raises a plugin exception, otherwise skip it
+        lazy (bool, optional): If true, plugins listed in the plugin manifest
+            are only imported and initialized when one of their handlers is
+            first called (ignored in `dev_mode`)
+        init_workers (int, optional): How many plugins may be initialized
+            at once, on separate threads
 
     """
 
-    def __init__(self, dyphanbot, disabled_plugins=[], user_plugin_dirs=[], dev_mode=False):
+    def __init__(self, dyphanbot, disabled_plugins=[], user_plugin_dirs=[], dev_mode=False, lazy=False,
+                 init_workers=1):
         self.logger = logging.getLogger(__name__)
         self.dyphanbot = dyphanbot
         self.disabled_plugins = disabled_plugins
-        self.plugin_dirs = PLUGIN_DIRS + [os.path.expanduser(pdirs) for pdirs in user_plugin_dirs]
+        # duplicates would be searched twice, both for plugins and imports
+        self.plugin_dirs = list(dict.fromkeys(
+            PLUGIN_DIRS + [os.path.expanduser(pdirs) for pdirs in user_plugin_dirs]))
         self.dev_mode = dev_mode
+        self.lazy = lazy and not dev_mode
+        self.manifest = None
+        self.discovery = PluginDiscovery(dyphanbot.data)
+
+        self.init_workers = max(1, init_workers)
+        self.init_times = {}
+        self.start_times = {}
+        self.start_tasks = {}
+        self.module_paths = {}
+        self.lazy_plugins = {}
 
         self.plugins = {}
+        self.intent_sources = {}
+
+    def require_intents(self, plugin_name, intents):
+        """ Enables the intents a plugin requires
+
+        Each enabled intent is recorded in `intent_sources` along with the
+        plugins that requested it, and privileged intents are logged so
+        it's clear which plugin needs them.
+
+        Args:
+            plugin_name (str): The name of the plugin requiring the intents
+            intents (:obj:`list` of :obj:`str`): The intents' flag names
+
+        """
+        for intent in intents:
+            if intent not in discord.Intents.VALID_FLAGS:
+                self.logger.warning("Plugin '%s' requires unknown intent '%s'; skipping.",
+                                    plugin_name, intent)
+                continue
+            setattr(self.dyphanbot._intents, intent, True)
+            self.intent_sources.setdefault(intent, []).append(plugin_name)
+            if intent in PRIVILEGED_INTENTS:
+                self.logger.info("Plugin '%s' requires privileged intent '%s'",
+                                 plugin_name, intent)
+
+    def register_handler(self, plugin_obj, plugin_app, kind, handler, options):
+        """ Registers one of a plugin's handlers with the bot
+
+        Args:
+            plugin_obj: The plugin the handler belongs to
+            plugin_app (:obj:`aiohttp.web.Application`): The plugin's web app
+            kind (str): One of the kinds in
+                :obj:`dyphanbot.pluginmanifest.HANDLER_KINDS`
+            handler: The (bound) handler
+            options (dict): The handler's decorator options
+
+        """
+        if kind == "ready":
+            self.dyphanbot.add_ready_handler(handler)
+        elif kind == "member_join":
+            self.dyphanbot.add_mjoin_handler(handler)
+        elif kind == "command":
+            rate = options.get("rate")
+            self.dyphanbot.add_command_handler(
+                options["cmd"], handler,
+                permissions={
+                    "botmaster": options["botmaster"],
+                    "guild_perms": options["perms"]
+                },
+                plugin=plugin_obj,
+                rate=tuple(rate) if rate else None
+            )
+        elif kind == "message":
+            self.dyphanbot.add_message_handler(handler, options["raw"], options["ordered"])
+        elif kind == "event":
+            self.dyphanbot.add_event_handler(
+                handler, priority=options["priority"], owner=plugin_obj)
+        elif kind == "endpoint":
+            plugin_app.router.add_route(options["method"], options["endpoint"], handler)
+
+    def construct_plugin(self, plugin):
+        """ Initializes a plugin class, recording how long it took; runs on
+            one of the loader's init threads
+        """
+        start = time.perf_counter()
+        try:
+            with self.dyphanbot.profiler.phase(f"init {plugin.__name__}", "init"):
+                return plugin(self.dyphanbot)
+        finally:
+            self.init_times[plugin.__name__] = time.perf_counter() - start
+
+    def resolve_dependencies(self, plugins):
+        """ Returns each plugin's dependencies among `plugins`
+
+        Dependencies that were already loaded (e.g. legacy plugins) are
+        satisfied; lazily loaded ones are loaded now. Plugins with a missing
+        dependency are dropped with a warning.
+
+        Returns:
+            dict: Each plugin's name and the set of names it waits for
+
+        """
+        names = {plugin.__name__ for plugin in plugins}
+        graph = {}
+        for plugin in plugins:
+            waits_for = set()
+            for dep in plugin.depends:
+                if dep in names:
+                    waits_for.add(dep)
+                    continue
+                loaded = self.plugins.get(dep)
+                try:
+                    if loaded is None:
+                        raise ImportError(f"No plugin named {dep!r}")
+                    if isinstance(loaded, LazyPlugin):
+                        loaded.load()
+                except ImportError as err:
+                    self.logger.warning("Unable to load plugin '%s': it depends on '%s' (%s)",
+                                        plugin.__name__, dep, err)
+                    break
+            else:
+                graph[plugin.__name__] = waits_for
+        return graph
 
     def init_plugins(self):
-        """ Initializes subclassed plugins and registers them """
-        plugins = Plugin.__subclasses__()
+        """ Initializes subclassed plugins and registers them
+
+        Plugins are initialized on a pool of `init_workers` threads, each as
+        soon as the plugins it `depends` on are. Handlers are registered
+        afterwards on the calling thread, in the order the plugins were
+        defined. Plugins in a dependency cycle, and ones depending on a
+        plugin that failed, are skipped.
+        """
+        plugins = [plugin for plugin in Plugin.__subclasses__()
+                   if not isinstance(self.plugins.get(plugin.__name__), LazyPlugin)]
         self.logger.debug("Found %d subclassed plugins: %s", len(plugins),
                           ", ".join([x.__name__ for x in plugins]))
         for plugin in plugins:
-            try:
-                plogger = logging.getLogger(plugin.__name__)
-                plugin_app = web.Application(logger=plogger)
-                plugin_obj = plugin(self.dyphanbot)
-                for name, method in plugin_obj.__class__.__dict__.items():
-                    real_method = getattr(plugin_obj, name, None)
-                    if not real_method or not callable(real_method):
+            if plugin.__name__ not in self.disabled_plugins:
+                self.require_intents(plugin.__name__, plugin.required_intents)
+
+        by_name = {plugin.__name__: plugin for plugin in plugins}
+        waiting = self.resolve_dependencies(plugins)
+        initialized = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.init_workers,
+                                thread_name_prefix="dyphanbot-init") as executor:
+            running = {}
+            while True:
+                for name in [name for name, deps in waiting.items() if not deps]:
+                    del waiting[name]
+                    running[executor.submit(self.construct_plugin, by_name[name])] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        initialized[name] = future.result()
+                    except Exception as err:
+                        self.logger.warning("Unable to load plugin '%s': %s", name, err)
+                        if self.dev_mode:
+                            raise
+                        self._drop_dependents(waiting, name)
                         continue
-                    if hasattr(method, "ready_handler"):
-                        self.dyphanbot.add_ready_handler(real_method)
-                    elif hasattr(method, "mjoin_handler"):
-                        self.dyphanbot.add_mjoin_handler(real_method)
-                    elif hasattr(method, "command"):
-                        self.dyphanbot.add_command_handler(
-                            real_method.command, real_method,
-                            permissions={
-                                "botmaster": real_method.botmaster,
-                                "guild_perms": real_method.guild_perms
-                            },
-                            plugin=plugin_obj
-                        )
-                    elif hasattr(method, "msg_handler") and hasattr(method, "raw"):
-                        self.dyphanbot.add_message_handler(real_method, real_method.raw)
-                    elif hasattr(method, "event_handler"):
-                        real_method = self.dyphanbot.event(real_method)
-                    elif hasattr(method, "endpoint_handler"):
-                        plugin_app.router.add_route(
-                            real_method.method, real_method.endpoint, real_method)
-                self.dyphanbot.web_api.register_plugin(plugin.__name__, plugin_app)
-                self.plugins[plugin.__name__] = plugin_obj
+                    # dependents may look their dependencies up while initializing
+                    self.plugins[name] = initialized[name]
+                    for deps in waiting.values():
+                        deps.discard(name)
+        for name in waiting:
+            self.logger.warning("Unable to load plugin '%s': circular dependency", name)
+
+        for plugin in plugins:
+            plugin_obj = initialized.get(plugin.__name__)
+            if plugin_obj is None:
+                continue
+            try:
+                self.register_plugin(plugin.__name__, plugin_obj)
             except Exception as err:
+                self.plugins.pop(plugin.__name__, None)
                 self.logger.warning("Unable to load plugin '%s': %s", plugin.__name__, err)
                 if self.dev_mode:
                     raise
 
+        if initialized:
+            self.logger.info("Initialized %d plugins in %.1fms (%s)", len(initialized),
+                (time.perf_counter() - start) * 1000, self.format_times(initialized))
+
+    def _drop_dependents(self, waiting, name):
+        """ Skips the plugins waiting (directly or not) for a failed one """
+        for dependent in [dep for dep, deps in waiting.items() if name in deps]:
+            if waiting.pop(dependent, None) is not None:
+                self.logger.warning("Unable to load plugin '%s': its dependency '%s' failed to load",
+                                    dependent, name)
+                self._drop_dependents(waiting, dependent)
+
+    def format_times(self, names, times=None):
+        """ Returns the init (or start) times of plugins as a string, slowest
+            first
+        """
+        times = self.init_times if times is None else times
+        names = sorted((name for name in names if name in times), key=times.get, reverse=True)
+        return ", ".join("{0} {1:.1f}ms".format(name, times[name] * 1000) for name in names)
+
+    def start_plugin(self, plugin):
+        """ Returns the task running a plugin's `astart()` hook, creating it
+            the first time; the hook runs once its dependencies' hooks finished
+        """
+        task = self.start_tasks.get(plugin.name)
+        if task is None:
+            task = asyncio.ensure_future(self._astart(plugin))
+            self.start_tasks[plugin.name] = task
+        return task
+
+    async def _astart(self, plugin):
+        for dep in plugin.depends:
+            loaded = self.plugins.get(dep)
+            if isinstance(loaded, Plugin):
+                await self.start_plugin(loaded)
+        start = time.perf_counter()
+        try:
+            with self.dyphanbot.profiler.phase(f"astart {plugin.name}", "astart"):
+                await plugin.astart()
+        except Exception as err:
+            self.logger.warning("Plugin '%s' failed to start: %s", plugin.name, err)
+            if self.dev_mode:
+                raise
+        finally:
+            self.start_times[plugin.name] = time.perf_counter() - start
+
+    async def start_plugins(self):
+        """ Runs the `astart()` hook of every initialized plugin, concurrently
+            except where plugins depend on each other
+        """
+        plugins = [plugin for plugin in self.plugins.values() if isinstance(plugin, Plugin)]
+        if not plugins:
+            return
+        start = time.perf_counter()
+        await asyncio.gather(*(self.start_plugin(plugin) for plugin in plugins))
+        self.logger.info("Started %d plugins in %.1fms (%s)", len(plugins),
+            (time.perf_counter() - start) * 1000,
+            self.format_times([plugin.name for plugin in plugins], self.start_times))
+
+    def register_plugin(self, name, plugin_obj):
+        """ Registers every handler of an initialized plugin, and its web
+            app, under the plugin's name
+        """
+        plugin_app = web.Application(logger=logging.getLogger(name))
+        for attr, kind, options in plugin_handlers(plugin_obj):
+            self.register_handler(plugin_obj, plugin_app, kind,
+                                  getattr(plugin_obj, attr), options)
+        self.dyphanbot.web_api.register_plugin(name, plugin_app)
+
+    def register_stubs(self, lazy):
+        """ Registers a stub for each handler of a :obj:`LazyPlugin`, and
+            its web app, under the plugin's name
+        """
+        lazy.app = web.Application(logger=logging.getLogger(lazy.name))
+        for handler in lazy.info["handlers"]:
+            self.register_handler(lazy, lazy.app, handler["kind"],
+                                  lazy.stub(handler), handler["options"])
+        self.dyphanbot.web_api.register_plugin(lazy.name, lazy.app)
+
+    def unregister(self, owner):
+        """ Unregisters every command, message handler and event handler of
+            a plugin (or of a :obj:`LazyPlugin`'s stubs)
+        """
+        self.dyphanbot.dispatcher.remove_handlers(owner)
+        self.dyphanbot.events.detach(owner)
+
+    def add_lazy_plugins(self, entry, additional_paths):
+        """ Registers stubs for the plugins of a module listed in the
+            manifest, without importing it
+        """
+        for info in entry["plugins"]:
+            name = info["class"]
+            if name in self.disabled_plugins or name in self.plugins:
+                continue
+            self.require_intents(name, info["required_intents"])
+            lazy = LazyPlugin(self, entry["name"], info, additional_paths)
+            self.register_stubs(lazy)
+            self.plugins[name] = lazy
+            self.lazy_plugins[name] = lazy
+            self.logger.debug("Deferred loading plugin '%s' until it's first used", name)
+
+    def construct_lazy(self, lazy):
+        """ Imports and initializes a plugin registered by
+            `add_lazy_plugins()`, loading the plugins it `depends` on first;
+            may run on a worker thread
+        """
+        start = time.perf_counter()
+        module = self.import_plugin(lazy.module, lazy.additional_paths)
+        plugin = getattr(module, lazy.name)
+        for dep in plugin.depends:
+            loaded = self.plugins.get(dep)
+            if loaded is None:
+                raise ImportError(f"It depends on {dep!r}, which isn't loaded")
+            if isinstance(loaded, LazyPlugin):
+                loaded.load()
+        plugin_obj = self.construct_plugin(plugin)
+        self.logger.info("Loaded plugin '%s' on first use in %.1fms",
+                         lazy.name, (time.perf_counter() - start) * 1000)
+        return plugin_obj
+
+    def activate(self, lazy, plugin_obj):
+        """ Puts a plugin initialized by `construct_lazy()` in its stubs'
+            place
+
+        Handlers the manifest didn't list (e.g. ones added by a decorator it
+        doesn't know about) are registered now, on the event loop if it's
+        running. If the stubs' web app was already started, extra endpoints
+        go on a copy of it that replaces it.
+
+        Returns:
+            The plugin
+
+        """
+        self.plugins[lazy.name] = plugin_obj
+        known = {handler["attr"] for handler in lazy.info["handlers"]}
+        extra = [(name, kind, options) for name, kind, options in plugin_handlers(plugin_obj)
+                 if name not in known]
+
+        def register_extra():
+            rebuild = lazy.app.frozen and any(kind == "endpoint" for _, kind, _ in extra)
+            if rebuild:
+                old_app, lazy.app = lazy.app, web.Application(logger=logging.getLogger(lazy.name))
+                for route in old_app.router.routes():
+                    lazy.app.router.add_route(route.method, route.resource.canonical, route.handler)
+            for name, kind, options in extra:
+                self.register_handler(plugin_obj, lazy.app, kind, getattr(plugin_obj, name), options)
+            if rebuild:
+                self.dyphanbot.web_api.register_plugin(lazy.name, lazy.app)
+
+        loop = self.dyphanbot.data.running_loop()
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if extra and loop is not None and not on_loop:
+            loop.call_soon_threadsafe(register_extra)
+        else:
+            register_extra()
+        return plugin_obj
+
     def load_plugins(self):
         """ Iterates through each plugin directory and loads plugins from
             each directory, then initializes subclassed plugins
         """
         self.logger.debug("Searching %d plugin directories: %s", len(self.plugin_dirs), self.plugin_dirs)
+        if self.lazy:
+            self.manifest = PluginManifest(self.dyphanbot.data)
         for directory in self.plugin_dirs:
             if not os.path.isdir(directory):
                 continue
 
-            self.load_plugins_from_directory(directory)
+            with self.dyphanbot.profiler.phase(f"discover {directory}", "discover"):
+                self.load_plugins_from_directory(directory)
+        self.discovery.save()
+        if self.manifest is not None:
+            self.manifest.save()
         self.init_plugins()
 
-    def load_plugins_from_directory(self, directory, rpaths=[]):
+    def load_plugins_from_directory(self, directory):
         """ Recursively finds and loads each plugin module in the given
             directory
 
+        Subdirectories that aren't packages are searched too. Listings of
+        directories that haven't changed since the last start are reused
+        from the discovery cache (see
+        :obj:`dyphanbot.pluginmanifest.PluginDiscovery`), and each module
+        is imported from the directory it was found in.
+
         Args:
             directory (str): The directory to load from.
-            rpaths (:obj:`list`, optional): Recursive; A list of additional
-                paths to recursively search plugins in.
         
         """
-        directory = os.path.join(directory, '[!_.]*[!_.]')
-        for plugin_path in glob.glob(directory, recursive=True):
-            if os.path.isdir(plugin_path) and not os.path.isfile(os.path.join(plugin_path, "__init__.py")):
-                # if plugin_path is a directory & it's not a package,
-                # recursively load plugins from that directory
-                rpaths.append(plugin_path)
-                self.load_plugins_from_directory(plugin_path, rpaths)
-                continue
-            
-            basename = os.path.basename(plugin_path)
-            if '.' in basename and not basename.endswith('.py'):
-                # skip non-python filenames
-                continue
-            basename = basename.split('.')[0]
-            if not basename.strip():
-                continue
-            self.load_plugin(basename, rpaths)
+        for basename, plugin_path, search_paths in self.discovery.scan(directory):
+            if self.manifest is not None and basename not in self.disabled_plugins:
+                with self.dyphanbot.profiler.phase(f"manifest {basename}", "manifest"):
+                    entry = self.manifest.get(basename, plugin_path)
+                if entry["lazy"]:
+                    self.add_lazy_plugins(entry, search_paths)
+                    continue
+            self.load_plugin(basename, search_paths)
     
     def load_plugin(self, name, additional_paths=[]):
         """ Imports and loads a plugin by name
@@ -321,7 +973,9 @@ class PluginLoader(object):
             if getattr(plugin, "plugin_init", None):
                 plogger.warn("The `plugin_init` hook is deprecated. Subclass from `Plugin` instead.")
                 plugin.name = name
-                plugin.plugin_init(self.dyphanbot)
+                self.require_intents(name, getattr(plugin, "required_intents", ()))
+                with self.dyphanbot.profiler.phase(f"init {name}", "init"):
+                    plugin.plugin_init(self.dyphanbot)
                 self.plugins[name] = plugin
                 plogger.info("Loaded legacy plugin: %s", name)
         except Exception as err:
@@ -336,7 +990,7 @@ class PluginLoader(object):
         Args:
             name (str): The name of the plugin's module to be imported
             additional_paths (:obj:`list`, optional): Additional paths to
-                search for the plugin in
+                search for the plugin in, before the plugin directories
         
         Returns:
             ModuleType: The imported plugin's module
@@ -365,7 +1019,8 @@ class PluginLoader(object):
         except KeyError:
             pass
         
-        search_paths = list(set(self.plugin_dirs + additional_paths))
+        search_paths = list(dict.fromkeys(list(additional_paths) + self.plugin_dirs))
+        self.module_paths[abs_name] = additional_paths
         spec = PathFinder.find_spec(abs_name, search_paths)
         if not spec:
             raise ModuleNotFoundError(f'No plugin named {abs_name!r}',
@@ -373,10 +1028,147 @@ class PluginLoader(object):
         
         module = importlib.util.module_from_spec(spec)
         sys.modules[abs_name] = module
-        spec.loader.exec_module(module)
+        with self.dyphanbot.profiler.phase(f"import {abs_name}", "import"):
+            spec.loader.exec_module(module)
         self.logger.debug("Imported plugin: %s", abs_name)
         return module
 
+    def find_plugin(self, name):
+        """ Returns the name a plugin is loaded under, looking it up by its
+            class name or module name (case-insensitively), or None
+        """
+        lowered = name.lower()
+        for plugin_name, plugin in self.plugins.items():
+            lazy = self.lazy_plugins.get(plugin_name)
+            module = lazy.module if lazy else getattr(type(plugin), '__module__', None)
+            if lowered in (plugin_name.lower(), (module or "").lower()):
+                return plugin_name
+        return None
+
+    async def reload_plugin(self, name):
+        """ Re-imports a plugin's module and swaps the running plugin for a
+            new instance without restarting the bot
+
+        The module (and its submodules) is evicted from `sys.modules` and
+        imported again, and the new plugin is initialized, on a worker
+        thread while the old plugin keeps handling events. Only then are
+        the old plugin's handlers swapped for stubs that hold its calls, its
+        state handed over through `export_state()` and `import_state()`,
+        the new plugin's `astart()` hook run and its handlers registered.
+        The held calls then go to the new plugin. Other plugins keep running
+        throughout. If the new plugin fails to import or initialize, the old
+        one is left in place.
+
+        Other plugins defined in the same module keep running the module's
+        old code until they're reloaded themselves. Legacy plugins can't be
+        reloaded.
+
+        Args:
+            name (str): The plugin's class name or module name
+
+        Returns:
+            dict: The plugin's `name`, and how long the reload took and how
+                long the plugin's calls were held for (`total_ms` and
+                `paused_ms`)
+
+        Raises:
+            PluginReloadError: If the plugin isn't loaded or couldn't be
+                reloaded
+
+        """
+        plugin_name = self.find_plugin(name)
+        if plugin_name is None:
+            raise PluginReloadError(f"No plugin named {name!r} is loaded")
+        old = self.plugins[plugin_name]
+        lazy = self.lazy_plugins.get(plugin_name)
+        if not isinstance(old, (Plugin, LazyPlugin)):
+            raise PluginReloadError(f"{plugin_name!r} is a legacy plugin and can't be reloaded")
+        if isinstance(old, LazyPlugin) and old.pending is not None:
+            raise PluginReloadError(f"{plugin_name!r} is already being reloaded")
+
+        old_obj = old.instance if isinstance(old, LazyPlugin) else old
+        module_name = lazy.module if lazy else type(old).__module__
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        # import and initialize the new plugin while the old one keeps running
+        evicted = {mod: sys.modules.pop(mod) for mod in list(sys.modules)
+                   if mod == module_name or mod.startswith(module_name + ".")}
+        try:
+            module = await loop.run_in_executor(
+                None, self.import_plugin, module_name, self.module_paths.get(module_name, []))
+            plugin = getattr(module, plugin_name, None)
+            if not (isinstance(plugin, type) and issubclass(plugin, Plugin)):
+                raise ImportError(f"Module {module_name!r} no longer defines {plugin_name!r}")
+            new_obj = await loop.run_in_executor(None, self.construct_plugin, plugin)
+        except Exception as err:
+            for mod in [mod for mod in sys.modules if mod == module_name or mod.startswith(module_name + ".")]:
+                del sys.modules[mod]
+            sys.modules.update(evicted)
+            self.logger.warning("Unable to reload plugin '%s': %s", plugin_name, err)
+            raise PluginReloadError(f"Unable to reload {plugin_name!r}: {err}") from err
+
+        # hold the plugin's calls while the new instance takes over
+        paused_at = time.perf_counter()
+        held = LazyPlugin(self, module_name, lazy.info if lazy and old_obj is None else plugin_info(old_obj or new_obj),
+                          self.module_paths.get(module_name, []))
+        held.pending = loop.create_future()
+        for owner in (lazy, old_obj):
+            if owner is not None:
+                self.unregister(owner)
+        self.register_stubs(held)
+        self.plugins[plugin_name] = held
+        try:
+            if old_obj is not None:
+                state = old_obj.export_state()
+                if inspect.isawaitable(state):
+                    state = await state
+                result = new_obj.import_state(state)
+                if inspect.isawaitable(result):
+                    await result
+            self.start_tasks.pop(new_obj.name, None)
+            await self.start_plugin(new_obj)
+        except Exception as err:
+            # put the old plugin back
+            self.unregister(held)
+            if old_obj is not None:
+                self.register_plugin(plugin_name, old_obj)
+            else:
+                self.register_stubs(lazy)
+            self.plugins[plugin_name] = old
+            held.pending.set_result(old_obj if old_obj is not None else lazy)
+            self.logger.warning("Unable to reload plugin '%s': %s", plugin_name, err)
+            raise PluginReloadError(f"Unable to reload {plugin_name!r}: {err}") from err
+
+        self.unregister(held)
+        self.register_plugin(plugin_name, new_obj)
+        self.plugins[plugin_name] = new_obj
+        self.lazy_plugins.pop(plugin_name, None)
+        held.pending.set_result(new_obj)
+        self.dyphanbot.bot_controller.help_catalog.rebuild()
+
+        end = time.perf_counter()
+        result = {
+            "name": plugin_name,
+            "total_ms": (end - start) * 1000,
+            "paused_ms": (end - paused_at) * 1000
+        }
+        self.logger.info("Reloaded plugin '%s' in %.1fms (held its calls for %.1fms)",
+                         plugin_name, result["total_ms"], result["paused_ms"])
+        return result
+
+    async def aload_plugin(self, plugin):
+        """ Returns a plugin, loading it first (on a worker thread) if it's
+            a :obj:`LazyPlugin`
+
+        Raises:
+            ImportError: If the plugin failed to load
+
+        """
+        if isinstance(plugin, LazyPlugin):
+            return await plugin.aload()
+        return plugin
+
     def get_plugins(self):
         """ Returns the currently loaded plugins.
 
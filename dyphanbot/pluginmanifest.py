@@ -0,0 +1,340 @@
+""" This module contains the PluginDiscovery and PluginManifest classes,
+    which find and describe plugin modules without importing them.
+"""
+
+import os
+import ast
+import fnmatch
+import logging
+
+# Bumped whenever the format of the manifest's entries changes
+MANIFEST_VERSION = 1
+
+# The data document the manifest is cached in
+MANIFEST_FILENAME = "plugin_manifest.json"
+
+# The data document the directory listings of plugin directories are cached in
+DISCOVERY_FILENAME = "plugin_discovery.json"
+
+# Names of files and directories that may be plugins (no leading or
+# trailing `_` or `.`)
+PLUGIN_PATTERN = '[!_.]*[!_.]'
+
+# Handler decorators of `Plugin`, in the order `PluginLoader` checks them
+HANDLER_KINDS = {
+    'on_ready': "ready",
+    'on_member_join': "member_join",
+    'command': "command",
+    'on_message': "message",
+    'event': "event",
+    'endpoint': "endpoint",
+}
+
+class NotLazyError(Exception):
+    """ Raised while parsing a module that has to be imported at startup """
+
+def _is_plugin_ref(node):
+    """ Returns True if `node` refers to `Plugin` (e.g. `Plugin` or
+        `dyphanbot.Plugin`)
+    """
+    if isinstance(node, ast.Name):
+        return node.id == "Plugin"
+    if isinstance(node, ast.Attribute):
+        return node.attr == "Plugin"
+    return False
+
+def _literal(node, what):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise NotLazyError("{0} isn't a literal".format(what))
+
+def _parse_handler(func):
+    """ Returns the `(kind, options)` of a method decorated with one of
+        `Plugin`'s handler decorators, or None
+    """
+    found = []
+    for decorator in func.decorator_list:
+        call = decorator if isinstance(decorator, ast.Call) else None
+        target = call.func if call else decorator
+        if not (isinstance(target, ast.Attribute) and _is_plugin_ref(target.value)):
+            continue
+        if target.attr not in HANDLER_KINDS:
+            continue
+        options = {}
+        if call:
+            if call.args:
+                raise NotLazyError("positional arguments to @Plugin.{0}".format(target.attr))
+            for keyword in call.keywords:
+                options[keyword.arg] = _literal(keyword.value, "an argument of {0}()".format(func.name))
+        found.append((target.attr, options))
+    if not found:
+        return None
+    # the loader registers each method once, by the first matching kind
+    decorator, options = min(found, key=lambda item: list(HANDLER_KINDS).index(item[0]))
+    kind = HANDLER_KINDS[decorator]
+    if kind == "command":
+        options = {
+            "cmd": options.get("cmd") or func.name,
+            "botmaster": options.get("botmaster", False),
+            "perms": options.get("perms", []),
+            "rate": options.get("rate"),
+        }
+    elif kind == "message":
+        options = {"raw": options.get("raw", False), "ordered": options.get("ordered", False)}
+    elif kind == "event":
+        options = {"priority": options.get("priority", 0)}
+    elif kind == "endpoint":
+        if "endpoint" not in options:
+            raise NotLazyError("@Plugin.endpoint without an endpoint")
+        options = {"endpoint": options["endpoint"], "method": options.get("method", 'GET')}
+    return kind, options
+
+def _parse_plugin(cls):
+    """ Returns the manifest entry of a `Plugin` subclass' definition """
+    plugin = {"class": cls.name, "required_intents": [], "handlers": []}
+    for node in cls.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name == "required_intents":
+                plugin["required_intents"] = list(_literal(node.value, "required_intents"))
+            elif name == "lazy" and not _literal(node.value, "lazy"):
+                raise NotLazyError("{0}.lazy is false".format(cls.name))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            handler = _parse_handler(node)
+            if handler:
+                kind, options = handler
+                plugin["handlers"].append({
+                    "attr": node.name,
+                    "kind": kind,
+                    "coroutine": isinstance(node, ast.AsyncFunctionDef),
+                    "options": options
+                })
+    if not plugin["handlers"]:
+        # nothing would ever load it; it does its work when started
+        raise NotLazyError("{0} has no handlers".format(cls.name))
+    return plugin
+
+def parse_module(source, filename="<plugin>"):
+    """ Returns the list of manifest entries of the plugins defined in a
+        module's source
+
+    Raises:
+        NotLazyError: If the module has to be imported at startup, e.g.
+            because it's a legacy plugin or a decorator's arguments aren't
+            literals
+        SyntaxError: If the module can't be parsed
+
+    """
+    tree = ast.parse(source, filename)
+    plugins = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == "plugin_init":
+            raise NotLazyError("legacy plugin")
+        if isinstance(node, ast.ClassDef) and any(_is_plugin_ref(base) for base in node.bases):
+            plugins.append(_parse_plugin(node))
+    if not plugins:
+        raise NotLazyError("no plugin classes")
+    return plugins
+
+def module_files(path):
+    """ Returns the source files of a plugin module or package """
+    if not os.path.isdir(path):
+        return [path if path.endswith('.py') else path + '.py']
+    files = []
+    for root, dirs, filenames in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '__pycache__')))
+        files.extend(os.path.join(root, f) for f in sorted(filenames) if f.endswith('.py'))
+    return files
+
+def signature(files):
+    """ Returns the modification times and sizes of a module's files """
+    result = []
+    for filepath in files:
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            continue
+        result.append([filepath, stat.st_mtime_ns, stat.st_size])
+    return result
+
+class PluginDiscovery(object):
+    """ Finds the plugin modules in plugin directories
+
+    Each directory's listing (its plugin modules and packages, and the
+    subdirectories to search) is cached in the data directory along with
+    the directory's modification time, which changes whenever an entry is
+    added, removed or renamed. A directory whose modification time hasn't
+    changed is not listed again, so a restart costs one `stat()` per
+    directory. Changes to the modules themselves are picked up by the
+    :obj:`PluginManifest`.
+
+    Args:
+        datamanager (:obj:`dyphanbot.datamanager.DataManager`): Where the
+            listings are cached
+
+    """
+
+    def __init__(self, datamanager):
+        self.logger = logging.getLogger(__name__)
+        self.datamanager = datamanager
+        self.directories = {}
+        self.changed = False
+        self.scanned = set()
+        self.relisted = set()
+
+        cached = datamanager.find_json(DISCOVERY_FILENAME)
+        if cached and cached.get("version") == MANIFEST_VERSION:
+            self.directories = cached.get("directories", {})
+
+    def listing(self, directory):
+        """ Returns the (possibly cached) listing of a directory
+
+        Returns:
+            dict: With the directory's `mtime`, whether it's a `package`
+                and its `entries`, each a `[filename, is_directory]` pair
+
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return {"mtime": None, "package": False, "entries": []}
+        cached = self.directories.get(directory)
+        if cached is not None and cached["mtime"] == mtime:
+            return cached
+
+        entries = []
+        for filename in sorted(os.listdir(directory)):
+            if not fnmatch.fnmatch(filename, PLUGIN_PATTERN):
+                continue
+            path = os.path.join(directory, filename)
+            if os.path.isdir(path):
+                entries.append([filename, True])
+                continue
+            if '.' in filename and not filename.endswith('.py'):
+                # skip non-python filenames
+                continue
+            if not filename.split('.')[0].strip():
+                continue
+            entries.append([filename, False])
+
+        listing = {
+            "mtime": mtime,
+            "package": os.path.isfile(os.path.join(directory, "__init__.py")),
+            "entries": entries
+        }
+        self.directories[directory] = listing
+        self.relisted.add(directory)
+        self.changed = True
+        return listing
+
+    def scan(self, directory):
+        """ Yields the `(name, path, search_paths)` of each plugin module in
+            a directory and, recursively, in its subdirectories that aren't
+            packages
+
+        `search_paths` is the list of the one directory the module is in,
+        shared by every module in it. Directories already scanned by this
+        object are skipped, so nested or repeated plugin directories are
+        only searched once.
+        """
+        directory = os.path.realpath(directory)
+        if directory in self.scanned:
+            return
+        self.scanned.add(directory)
+        search_paths = [directory]
+        for filename, is_directory in self.listing(directory)["entries"]:
+            path = os.path.join(directory, filename)
+            if is_directory and not self.listing(path)["package"]:
+                yield from self.scan(path)
+                continue
+            yield filename.split('.')[0], path, search_paths
+
+    def save(self):
+        """ Saves the listings if any of them changed and drops the ones of
+            directories that weren't scanned (e.g. removed plugin dirs)
+        """
+        stale = set(self.directories) - self.scanned
+        stale -= {os.path.join(parent, entry[0]) for parent in self.scanned
+                  for entry in self.directories.get(parent, {}).get("entries", ())}
+        for directory in stale:
+            del self.directories[directory]
+        self.logger.debug("Scanned %d plugin directories (%d changed since they were cached)",
+                          len(self.scanned), len(self.scanned & self.relisted))
+        if not (self.changed or stale):
+            return
+        self.datamanager.save_json(DISCOVERY_FILENAME, {
+            "version": MANIFEST_VERSION,
+            "directories": self.directories
+        })
+        self.changed = False
+
+class PluginManifest(object):
+    """ Describes each plugin module's plugins without importing them
+
+    A module's entry lists its plugin classes with their required intents
+    and handlers (commands, events, message handlers and endpoints), as
+    found by parsing the module's source, or records why the module has
+    to be imported at startup instead. Entries are cached in the data
+    directory and only rebuilt when one of the module's files changes.
+
+    Args:
+        datamanager (:obj:`dyphanbot.datamanager.DataManager`): Where the
+            manifest is cached
+
+    """
+
+    def __init__(self, datamanager):
+        self.logger = logging.getLogger(__name__)
+        self.datamanager = datamanager
+        self.modules = {}
+        self.changed = False
+
+        cached = datamanager.find_json(MANIFEST_FILENAME)
+        if cached and cached.get("version") == MANIFEST_VERSION:
+            self.modules = cached.get("modules", {})
+        else:
+            self.changed = True
+
+    def get(self, name, path):
+        """ Returns the (possibly cached) manifest entry of a plugin module
+
+        Args:
+            name (str): The module's name
+            path (str): The path of the module's file or package directory
+
+        Returns:
+            dict: With the module's `name`, whether it can be loaded `lazy`
+                and, if so, its `plugins`
+
+        """
+        files = module_files(path)
+        current = signature(files)
+        entry = self.modules.get(path)
+        if entry is not None and entry["name"] == name and entry["signature"] == current:
+            return entry
+
+        entry = {"name": name, "signature": current, "lazy": False, "plugins": []}
+        entry_file = os.path.join(path, "__init__.py") if os.path.isdir(path) else files[0]
+        try:
+            with open(entry_file, 'rb') as fd:
+                entry["plugins"] = parse_module(fd.read(), entry_file)
+            entry["lazy"] = True
+        except NotLazyError as err:
+            entry["reason"] = str(err)
+        except (OSError, SyntaxError, ValueError) as err:
+            entry["reason"] = "unable to parse: {0}".format(err)
+        self.logger.debug("Updated the manifest of plugin module '%s' (lazy: %s)", name, entry["lazy"])
+        self.modules[path] = entry
+        self.changed = True
+        return entry
+
+    def save(self):
+        """ Saves the manifest if any entry changed """
+        if not self.changed:
+            return
+        self.datamanager.save_json(MANIFEST_FILENAME, {
+            "version": MANIFEST_VERSION,
+            "modules": self.modules
+        })
+        self.changed = False
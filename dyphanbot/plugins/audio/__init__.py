@@ -16,6 +16,8 @@ See the [list of supported sites](https://github.com/yt-dlp/yt-dlp/blob/master/s
 class Audio(Plugin):
     """ Handles the 'audio' commands for DyphanBot """
 
+    required_intents = ("voice_states",)
+
     def __init__(self, dyphanbot):
         super().__init__(dyphanbot)
 
@@ -30,6 +32,17 @@ class Audio(Plugin):
 
         self.controller = AudioController(dyphanbot, config=self.config)
 
+    def export_state(self):
+        # hand the players over so a reload doesn't drop voice connections
+        # or queues
+        return {"players": self.controller.players}
+
+    def import_state(self, state):
+        for guild_id, player in state["players"].items():
+            if player.view is not None:
+                player.view.controller = self.controller
+            self.controller.players[guild_id] = player
+
     def _save_persistence(self):
         return self.save_json(self._persist_fn, self._persistence_data)
     
@@ -9,6 +9,9 @@ from dyphanbot import Plugin
 
 class Echo(Plugin):
     """ Echo and Emoji plugin """
+
+    required_intents = ("emojis_and_stickers",)
+
     def __init__(self, dyphanbot):
         self.dyphanbot = dyphanbot
     
@@ -25,9 +25,10 @@ BESTGIRL = [
 class ExamplePlugin(Plugin):
     """ Demonstrates new plugin structure. """
 
+    required_intents = ("members",)
+
     def start(self):
         self.logger.info("Example Plugin started!")
-        self.intents.members = True
     
     async def help(self, message, args):
         return {
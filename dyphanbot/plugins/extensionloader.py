@@ -1,7 +1,6 @@
 """ DyphanBot Per-Server Extensions implementation """
 import os
 import io
-import json
 import traceback
 import posixpath
 from pprint import pprint
@@ -10,9 +9,9 @@ from base64 import b64decode
 import requests
 import discord
 
-import dyphanbot.utils as utils
 from dyphanbot import Plugin
 from dyphanbot.exceptions import DyphanBotError
+from dyphanbot.utils import json_codec
 
 EXT_REPO_URL = "https://dyphanbot.github.io/repo"
 
@@ -36,6 +35,10 @@ class ELCore(object):
         self.dyphanbot = dyphanbot
         self.db_filename = "extensions.json"
         self.db = self.load_db()
+        self.dyphanbot.data.watch(self.db_filename, self.reload_db)
+
+    def reload_db(self, filename):
+        self.db = self.load_db()
 
     def save_db(self, data):
         return self.dyphanbot.data.save_json(self.db_filename, data)
@@ -91,7 +94,7 @@ class ELCore(object):
         try:
             r = requests.get(posixpath.join(url, "manifest.json"))
             r.raise_for_status()
-            manifest = r.json()
+            manifest = json_codec.loads(r.content)
             if 'dyphan-extension' not in manifest:
                 raise InvalidExtensionError("Not a valid extension.")
             if not any(x in manifest['dyphan-extension'] for x in required_keys):
@@ -278,9 +281,9 @@ class ELCore(object):
             if "no-params" in ext and ext.get("no-params", "false"):
                 r = requests.get(req_url, headers=req_headers)
             else:
-                r = requests.post(req_url, data=json.dumps(req_payload), headers=req_headers)
+                r = requests.post(req_url, data=json_codec.dumps_compact(req_payload).encode(), headers=req_headers)
             r.raise_for_status()
-            res = r.json()
+            res = json_codec.loads(r.content)
             if res["status"] == "failure":
                 return { "content": ("Failed: %s" % res["error"]) }
             if "dyphan-output" in res:
@@ -448,17 +451,21 @@ class ExtensionLoader(Plugin):
     @Plugin.on_message(raw=True)
     async def ext_command_handler(self, client, message):
         """ Message handler for extension calls and related commands """
-        self.ext_prefix = self.dyphanbot.bot_controller._get_ext_prefix(message.guild)
-        parsed_cmd = utils.parse_command(self.dyphanbot, message, self.ext_prefix, True)
-        if not parsed_cmd:
+        parsed = self.dyphanbot.parse_message(message)
+        if parsed.prefix_kind != parsed.EXT_PREFIX or not parsed.command:
+            return
+        self.ext_prefix = parsed.prefix
+        cmd, args = parsed.command, parsed.args
+        # extension calls skip `process_command()`; limit them by their
+        # prefixed name (e.g. `+weather`)
+        if not self.dyphanbot.dispatcher.admit(message, self.ext_prefix + cmd):
             return
-        cmd, args = parsed_cmd
-        if cmd[0].strip() == 'help':
+        if cmd == 'help':
             await self.ext_help(client, message, args)
-        elif cmd[0] in self.reserved_cmds:
-            await getattr(self, cmd[0], self._reserved)(client, message, args)
+        elif cmd in self.reserved_cmds:
+            await getattr(self, cmd, self._reserved)(client, message, args)
         else:
-            await self.call(client, message, cmd)
+            await self.call(client, message, parsed.tokens)
 
 #def plugin_init(dyphanbot):
 #    el = ELHandlers(dyphanbot)
@@ -35,24 +35,18 @@ class Moderation(Plugin):
     """
     Commands and tools for Discord server moderation and administration.
     """
+
+    required_intents = ("members",)
     
     def __init__(self, dyphanbot):
         super().__init__(dyphanbot)
 
         self._gsettings_fn = "gsettings.json"
-        self._gsettings = self._load_gsettings()
+        self._gsettings = self.guild_settings(self._gsettings_fn, root=("guilds",))
 
         self.autorole = AutoRole(dyphanbot, self)
         self.farewell = Farewell(dyphanbot, self)
 
-    def _save_gsettings(self):
-        return self.save_json(self._gsettings_fn, self._gsettings)
-    
-    def _load_gsettings(self):
-        return self.load_json(self._gsettings_fn, initial_data={
-            "guilds": {}
-        })
-    
     def get_template_defs(self, member, channel, guild):
         return {
             "user.name": member.name,
@@ -69,25 +63,15 @@ class Moderation(Plugin):
             text = text.replace(f"{{{key}}}", val)
         return text
     
-    def get_guild_settings(self, guild, reload=True):
-        if reload:
-            self._gsettings = self._load_gsettings()
-        return self._gsettings.get("guilds", {}).get(str(guild.id), {})
+    def get_guild_settings(self, guild):
+        return self._gsettings.get(guild.id) or {}
 
-    def get_gsettings(self, guild, setting, reload=True):
-        gsettings = self.get_guild_settings(guild, reload)
+    def get_gsettings(self, guild, setting):
+        gsettings = self.get_guild_settings(guild)
         return gsettings.get(setting, {})
     
     def set_gsettings(self, guild, setting, key, value):
-        guild_id = str(guild.id)
-        if not self.get_guild_settings(guild, False):
-            self._gsettings["guilds"][guild_id] = {}
-        
-        if not self.get_gsettings(guild, setting, False):
-            self._gsettings["guilds"][guild_id][setting] = {}
-        
-        self._gsettings["guilds"][guild_id][setting][key] = value
-        return self._gsettings["guilds"][guild_id][setting][key]
+        return self._gsettings.set(guild.id, (setting, key), value)
     
     async def help(self, message, args):
         try:
@@ -70,7 +70,6 @@ class AutoRole(object):
             autoroles.append(role_id)
         
         self.utils.set_gsettings(message.guild, "autorole", "roles", autoroles)
-        self.utils._save_gsettings()
 
         roles = self.role_id2obj(message.guild, autoroles)
         autorole_warn = self.perms_check(message, roles)
@@ -101,7 +100,6 @@ class AutoRole(object):
             self.utils.set_gsettings(message.guild, "autorole", "enabled", False)
 
         self.utils.set_gsettings(message.guild, "autorole", "roles", autoroles)
-        self.utils._save_gsettings()
 
         disabled_str = f"{NL}Autorole disabled (no roles left)." if len(autoroles) < 1 else ""
         await message.channel.send(f"Removed autoroles for: {self.role_list2str(role_mentions)}{disabled_str}")
@@ -129,7 +127,6 @@ class AutoRole(object):
             )
 
         self.utils.set_gsettings(message.guild, "autorole", "enabled", enable)
-        self.utils._save_gsettings()
 
         autorole_warn = self.perms_check(message, autoroles)
         await message.channel.send(f"{autorole_warn}{NL}Autorole has been {action_text} for {len(autoroles)} roles!".strip())
@@ -149,7 +146,6 @@ class AutoRole(object):
     async def clear(self, message):
         self.utils.set_gsettings(message.guild, "autorole", "roles", [])
         self.utils.set_gsettings(message.guild, "autorole", "enabled", False)
-        self.utils._save_gsettings()
 
         await message.channel.send("Autoroles have been cleared and disabled.")
     
@@ -79,7 +79,6 @@ class Farewell(object):
         farewells.append(fmsg)
         
         self.utils.set_gsettings(message.guild, "farewell", "message", farewells)
-        self.utils._save_gsettings()
         await message.channel.send(
             f"Farewell message added: `{fmsg}`{NL}"
             f"Enable with `{self.utils.get_local_prefix(message)}farewell enable` to activate.{NL}"
@@ -117,7 +116,6 @@ class Farewell(object):
                 farewell_channels = self.channel_ids2obj(message.guild, channel_ids)
 
         self.utils.set_gsettings(message.guild, "farewell", "enabled", enable)
-        self.utils._save_gsettings()
 
         await message.channel.send(f"Farewell messages have been {action_text} for channels: {self.channel_list2str(farewell_channels)}")
     
@@ -138,13 +136,11 @@ class Farewell(object):
     async def clear_channels(self, message):
         self.utils.set_gsettings(message.guild, "farewell", "channel_id", [])
         self.utils.set_gsettings(message.guild, "farewell", "enabled", False)
-        self.utils._save_gsettings()
 
         await message.channel.send("Farewell channel list has been cleared and disabled.")
     
     async def clear_messages(self, message):
         self.utils.set_gsettings(message.guild, "farewell", "message", [])
-        self.utils._save_gsettings()
 
         await message.channel.send("Farewell message list has been reset to default.")
     
@@ -7,6 +7,8 @@ from requests_oauthlib import OAuth2Session
 
 import discord
 
+from dyphanbot.utils import json_codec
+
 API_BASE_URL = "https://discordapp.com/api"
 TOKEN_URL = API_BASE_URL + "/oauth2/token"
 
@@ -202,7 +204,7 @@ class DyBotServerProtocol(websockets.server.WebSocketServerProtocol):
         data = await super().recv()
         self.logger.info("Received raw data: %s", data)
         try:
-            data = json.loads(data)
+            data = json_codec.loads(data)
         except json.JSONDecodeError as e:
             await self.send_error("Received invalid JSON data", e)
             return
@@ -211,7 +213,7 @@ class DyBotServerProtocol(websockets.server.WebSocketServerProtocol):
 
     async def send(self, data):
         self.logger.info("Send: %s", data)
-        data = json.dumps(data)
+        data = json_codec.dumps_compact(data)
         await super().send(data)
 
     async def send_error(self, message=None, exception=None):
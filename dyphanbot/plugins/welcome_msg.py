@@ -140,10 +140,15 @@ class ParseHelper:
 class WelcomeMsg(Plugin):
     """ Plugin for guilds to welcome users on join """
 
+    required_intents = ("members", "emojis_and_stickers")
+
     def start(self):
-        self.intents.members = True
         self.db_filename = "welcomemsgs"
         self.data = self.load_json(self.db_filename)
+        self.watch_json(self.db_filename, self.reload_data)
+
+    def reload_data(self, filename):
+        self.data = self.load_json(self.db_filename)
     
     def save_data(self, data):
         return self.save_json(self.db_filename, data)
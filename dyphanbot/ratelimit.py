@@ -0,0 +1,193 @@
+""" This module contains the token-bucket rate limiter used to admit commands. """
+
+import time
+import logging
+
+# Seconds between sweeps of idle buckets
+DEFAULT_SWEEP_INTERVAL = 60.0
+
+class TokenBucket(object):
+    """ A token bucket holding up to `capacity` tokens, refilled at `rate`
+        tokens per second
+
+    Args:
+        capacity (float): The maximum number of tokens (the burst size)
+        rate (float): Tokens added per second
+        now (float): The current time
+
+    """
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        """ Adds the tokens accumulated since the last update """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self):
+        """ Takes a token; `refill()` must be called first """
+        self.tokens -= 1
+
+    def is_idle(self, now):
+        """ Returns True if the bucket would be full at `now` (and can be
+            dropped without changing any outcome)
+        """
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class Limit(object):
+    """ A rate limit of `calls` calls every `per` seconds """
+
+    __slots__ = ('calls', 'per')
+
+    def __init__(self, calls, per):
+        if calls <= 0 or per <= 0:
+            raise ValueError("rate limits must be positive")
+        self.calls = calls
+        self.per = per
+
+    def __repr__(self):
+        return "<Limit {0.calls}/{0.per}s>".format(self)
+
+    @classmethod
+    def parse(cls, value):
+        """ Creates a limit from a `(calls, per)` pair or a
+            `{"rate": calls, "per": seconds}` dict; returns None if `value`
+            is empty
+        """
+        if not value:
+            return None
+        if isinstance(value, dict):
+            return cls(value["rate"], value.get("per", 1))
+        calls, per = value
+        return cls(calls, per)
+
+    def bucket(self, now):
+        """ Returns a new full bucket enforcing this limit """
+        return TokenBucket(self.calls, self.calls / self.per, now)
+
+    def to_dict(self):
+        return {"rate": self.calls, "per": self.per}
+
+class RateLimiter(object):
+    """ Admits or rejects command calls using in-memory token buckets
+
+    Up to three limits apply to a command call: the per-user limit, the
+    per-guild limit, and the command's own limit (counted per user). A call
+    is admitted only if every bucket it touches has a token, and only then
+    are the tokens taken, so rejected calls don't drain the other buckets.
+    Buckets that have refilled completely are dropped periodically.
+    Invalid limits in the configuration are skipped with a warning.
+
+    Args:
+        config (dict, optional): The `rate_limits` configuration, which may
+            contain `user`, `guild` and `commands` (a command name to limit
+            dict) limits, where each limit is `{"rate": calls, "per": seconds}`,
+            as well as `sweep_interval`
+        clock (func, optional): Returns the current time in seconds
+
+    """
+
+    def __init__(self, config={}, clock=time.monotonic):
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock
+
+        self.user_limit = self._parse_config("user", config.get("user"))
+        self.guild_limit = self._parse_config("guild", config.get("guild"))
+        self.command_limits = {}
+        self._configured_commands = set()
+        for cmd, limit in config.get("commands", {}).items():
+            limit = self._parse_config("commands.{0}".format(cmd), limit)
+            if limit:
+                self.command_limits[cmd] = limit
+                self._configured_commands.add(cmd)
+        self.sweep_interval = config.get("sweep_interval", DEFAULT_SWEEP_INTERVAL)
+
+        self._buckets = {}
+        self._last_sweep = clock()
+
+    def _parse_config(self, key, value):
+        """ Parses a configured limit; returns None if it's invalid """
+        try:
+            return Limit.parse(value)
+        except (KeyError, TypeError, ValueError):
+            self.logger.warning(
+                "Skipping invalid configuration for rate limit `{}` with value `{}` "
+                "(must be `{{\"rate\": <calls>, \"per\": <seconds>}}` with positive numbers)"
+                .format(key, value))
+            return None
+
+    @property
+    def enabled(self):
+        "bool: Whether any limit is configured"
+        return bool(self.user_limit or self.guild_limit or self.command_limits)
+
+    def set_command_limit(self, cmd, limit):
+        """ Sets a command's limit unless the configuration overrides it """
+        if cmd in self._configured_commands:
+            return
+        limit = Limit.parse(limit)
+        if limit:
+            self.command_limits[cmd] = limit
+        else:
+            self.command_limits.pop(cmd, None)
+
+    def _bucket(self, key, limit, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = limit.bucket(now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def sweep(self, now=None):
+        """ Drops idle buckets and returns how many were dropped """
+        now = self.clock() if now is None else now
+        idle = [key for key, bucket in self._buckets.items() if bucket.is_idle(now)]
+        for key in idle:
+            del self._buckets[key]
+        self._last_sweep = now
+        return len(idle)
+
+    def admit(self, cmd, user_id, guild_id=None):
+        """ Takes a token for the call and returns None if it's admitted,
+            or the name of the limit (`user`, `guild` or `command`) that
+            rejected it
+        """
+        now = self.clock()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        checks = []
+        if self.user_limit:
+            checks.append(("user", ("user", user_id), self.user_limit))
+        if self.guild_limit and guild_id is not None:
+            checks.append(("guild", ("guild", guild_id), self.guild_limit))
+        command_limit = self.command_limits.get(cmd)
+        if command_limit:
+            checks.append(("command", ("command", cmd, user_id), command_limit))
+
+        buckets = []
+        for scope, key, limit in checks:
+            bucket = self._bucket(key, limit, now)
+            if bucket.tokens < 1:
+                return scope
+            buckets.append(bucket)
+
+        for bucket in buckets:
+            bucket.consume()
+        return None
+
+    def stats(self):
+        """ Returns a dict describing the limiter's current state """
+        return {
+            "buckets": len(self._buckets),
+            "user": self.user_limit.to_dict() if self.user_limit else None,
+            "guild": self.guild_limit.to_dict() if self.guild_limit else None,
+            "commands": {cmd: limit.to_dict() for cmd, limit in self.command_limits.items()}
+        }
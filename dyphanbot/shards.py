@@ -0,0 +1,187 @@
+""" This module contains the ShardMonitor class, which tracks per-shard gateway
+    latency, event rates and reconnects.
+"""
+
+import math
+import time
+import logging
+import discord
+
+from collections import deque
+
+# Number of seconds the events-per-second rate is averaged over
+DEFAULT_RATE_WINDOW = 60
+
+# Gateway connection events, as dispatched by `discord.Client` (no shard ID
+# argument) and `discord.AutoShardedClient` (shard ID as first argument)
+CONNECT_EVENTS = {"connect", "shard_connect"}
+RESUME_EVENTS = {"resumed", "shard_resumed"}
+DISCONNECT_EVENTS = {"disconnect", "shard_disconnect"}
+
+def event_guild_id(args):
+    """ Returns the ID of the guild an event's first argument belongs to,
+        or None if it doesn't belong to a guild
+    """
+    if not args:
+        return None
+    obj = args[0]
+    if isinstance(obj, discord.Guild):
+        return obj.id
+    guild = getattr(obj, 'guild', None)
+    if guild is not None:
+        return guild.id
+    return getattr(obj, 'guild_id', None)
+
+class ShardStats(object):
+    """ Counters for a single shard
+
+    Events are counted in one-second slots, the last `window` of which are
+    kept to compute the shard's event rate.
+    """
+
+    __slots__ = ('shard_id', 'events', 'connects', 'resumes', 'disconnects',
+                 '_slots', '_second', '_count')
+
+    def __init__(self, shard_id, window=DEFAULT_RATE_WINDOW):
+        self.shard_id = shard_id
+        self.events = 0
+        self.connects = 0
+        self.resumes = 0
+        self.disconnects = 0
+        self._slots = deque(maxlen=window)
+        self._second = None
+        self._count = 0
+
+    @property
+    def reconnects(self):
+        "int: Connections made after the first one, including resumes"
+        return max(self.connects - 1, 0) + self.resumes
+
+    def record_event(self, now):
+        second = int(now)
+        if second != self._second:
+            if self._second is not None:
+                self._slots.append((self._second, self._count))
+            self._second = second
+            self._count = 0
+        self._count += 1
+        self.events += 1
+
+    def events_per_second(self, now):
+        """ Returns the average event rate over the last `window` seconds """
+        window = self._slots.maxlen
+        since = int(now) - window
+        count = sum(count for second, count in self._slots if second >= since)
+        if self._second is not None and self._second >= since:
+            count += self._count
+        return count / window
+
+class ShardMonitor(object):
+    """ Tracks gateway activity for each shard the client runs
+
+    Every dispatched event is attributed to the shard of the guild it
+    belongs to (events without a guild are attributed to the client's first
+    shard), and connection events update the shard's reconnect counters,
+    which are also reported to the bot's metrics.
+
+    Args:
+        client (:obj:`discord.Client`): The client whose shards to track
+        metrics (:obj:`dyphanbot.metrics.Metrics`): Receives reconnect counts
+        window (int, optional): Seconds the event rate is averaged over
+        clock (func, optional): Returns the current time in seconds
+
+    """
+
+    def __init__(self, client, metrics, window=DEFAULT_RATE_WINDOW, clock=time.monotonic):
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.metrics = metrics
+        self.window = window
+        self.clock = clock
+
+        self.shards = {}
+
+    def get(self, shard_id):
+        """ Returns the :obj:`ShardStats` for a shard, creating it if needed """
+        stats = self.shards.get(shard_id)
+        if stats is None:
+            stats = self.shards[shard_id] = ShardStats(shard_id, self.window)
+        return stats
+
+    def shard_for_guild(self, guild_id):
+        """ Returns the ID of the shard a guild is on """
+        shard_count = self.client.shard_count or 1
+        return (guild_id >> 22) % shard_count
+
+    @property
+    def sharded(self):
+        "bool: Whether the client runs multiple shards"
+        return isinstance(self.client, discord.AutoShardedClient)
+
+    @property
+    def default_shard(self):
+        "int: The shard events without a guild are attributed to"
+        if self.sharded:
+            return (self.client.shard_ids or [0])[0]
+        return self.client.shard_id or 0
+
+    def record(self, event, args):
+        """ Records a dispatched event (called from `Client.dispatch()`) """
+        if event in CONNECT_EVENTS or event in RESUME_EVENTS or event in DISCONNECT_EVENTS:
+            if event.startswith("shard_"):
+                self.record_connection(event, args[0])
+            elif not self.sharded:
+                # sharded clients dispatch both events; count the shard_ one
+                self.record_connection(event, self.default_shard)
+            return
+
+        guild_id = event_guild_id(args)
+        shard_id = self.shard_for_guild(guild_id) if guild_id else self.default_shard
+        self.get(shard_id).record_event(self.clock())
+
+    def record_connection(self, event, shard_id):
+        stats = self.get(shard_id)
+        if event in CONNECT_EVENTS:
+            stats.connects += 1
+            if stats.connects > 1:
+                self.metrics.incr("gateway_reconnects", shard=shard_id)
+                self.logger.info("Shard %s reconnected", shard_id)
+        elif event in RESUME_EVENTS:
+            stats.resumes += 1
+            self.metrics.incr("gateway_reconnects", shard=shard_id)
+            self.logger.info("Shard %s resumed its session", shard_id)
+        else:
+            stats.disconnects += 1
+            self.metrics.incr("gateway_disconnects", shard=shard_id)
+
+    def latencies(self):
+        """ Returns a shard ID to heartbeat latency (in seconds) dict """
+        latencies = getattr(self.client, 'latencies', None)
+        if latencies is not None:
+            return dict(latencies)
+        return {self.default_shard: self.client.latency}
+
+    def snapshot(self):
+        """ Returns a list of dicts describing each shard's state """
+        now = self.clock()
+        latencies = self.latencies()
+        guilds = {}
+        for guild in self.client.guilds:
+            shard_id = self.shard_for_guild(guild.id)
+            guilds[shard_id] = guilds.get(shard_id, 0) + 1
+
+        shards = []
+        for shard_id in sorted(set(latencies) | set(self.shards)):
+            stats = self.get(shard_id)
+            latency = latencies.get(shard_id)
+            shards.append({
+                "id": shard_id,
+                "latency": latency if latency is not None and math.isfinite(latency) else None,
+                "guilds": guilds.get(shard_id, 0),
+                "events": stats.events,
+                "events_per_second": stats.events_per_second(now),
+                "connects": stats.connects,
+                "reconnects": stats.reconnects,
+                "disconnects": stats.disconnects
+            })
+        return shards
@@ -0,0 +1,143 @@
+""" This module contains the StartupProfiler class used to time DyphanBot's
+    startup.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+class StartupProfiler(object):
+    """ Times the phases of DyphanBot's startup
+
+    Components wrap each phase of their startup in `phase()`, e.g.
+    `with profiler.phase("import audio", "import"): ...`. Phases may nest;
+    a phase's self time excludes the phases nested in it, so the report
+    shows where the time actually goes (e.g. globbing a plugin directory
+    vs. importing the plugins found in it). Phases nest per thread, so
+    plugins initialized on worker threads are timed separately.
+
+    A disabled profiler (the default for a normal run) records nothing.
+
+    Attributes:
+        enabled (bool): Whether phases are recorded
+        phases (:obj:`list` of :obj:`dict`): The recorded phases, in the
+            order they started
+
+    Args:
+        enabled (bool, optional): Whether to record phases
+
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @contextlib.contextmanager
+    def phase(self, name, category="core"):
+        """ Times the code run in the `with` block as a phase
+
+        Args:
+            name (str): What the phase does (e.g. `init Audio`)
+            category (str, optional): The kind of phase (e.g. `import` or
+                `init`); the report totals the time of each category
+
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._local.__dict__.setdefault("stack", [])
+        record = {
+            "name": name,
+            "category": category,
+            "parent": stack[-1]["id"] if stack else None,
+            "depth": len(stack),
+            "thread": threading.current_thread().name,
+            "start_ms": (time.perf_counter() - self.started) * 1000,
+            "total_ms": 0.0,
+            "self_ms": 0.0,
+            "modules": 0,
+        }
+        with self._lock:
+            record["id"] = len(self.phases)
+            self.phases.append(record)
+        stack.append(record)
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["total_ms"] = (time.perf_counter() - start) * 1000
+            record["modules"] = len(sys.modules) - modules
+            stack.pop()
+
+    def finish(self):
+        """ Marks the end of startup and computes each phase's self time """
+        self.finished = time.perf_counter()
+        for record in self.phases:
+            record["self_ms"] = record["total_ms"]
+        for record in self.phases:
+            if record["parent"] is not None:
+                self.phases[record["parent"]]["self_ms"] -= record["total_ms"]
+
+    @property
+    def total_ms(self):
+        """ float: Milliseconds from the profiler's creation to `finish()` """
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+    def categories(self):
+        """ Returns the total self time of each category, in milliseconds """
+        totals = {}
+        for record in self.phases:
+            totals[record["category"]] = totals.get(record["category"], 0.0) + record["self_ms"]
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+    def to_dict(self):
+        """ Returns the profile as a JSON-serializable dict """
+        return {
+            "total_ms": self.total_ms,
+            "modules_loaded": len(sys.modules),
+            "categories": self.categories(),
+            "phases": self.phases,
+        }
+
+    def report(self):
+        """ Returns a human-readable report listing the phases by self time,
+            slowest first
+        """
+        lines = [
+            "DyphanBot startup profile: {0:.1f}ms total, {1} phases, {2} modules loaded".format(
+                self.total_ms, len(self.phases), len(sys.modules)),
+            "",
+            "{0:>10} {1:>10} {2:>8}  {3:<10} {4}".format("self ms", "total ms", "modules", "category", "phase"),
+        ]
+        for record in sorted(self.phases, key=lambda record: record["self_ms"], reverse=True):
+            lines.append("{0:>10.1f} {1:>10.1f} {2:>8}  {3:<10} {4}".format(
+                record["self_ms"], record["total_ms"], record["modules"],
+                record["category"], record["name"]))
+        unaccounted = self.total_ms - sum(r["total_ms"] for r in self.phases if r["parent"] is None)
+        lines.append("{0:>10.1f} {1:>10} {2:>8}  {3:<10} {4}".format(
+            unaccounted, "", "", "", "(outside any phase)"))
+        lines += ["", "By category:"]
+        for category, ms in self.categories().items():
+            lines.append("{0:>10.1f}  {1}".format(ms, category))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """ Writes the profile as JSON to `path` and the report next to it
+            (with a `.txt` extension); returns the report
+        """
+        report = self.report()
+        with open(path, 'w') as fd:
+            json.dump(self.to_dict(), fd, indent=4)
+        with open(os.path.splitext(path)[0] + ".txt", 'w') as fd:
+            fd.write(report)
+        return report
@@ -0,0 +1,40 @@
+""" Storage backends used by the DataManager to persist data documents """
+
+import os
+
+from dyphanbot.exceptions import InvalidConfigurationError
+from dyphanbot.storage.base import StorageBackend
+from dyphanbot.storage.jsonfile import JSONFileBackend
+from dyphanbot.storage.redisstore import RedisBackend, FakeRedis
+from dyphanbot.storage.sqlite import SQLiteBackend
+
+# Default SQLite database file, relative to the data directory
+DEFAULT_SQLITE_PATH = "dyphanbot.db"
+
+def create_backend(config, data_dir):
+    """ Creates the storage backend selected by the `storage` config
+
+    Args:
+        config (dict): The `storage` configuration; `backend` selects the
+            backend (`json`, `sqlite`, `redis` or `fakeredis`), the `json`
+            backend also takes `cache_bytes`, the `sqlite` backend also
+            takes `path` and the `redis` backend also takes `url` and
+            `prefix`
+        data_dir (str): The active data directory
+
+    Returns:
+        :obj:`StorageBackend`: The configured backend
+
+    """
+    backend = config.get('backend', "json")
+    if backend == "json":
+        options = {key: config[key] for key in ['cache_bytes'] if key in config}
+        return JSONFileBackend(data_dir, **options)
+    if backend == "sqlite":
+        return SQLiteBackend(os.path.join(data_dir, os.path.expanduser(config.get('path', DEFAULT_SQLITE_PATH))))
+    if backend in ["redis", "fakeredis"]:
+        options = {key: config[key] for key in ['url', 'prefix'] if key in config}
+        if backend == "fakeredis":
+            options['client'] = FakeRedis()
+        return RedisBackend(**options)
+    raise InvalidConfigurationError('storage', "Unknown storage backend `{0}`".format(backend))
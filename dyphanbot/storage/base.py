@@ -0,0 +1,118 @@
+""" This module contains the StorageBackend class, the interface every storage
+    backend implements.
+"""
+
+import logging
+
+from dyphanbot.exceptions import DocumentNotFoundError
+from dyphanbot.utils import json_codec
+
+class StorageBackend(object):
+    """ Stores DyphanBot's data documents
+
+    A document is a JSON-serializable object stored under a name, which is
+    the file name relative to the data directory (e.g. `guildsettings.json`
+    or `Moderation/gsettings.json`). Backends that can be shared between
+    processes notify their subscribers when another process changes a
+    document, so in-memory copies can be reloaded.
+    """
+
+    #: str: The name the backend is selected by in the `storage` config
+    name = None
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.listeners = []
+
+    def load(self, name, **kwargs):
+        """ Returns the document stored under `name`; `**kwargs` are passed
+            to `json.loads()`
+
+        Raises:
+            DocumentNotFoundError: If no such document exists
+
+        """
+        raise NotImplementedError
+
+    def encode(self, data, **kwargs):
+        """ Serializes a document; `**kwargs` are formatting options passed
+            to `json.dumps()` by backends that keep readable files
+        """
+        return json_codec.dumps(data, **kwargs)
+
+    def write(self, name, text):
+        """ Stores an already encoded document under `name`; this may be
+            called from a worker thread
+        """
+        raise NotImplementedError
+
+    def save(self, name, data, **kwargs):
+        """ Encodes `data` and stores it under `name` """
+        self.write(name, self.encode(data, **kwargs))
+
+    def forget(self, name):
+        """ Drops any parsed copy of a document the backend keeps in memory,
+            so it's read from storage the next time it's loaded
+        """
+
+    def values_document(self, namespace):
+        """ Returns the name of the document holding a namespace's values
+            for backends without native key-level storage
+        """
+        return "{0}/values.json".format(namespace)
+
+    def _load_values(self, namespace):
+        try:
+            return self.load(self.values_document(namespace))
+        except DocumentNotFoundError:
+            return {}
+
+    def get(self, namespace, key, guild=None, default=None):
+        """ Returns a single value stored by a namespace (usually a plugin's
+            name), optionally scoped to a guild
+
+        This default implementation keeps every value of the namespace in a
+        single document; backends with native key-level storage override it.
+        """
+        values = self._load_values(namespace).get(str(guild or ""), {})
+        return values.get(key, default)
+
+    def set(self, namespace, key, value, guild=None):
+        """ Stores a single value """
+        values = self._load_values(namespace)
+        values.setdefault(str(guild or ""), {})[key] = value
+        self.save(self.values_document(namespace), values)
+
+    def delete(self, namespace, key, guild=None):
+        """ Deletes a single value; returns True if it existed """
+        values = self._load_values(namespace)
+        scope = values.get(str(guild or ""), {})
+        if key not in scope:
+            return False
+        del scope[key]
+        self.save(self.values_document(namespace), values)
+        return True
+
+    def items(self, namespace, guild=None):
+        """ Returns a dict of every value stored by a namespace for a guild
+            (or outside of any guild)
+        """
+        return dict(self._load_values(namespace).get(str(guild or ""), {}))
+
+    def subscribe(self, callback):
+        """ Calls `callback(name)` whenever another process changes a
+            document (possibly from another thread)
+        """
+        self.listeners.append(callback)
+
+    def notify(self, name):
+        """ Calls every subscriber about a changed document """
+        for callback in self.listeners:
+            try:
+                callback(name)
+            except Exception:
+                self.logger.exception("Change listener for '%s' failed", name)
+
+    def close(self):
+        """ Releases the backend's resources """
+        pass
@@ -0,0 +1,263 @@
+""" This module contains the SettingsJournal class, which records changes to a
+    settings document in an append-only journal instead of rewriting it.
+"""
+
+import os
+import logging
+
+from dyphanbot.storage.jsonfile import JSONFileBackend
+from dyphanbot.utils import json_codec
+
+# Journal size, in bytes, after which it's compacted into the snapshot
+DEFAULT_COMPACT_THRESHOLD = 256 * 1024
+
+class SettingsJournal(object):
+    """ Keeps a settings document in memory and journals each change to it
+
+    The document itself (e.g. `guildsettings.json`) is the snapshot. Every
+    `set()` or `delete()` appends one line to `<document>.journal` with a
+    single `write()`, so a change costs a small append rather than a dump
+    of the whole document, and a crash loses at most the record being
+    written (a torn last line is dropped when the journal is loaded).
+
+    Loading the journal reads the snapshot and replays the journal on top
+    of it. Once the journal grows past `threshold` bytes, it's compacted in
+    the background: it's moved aside to `<document>.journal.old`, the
+    in-memory document is written as the new snapshot, and the old journal
+    is deleted. Records are idempotent, so replaying ones the snapshot
+    already contains (after a crash mid-compaction) is harmless.
+
+    Journaling needs the JSON file storage backend. With other backends,
+    or when disabled, changes are applied in memory and the whole document
+    is saved through `DataManager.save_json()` instead.
+
+    Use `DataManager.journal()` to get a document's journal instead of
+    constructing this directly.
+
+    Attributes:
+        data (dict): The current document; change it only through `set()`
+            and `delete()`
+        enabled (bool): Whether changes are journaled
+
+    Args:
+        datamanager (:obj:`dyphanbot.datamanager.DataManager`): The data
+            manager the snapshot is stored through
+        filename (str): The document's filename in the data directory
+        initial_data (dict, optional): The document to start with if none
+            exists
+        threshold (int, optional): Journal size in bytes that triggers a
+            compaction
+        enabled (bool, optional): Whether to journal changes (ignored with
+            storage backends other than JSON files)
+        fsync (bool, optional): Whether to `fsync()` every record, so even
+            a power loss can't lose acknowledged changes
+
+    """
+
+    def __init__(self, datamanager, filename, initial_data=None,
+                 threshold=DEFAULT_COMPACT_THRESHOLD, enabled=True, fsync=False):
+        self.logger = logging.getLogger(__name__)
+        self.datamanager = datamanager
+        self.filename = filename
+        self.initial_data = initial_data if initial_data is not None else {}
+        self.threshold = threshold
+        self.enabled = enabled and isinstance(datamanager.backend, JSONFileBackend)
+        self.fsync = fsync
+
+        self.path = None
+        if self.enabled:
+            self.path = datamanager.backend.path(filename) + ".journal"
+        self.data = None
+        self._fd = None
+        self._size = 0
+        self._task = None
+        self.load()
+
+    @property
+    def old_path(self):
+        """ str: Where the journal is moved to while it's being compacted """
+        return self.path + ".old"
+
+    def load(self):
+        """ (Re)loads the snapshot, replays the journal on top of it and
+            returns the resulting document
+        """
+        self.close()
+        data = self.datamanager.load_json(
+            self.filename, dict(self.initial_data), save_json=self._create_snapshot)
+        if not self.enabled:
+            self.data = data
+            return data
+
+        interrupted = os.path.exists(self.old_path)
+        replayed = 0
+        if interrupted:
+            replayed += self._replay(data, self.old_path)
+        replayed += self._replay(data, self.path)
+        self.data = data
+        if replayed:
+            self.logger.info("Replayed %d journaled changes to '%s'.", replayed, self.filename)
+
+        if interrupted:
+            # a compaction didn't finish; finish it before appending again
+            self.compact_sync()
+        else:
+            self._open()
+        return data
+
+    def _create_snapshot(self, filename, data):
+        """ Writes the initial snapshot right away, so it (and its
+            directory) exists before anything is appended to the journal
+        """
+        if self.datamanager.write_buffer is not None:
+            self.datamanager.write_buffer.discard(filename)
+        self.datamanager.backend.save(filename, data)
+        return data
+
+    def _replay(self, data, path):
+        """ Applies every record in a journal file; returns how many """
+        try:
+            with open(path, 'rb') as fd:
+                raw = fd.read()
+        except FileNotFoundError:
+            return 0
+
+        end = raw.rfind(b"\n") + 1
+        if end < len(raw):
+            self.logger.warning("Dropping a partially written record from '%s'", path)
+            os.truncate(path, end)
+
+        count = 0
+        for line in raw[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(data, json_codec.loads(line))
+                count += 1
+            except (ValueError, TypeError, KeyError, AttributeError):
+                self.logger.warning("Skipping an invalid record in '%s': %r", path, line)
+        return count
+
+    @staticmethod
+    def _apply(data, record):
+        """ Applies a single record to a document """
+        if "set" in record:
+            *parents, key = record["set"]
+            target = data
+            for part in parents:
+                if not isinstance(target.get(part), dict):
+                    target[part] = {}
+                target = target[part]
+            target[key] = record["value"]
+        elif "delete" in record:
+            *parents, key = record["delete"]
+            target = data
+            for part in parents:
+                target = target.get(part)
+                if not isinstance(target, dict):
+                    return
+            target.pop(key, None)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+
+    def _append(self, record):
+        if not self.enabled:
+            self.datamanager.save_json(self.filename, self.data)
+            return
+
+        line = (json_codec.dumps_compact(record) + "\n").encode()
+        os.write(self._fd, line)
+        if self.fsync:
+            os.fsync(self._fd)
+        self._size += len(line)
+        if self._size >= self.threshold:
+            self.schedule_compaction()
+
+    def set(self, path, value):
+        """ Sets a value in the document and journals the change
+
+        Args:
+            path (:obj:`list` of :obj:`str`): The keys leading to the value;
+                missing dicts along the way are created
+            value: The JSON-serializable value
+
+        Returns:
+            The value
+
+        """
+        record = {"set": [str(part) for part in path], "value": value}
+        self._apply(self.data, record)
+        self._append(record)
+        return value
+
+    def delete(self, path):
+        """ Deletes a value from the document (if it exists) and journals the
+            change
+        """
+        record = {"delete": [str(part) for part in path]}
+        self._apply(self.data, record)
+        self._append(record)
+
+    def schedule_compaction(self):
+        """ Compacts the journal in the background (or right away if the
+            event loop isn't running)
+        """
+        loop = self.datamanager.running_loop()
+        if loop is None:
+            self.compact_sync()
+        elif not self.datamanager.on_loop():
+            # e.g. a plugin changing settings while it's initialized
+            loop.call_soon_threadsafe(self.schedule_compaction)
+        elif self._task is None:
+            self._task = loop.create_task(self.compact())
+
+    def _rotate(self):
+        """ Moves the journal aside and starts a new one """
+        os.close(self._fd)
+        self._fd = None
+        if os.path.exists(self.old_path):
+            # a previous compaction failed; keep its records along with ours
+            with open(self.path, 'rb') as src, open(self.old_path, 'ab') as dst:
+                dst.write(src.read())
+            os.unlink(self.path)
+        else:
+            os.replace(self.path, self.old_path)
+        self._open()
+
+    async def compact(self):
+        """ Writes the document as the new snapshot and drops the journaled
+            records it contains
+        """
+        try:
+            async with self.datamanager.file_lock(self.filename):
+                self._rotate()
+                # encode on the loop so the document can't change meanwhile
+                text = self.datamanager.backend.encode(self.data)
+                if self.datamanager.write_buffer is not None:
+                    self.datamanager.write_buffer.discard(self.filename)
+                await self.datamanager.run_io(self.datamanager.backend.write, self.filename, text)
+                os.unlink(self.old_path)
+            self.logger.debug("Compacted the journal of '%s'.", self.filename)
+        except Exception:
+            self.logger.exception("Failed to compact the journal of '%s'", self.filename)
+        finally:
+            self._task = None
+
+    def compact_sync(self):
+        """ Compacts the journal synchronously """
+        if self._fd is None:
+            self._open()
+        self._rotate()
+        if self.datamanager.write_buffer is not None:
+            self.datamanager.write_buffer.discard(self.filename)
+        self.datamanager.backend.save(self.filename, self.data)
+        os.unlink(self.old_path)
+
+    def close(self):
+        """ Closes the journal file; records already written are kept """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
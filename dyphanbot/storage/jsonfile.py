@@ -0,0 +1,148 @@
+""" This module contains the JSONFileBackend class, which keeps each document in
+    its own JSON file in the data directory.
+"""
+
+import os
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+
+from dyphanbot.exceptions import DocumentNotFoundError
+from dyphanbot.storage.base import StorageBackend
+from dyphanbot.utils import json_codec
+
+# Permissions of newly created files (temporary files are created private)
+DEFAULT_FILE_MODE = 0o644
+
+# Default size, in bytes of JSON, of the parsed documents kept in memory
+DEFAULT_CACHE_BYTES = 16 * 1024 * 1024
+
+def copy_document(data):
+    """ Returns a deep copy of a decoded JSON document (much faster than
+        `copy.deepcopy()`, since it only has to handle dicts and lists)
+    """
+    if isinstance(data, dict):
+        return {key: copy_document(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [copy_document(value) for value in data]
+    return data
+
+class JSONFileBackend(StorageBackend):
+    """ Stores each document as a JSON file in the data directory
+
+    This is the default backend. Files aren't watched, so it's meant for a
+    single bot process.
+
+    Loaded documents are cached along with their file's modification time,
+    size and inode, and a file is only parsed again once one of those
+    changes (atomic writes always change the inode) or the document is
+    saved through this backend. Loading a file that hasn't changed costs a
+    `stat()` call and a copy of the cached document, so callers may change
+    what they load without affecting later loads. The least recently
+    loaded documents are dropped once the cached files add up to more than
+    `cache_bytes`. The cache is locked, since documents are loaded and
+    written from worker threads too.
+
+    Args:
+        data_dir (str): The directory document names are relative to
+        cache_bytes (int, optional): The combined file size of the
+            documents kept in memory (0 disables the cache)
+
+    """
+
+    name = "json"
+
+    def __init__(self, data_dir, cache_bytes=DEFAULT_CACHE_BYTES):
+        super().__init__()
+        self.data_dir = data_dir
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        self.cache_size = 0
+        self._cache_lock = threading.Lock()
+
+    def path(self, name):
+        """ Returns the path of the file a document is stored in """
+        return os.path.join(self.data_dir, name)
+
+    @staticmethod
+    def signature(stat):
+        """ Returns the parts of a file's stat that change when it's written """
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def load(self, name, **kwargs):
+        filepath = self.path(name)
+        try:
+            if kwargs:
+                # custom decoding options; don't share the result
+                with open(filepath, 'rb') as fd:
+                    return json_codec.loads(fd.read(), **kwargs)
+
+            signature = self.signature(os.stat(filepath))
+            with self._cache_lock:
+                cached = self.cache.get(name)
+                if cached is not None and cached[0] == signature:
+                    self.cache.move_to_end(name)
+                else:
+                    cached = None
+            if cached is not None:
+                # cached documents are never changed, so copy outside the lock
+                return copy_document(cached[1])
+            with open(filepath, 'rb') as fd:
+                data = json_codec.loads(fd.read())
+                signature = self.signature(os.fstat(fd.fileno()))
+        except (OSError, IOError):
+            self.forget(name)
+            raise DocumentNotFoundError(name)
+        self._store(name, signature, data)
+        return copy_document(data)
+
+    def _store(self, name, signature, data):
+        with self._cache_lock:
+            self._forget(name)
+            size = signature[1]
+            if size > self.cache_bytes:
+                return
+            self.cache[name] = (signature, data)
+            self.cache_size += size
+            while self.cache_size > self.cache_bytes:
+                _, (evicted, _) = self.cache.popitem(last=False)
+                self.cache_size -= evicted[1]
+
+    def _forget(self, name):
+        cached = self.cache.pop(name, None)
+        if cached is not None:
+            self.cache_size -= cached[0][1]
+
+    def forget(self, name):
+        with self._cache_lock:
+            self._forget(name)
+
+    def write(self, name, text):
+        """ Writes the file atomically: the document is written to a
+            temporary file in the same directory, which then replaces the
+            old file, so a crash can't leave a truncated file behind
+        """
+        filepath = self.path(name)
+        directory = os.path.dirname(filepath)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            mode = stat.S_IMODE(os.stat(filepath).st_mode)
+        except FileNotFoundError:
+            mode = DEFAULT_FILE_MODE
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=".{0}.".format(os.path.basename(filepath)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as tmp:
+                os.fchmod(tmp.fileno(), mode)
+                tmp.write(text)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            self.forget(name)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
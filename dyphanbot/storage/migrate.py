@@ -0,0 +1,134 @@
+""" This module contains the JSONMigration class, which imports the JSON files
+    in the data directory into the configured storage backend.
+"""
+
+import os
+import logging
+
+from dyphanbot.datamanager import ConfigManager
+from dyphanbot.exceptions import DocumentNotFoundError
+from dyphanbot.storage import create_backend
+from dyphanbot.storage.journal import SettingsJournal
+from dyphanbot.utils import json_codec
+
+class JSONMigration(object):
+    """ Imports every JSON data file into the configured storage backend
+
+    Each file in the data directory (and its plugin subdirectories) that
+    holds valid JSON is stored as a document under its path relative to the
+    data directory, which is the name `DataManager.load_json()` looks it up
+    by. Values stored through the key-level API (`<namespace>/values.json`)
+    are imported value by value. Changes to settings documents that are
+    still in their journal (see
+    :obj:`dyphanbot.storage.journal.SettingsJournal`) are replayed onto
+    the document before it's imported. The config file and temporary files
+    are skipped.
+
+    Args:
+        config_path (str, optional): Path to the config file
+        overwrite (bool, optional): Replace documents that already exist in
+            the backend (skipped by default)
+
+    """
+
+    def __init__(self, config_path=None, overwrite=False, **kwargs):
+        self.logger = logging.getLogger(__name__)
+        self.config = ConfigManager(self, config_path)
+        self.data_dir = self.config.data_dir
+        self.storage_config = self.config.config.storage
+        self.overwrite = overwrite
+
+    def find_documents(self):
+        """ Yields the name and path of every JSON file in the data directory """
+        config_path = os.path.abspath(self.config.config_path)
+        for root, dirs, files in os.walk(self.data_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d != "plugins"]
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.data_dir)
+                if os.path.abspath(path) == config_path or name == self.config._config_fn:
+                    continue
+                if filename.startswith('.') or filename.endswith(('.tmp', '.journal', '.journal.old')):
+                    continue
+                yield name, path
+
+    def replay_journals(self, name, path, data):
+        """ Applies the records journaled for a document to its data;
+            returns how many were applied
+        """
+        count = 0
+        for journal_path in (path + ".journal.old", path + ".journal"):
+            try:
+                with open(journal_path, 'rb') as fd:
+                    lines = fd.read().split(b"\n")
+            except FileNotFoundError:
+                continue
+            # the last element is empty, or a partially written record
+            for line in lines[:-1]:
+                if not line.strip():
+                    continue
+                try:
+                    SettingsJournal._apply(data, json_codec.loads(line))
+                    count += 1
+                except (ValueError, TypeError, KeyError, AttributeError):
+                    self.logger.warning("Skipping an invalid record in '%s': %r", journal_path, line)
+        if count:
+            self.logger.info("Replayed %d journaled changes to '%s'", count, name)
+        return count
+
+    def import_values(self, backend, namespace, values):
+        """ Imports a namespace's key-level values; returns 1 if any were
+            imported
+        """
+        count = 0
+        for guild, entries in values.items():
+            for key, value in entries.items():
+                if not self.overwrite and backend.get(namespace, key, guild or None) is not None:
+                    continue
+                backend.set(namespace, key, value, guild or None)
+                count += 1
+        self.logger.info("Imported %d values of '%s'", count, namespace)
+        return 1 if count else 0
+
+    def run(self):
+        """ Runs the migration and returns the number of imported documents """
+        if self.storage_config.get('backend', "json") == "json":
+            self.logger.error("The configured storage backend is `json`; "
+                              "set `storage.backend` to the backend to migrate to.")
+            return 0
+
+        backend = create_backend(self.storage_config, self.data_dir)
+        imported = 0
+        try:
+            for name, path in self.find_documents():
+                try:
+                    with open(path, 'r') as fd:
+                        text = fd.read()
+                    data = json_codec.loads(text)
+                except (OSError, UnicodeDecodeError, ValueError):
+                    self.logger.debug("Skipping '%s' (not a JSON file)", name)
+                    continue
+                if isinstance(data, dict) and self.replay_journals(name, path, data):
+                    text = backend.encode(data)
+
+                namespace = os.path.dirname(name)
+                if namespace and name == backend.values_document(namespace):
+                    imported += self.import_values(backend, namespace, data)
+                    continue
+
+                if not self.overwrite:
+                    try:
+                        backend.load(name)
+                        self.logger.info("Skipping '%s' (already in the backend)", name)
+                        continue
+                    except DocumentNotFoundError:
+                        pass
+
+                backend.write(name, text)
+                imported += 1
+                self.logger.info("Imported '%s'", name)
+        finally:
+            backend.close()
+
+        self.logger.info("Imported %d documents into the '%s' backend.", imported, backend.name)
+        return imported
@@ -0,0 +1,153 @@
+""" This module contains the RedisBackend class, which shares documents between
+    processes through a Redis server, and FakeRedis, an in-process stand-in
+    for a Redis client.
+"""
+
+import uuid
+import threading
+
+from dyphanbot.exceptions import DocumentNotFoundError, InvalidConfigurationError
+from dyphanbot.storage.base import StorageBackend
+from dyphanbot.utils import json_codec
+
+class RedisBackend(StorageBackend):
+    """ Stores documents in Redis and publishes their changes
+
+    Each document is stored as a JSON string under `<prefix>doc:<name>`.
+    Every save is published on the `<prefix>changes` channel along with the
+    saving process' ID; the other processes using the same server receive
+    it through a subscriber thread and notify their listeners, which takes
+    a few milliseconds on a local network.
+
+    Args:
+        url (str, optional): The Redis server URL
+        prefix (str, optional): Prefixed to every key and channel
+        client (optional): A Redis client to use instead of connecting to
+            `url` (e.g. a :obj:`FakeRedis`)
+
+    """
+
+    name = "redis"
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="dyphanbot:", client=None):
+        super().__init__()
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise InvalidConfigurationError(
+                    'storage', "The redis storage backend requires the `redis` package")
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+        self.channel = prefix + "changes"
+        self.origin = uuid.uuid4().hex
+
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=0.01, daemon=True)
+
+    def key(self, name):
+        """ Returns the key a document is stored under """
+        return "{0}doc:{1}".format(self.prefix, name.replace('\\', '/'))
+
+    def load(self, name, **kwargs):
+        raw = self.client.get(self.key(name))
+        if raw is None:
+            raise DocumentNotFoundError(name)
+        return json_codec.loads(raw, **kwargs)
+
+    def encode(self, data, **kwargs):
+        # formatting options don't matter here, keep documents compact
+        return json_codec.dumps_compact(data)
+
+    def write(self, name, text):
+        self.client.set(self.key(name), text)
+        self.client.publish(self.channel, json_codec.dumps_compact({"origin": self.origin, "name": name}))
+
+    def _on_message(self, message):
+        try:
+            change = json_codec.loads(message['data'])
+        except (TypeError, ValueError):
+            self.logger.warning("Ignoring invalid change notification: %r", message['data'])
+            return
+        if change.get("origin") != self.origin:
+            self.notify(change["name"])
+
+    def close(self):
+        self._thread.stop()
+        self._pubsub.close()
+
+class FakeRedis(object):
+    """ An in-process stand-in for the subset of the `redis.Redis` client
+        used by :obj:`RedisBackend`
+
+    Clients created with the same `server` dict share their data and
+    channels, which makes them behave like several processes connected to
+    one Redis server. Published messages are delivered synchronously.
+
+    Args:
+        server (dict, optional): The shared server state
+
+    """
+
+    def __init__(self, server=None):
+        if server is None:
+            server = {}
+        server.setdefault("data", {})
+        server.setdefault("channels", {})
+        server.setdefault("lock", threading.Lock())
+        self.server = server
+
+    def get(self, key):
+        return self.server["data"].get(key)
+
+    def set(self, key, value):
+        if isinstance(value, str):
+            value = value.encode()
+        with self.server["lock"]:
+            self.server["data"][key] = value
+        return True
+
+    def delete(self, *keys):
+        with self.server["lock"]:
+            return sum(self.server["data"].pop(key, None) is not None for key in keys)
+
+    def publish(self, channel, message):
+        if isinstance(message, str):
+            message = message.encode()
+        handlers = list(self.server["channels"].get(channel, ()))
+        for handler in handlers:
+            handler({"type": "message", "channel": channel.encode(), "data": message})
+        return len(handlers)
+
+    def pubsub(self, **kwargs):
+        return FakePubSub(self)
+
+class FakePubSub(object):
+    """ The :obj:`FakeRedis` counterpart of `redis.client.PubSub` """
+
+    def __init__(self, client):
+        self.client = client
+        self.handlers = {}
+
+    def subscribe(self, **handlers):
+        channels = self.client.server["channels"]
+        for channel, handler in handlers.items():
+            self.handlers[channel] = handler
+            channels.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, sleep_time=0, daemon=False):
+        # messages are delivered by `FakeRedis.publish()` directly
+        return self
+
+    def stop(self):
+        pass
+
+    def close(self):
+        channels = self.client.server["channels"]
+        for channel, handler in self.handlers.items():
+            if handler in channels.get(channel, []):
+                channels[channel].remove(handler)
+        self.handlers = {}
@@ -0,0 +1,113 @@
+""" This module contains the SQLiteBackend class, which stores documents and
+    individual values in an SQLite database.
+"""
+
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor
+
+from dyphanbot.exceptions import DocumentNotFoundError
+from dyphanbot.storage.base import StorageBackend
+from dyphanbot.utils import json_codec
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    guild TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, guild, key)
+);
+"""
+
+class SQLiteBackend(StorageBackend):
+    """ Stores documents and key-level values in an SQLite database
+
+    Whole documents (as saved through `DataManager.save_json()`) are kept
+    in the `documents` table. Values set through the key-level API get a
+    row each in the `entries` table, keyed by namespace (usually a plugin's
+    name), guild and key, so changing one guild's setting writes one row.
+
+    The database runs in WAL mode so readers don't block the writer. Its
+    connection is owned by a dedicated worker thread; every query runs on
+    that thread.
+
+    Args:
+        path (str): Path to the database file
+
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="dyphanbot-sqlite", initializer=self._connect)
+        self._call(self._setup)
+
+    def _connect(self):
+        # autocommit mode; each statement is its own transaction
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def _setup(self):
+        self._conn.executescript(SCHEMA)
+
+    def _call(self, func, *args):
+        """ Runs `func` on the connection's thread and returns its result """
+        return self._executor.submit(func, *args).result()
+
+    def _query(self, sql, params=()):
+        return self._conn.execute(sql, params).fetchall()
+
+    def load(self, name, **kwargs):
+        rows = self._call(self._query, "SELECT data FROM documents WHERE name = ?", (name,))
+        if not rows:
+            raise DocumentNotFoundError(name)
+        return json_codec.loads(rows[0][0], **kwargs)
+
+    def encode(self, data, **kwargs):
+        return json_codec.dumps_compact(data)
+
+    def write(self, name, text):
+        self._call(self._query,
+                   "INSERT OR REPLACE INTO documents (name, data) VALUES (?, ?)", (name, text))
+
+    def get(self, namespace, key, guild=None, default=None):
+        rows = self._call(self._query,
+                          "SELECT value FROM entries WHERE namespace = ? AND guild = ? AND key = ?",
+                          (namespace, str(guild or ""), key))
+        return json_codec.loads(rows[0][0]) if rows else default
+
+    def set(self, namespace, key, value, guild=None):
+        self._call(self._query,
+                   "INSERT OR REPLACE INTO entries (namespace, guild, key, value) VALUES (?, ?, ?, ?)",
+                   (namespace, str(guild or ""), key, json_codec.dumps_compact(value)))
+
+    def _delete(self, namespace, guild, key):
+        return self._conn.execute(
+            "DELETE FROM entries WHERE namespace = ? AND guild = ? AND key = ?",
+            (namespace, guild, key)).rowcount
+
+    def delete(self, namespace, key, guild=None):
+        return self._call(self._delete, namespace, str(guild or ""), key) > 0
+
+    def items(self, namespace, guild=None):
+        rows = self._call(self._query,
+                          "SELECT key, value FROM entries WHERE namespace = ? AND guild = ?",
+                          (namespace, str(guild or "")))
+        return {key: json_codec.loads(value) for key, value in rows}
+
+    def _close(self):
+        self._conn.close()
+
+    def close(self):
+        self._call(self._close)
+        self._executor.shutdown()
@@ -0,0 +1,125 @@
+""" This module contains the WriteBehindBuffer class, which coalesces document
+    saves and writes them off the event loop.
+"""
+
+import asyncio
+import logging
+
+# Default number of seconds between a document being saved and written
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+class WriteBehindBuffer(object):
+    """ Defers and coalesces saves to a storage backend
+
+    Saving a document marks it dirty and schedules a flush `interval`
+    seconds later, so a burst of saves to the same document results in a
+    single write. A flush encodes every dirty document on the event loop
+    (so the data isn't mutated while it's being serialized) and writes them
+    in the executor. Documents that are dirty or being written are served
+    from memory by `get()`, so reads never see an older version than the
+    last save.
+
+    When a `lock` factory is given, each write holds the document's lock,
+    and a write is skipped if the document was `discard()`ed (written
+    directly) in the meantime.
+
+    Args:
+        backend (:obj:`dyphanbot.storage.StorageBackend`): Where documents
+            are written to
+        interval (float, optional): Seconds to wait before flushing
+        executor (:obj:`concurrent.futures.Executor`, optional): Runs the
+            writes (defaults to the loop's default executor)
+        lock (func, optional): Returns the :obj:`asyncio.Lock` guarding a
+            document's writes, given its name
+
+    """
+
+    def __init__(self, backend, interval=DEFAULT_FLUSH_INTERVAL, executor=None, lock=None):
+        self.logger = logging.getLogger(__name__)
+        self.backend = backend
+        self.interval = interval
+        self.executor = executor
+        self.lock = lock
+
+        self.dirty = {}
+        self.writing = {}
+        self._task = None
+        self._lock = None
+
+    def get(self, name):
+        """ Returns the pending `(data, kwargs)` for a document, or None if
+            it has no pending changes
+        """
+        return self.dirty.get(name) or self.writing.get(name)
+
+    def discard(self, name):
+        """ Drops a document's pending changes """
+        self.dirty.pop(name, None)
+        self.writing.pop(name, None)
+
+    def save(self, name, data, **kwargs):
+        """ Marks a document dirty and schedules a flush on the running loop """
+        self.dirty[name] = (data, kwargs)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            while self.dirty:
+                await asyncio.sleep(self.interval)
+                await self.flush()
+        finally:
+            self._task = None
+
+    async def flush(self):
+        """ Writes every dirty document in the executor, after any flush
+            already in progress has finished
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self.dirty:
+            return
+        loop = asyncio.get_event_loop()
+        batch, self.dirty = self.dirty, {}
+        self.writing.update(batch)
+        try:
+            writes = []
+            for name, pending in batch.items():
+                data, kwargs = pending
+                text = self.backend.encode(data, **kwargs)
+                writes.append(self._write(loop, name, pending, text))
+            results = await asyncio.gather(*writes, return_exceptions=True)
+        finally:
+            for name in batch:
+                self.writing.pop(name, None)
+
+        for (name, pending), result in zip(batch.items(), results):
+            if isinstance(result, BaseException):
+                self.logger.error("Failed to write '%s': %s; retrying.", name, result)
+                self.dirty.setdefault(name, pending)
+        if self.dirty and self._task is None:
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    async def _write(self, loop, name, pending, text):
+        if self.lock is None:
+            return await loop.run_in_executor(self.executor, self.backend.write, name, text)
+        async with self.lock(name):
+            if self.writing.get(name) is not pending:
+                # discarded while waiting for the lock
+                return
+            await loop.run_in_executor(self.executor, self.backend.write, name, text)
+
+    def flush_sync(self):
+        """ Writes every pending document synchronously (used on shutdown) """
+        batch, self.dirty = self.dirty, {}
+        for name, (data, kwargs) in batch.items():
+            try:
+                self.backend.save(name, data, **kwargs)
+            except Exception:
+                self.logger.exception("Failed to write '%s' on shutdown", name)
+        if batch:
+            self.logger.info("Flushed %d pending documents.", len(batch))
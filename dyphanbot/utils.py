@@ -1,4 +1,6 @@
 import re
+import json
+import functools
 
 """
 DyphanBot Utility Functions
@@ -16,15 +18,18 @@ def truncate(text, limit, ellipsis='...'):
     """Generic function that truncates long text by a specified limit"""
     return text[:limit] + (text[limit:] and ellipsis)
 
+@functools.lru_cache(maxsize=8)
+def bot_mention_pattern(bot_uid):
+    """ Returns the compiled mention regex for a bot user ID. """
+    return re.compile(rf'<@!?{bot_uid}>')
+
 def has_bot_mention(dyphanbot, text):
     """ Returns True if `text` contains a bot mention, False if otherwise. """
-    bot_uid = dyphanbot.user.id
-    return bool(re.search(rf'<@!?{bot_uid}>', text))
+    return bot_mention_pattern(dyphanbot.user.id).search(text) is not None
 
 def remove_bot_mention(dyphanbot, text, count=0):
     """ Removes bot mention from `text` by replacing it with an empty string. """
-    bot_uid = dyphanbot.user.id
-    return re.sub(rf'<@!?{bot_uid}>', "", text, count)
+    return bot_mention_pattern(dyphanbot.user.id).sub("", text, count)
 
 def parse_command(dyphanbot, message, prefix=None, force_prefix=False):
     """ Parse a command message into the command name and arguments """
@@ -33,8 +38,82 @@ def parse_command(dyphanbot, message, prefix=None, force_prefix=False):
         if force_prefix and not cmd.startswith(prefix):
             return None
         cmd = cmd[cmd.startswith(prefix) and len(prefix):].strip()
-    args = cmd.split()[1:]
-    return (cmd.split(), args)
+    full_cmd = cmd.split()
+    return (full_cmd, full_cmd[1:])
+
+class ParsedMessage(object):
+    """ A message's content tokenized once and shared by the core and plugins
+
+    The bot mention is stripped in a single regex pass, then the text is
+    matched against the guild's command prefix and extension prefix. Only
+    the command token is split eagerly; the argument list is split the
+    first time it's accessed.
+
+    Use `DyphanBot.parse_message()` to get the cached instance for a
+    message instead of constructing this directly.
+
+    Attributes:
+        content (str): The raw message content
+        text (str): The content with bot mentions removed
+        mentioned (bool): Whether the content mentions the bot
+        prefix_kind (str): One of `PREFIX`, `EXT_PREFIX` or `MENTION`, or
+            None if the message is neither prefixed nor mentions the bot
+        prefix (str): The prefix the text starts with, if any
+        body (str): The text with the prefix removed
+        command (str): The first token of `body` (empty if there is none)
+
+    Args:
+        dyphanbot (:obj:`dyphanbot.DyphanBot`): The main DyphanBot object
+        content (str): The message content to parse
+        prefix (str, optional): The guild's command prefix
+        ext_prefix (str, optional): The guild's extension prefix
+
+    """
+
+    PREFIX = "prefix"
+    EXT_PREFIX = "ext_prefix"
+    MENTION = "mention"
+
+    __slots__ = ('content', 'text', 'mentioned', 'prefix_kind', 'prefix',
+                 'body', 'command', '_tokens')
+
+    def __init__(self, dyphanbot, content, prefix=None, ext_prefix=None):
+        self.content = content
+        text, count = bot_mention_pattern(dyphanbot.user.id).subn("", content)
+        self.text = text.strip()
+        self.mentioned = count > 0
+        self.prefix_kind = self.MENTION if self.mentioned else None
+        self.prefix = None
+        self.body = self.text
+        self._tokens = None
+
+        # the longer prefix wins when one is a prefix of the other
+        candidates = [(prefix, self.PREFIX), (ext_prefix, self.EXT_PREFIX)]
+        if prefix and ext_prefix and len(ext_prefix) > len(prefix):
+            candidates.reverse()
+        for candidate, kind in candidates:
+            if candidate and self.text.startswith(candidate):
+                self.prefix_kind = kind
+                self.prefix = candidate
+                self.body = self.text[len(candidate):].strip()
+                break
+
+        self.command = self.body.split(None, 1)[0] if self.body else ""
+
+    def __repr__(self):
+        return "<ParsedMessage prefix_kind={0.prefix_kind!r} command={0.command!r}>".format(self)
+
+    @property
+    def tokens(self):
+        """ list of str: Every whitespace-separated token in `body` """
+        if self._tokens is None:
+            self._tokens = self.body.split()
+        return self._tokens
+
+    @property
+    def args(self):
+        """ list of str: The tokens following the command """
+        return self.tokens[1:]
 
 def parse_reigon(text, start, end, strip=True):
     matches = re.findall("{0}(.*?){1}".format(start, end), text, flags=re.DOTALL)
@@ -51,4 +130,80 @@ def secs_to_hms(seconds):
     min, sec = divmod(int(seconds), 60)
     hrs, min = divmod(min, 60)
     dfmtstr = "{0:d}:{1:02d}:{2:02d}" if hrs > 0 else "{1:d}:{2:02d}"
-    return dfmtstr.format(hrs, min, sec)
\ No newline at end of file
+    return dfmtstr.format(hrs, min, sec)
+
+def _native_json():
+    """ Returns the name, decoder and compact encoder of the fastest
+        installed JSON library, or None if neither is installed
+    """
+    try:
+        import orjson
+        return ("orjson", orjson.loads,
+                lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode())
+    except ImportError:
+        pass
+    try:
+        import msgspec
+        encoder = msgspec.json.Encoder()
+        return ("msgspec", msgspec.json.decode, lambda obj: encoder.encode(obj).decode())
+    except ImportError:
+        return None
+
+class JSONCodec(object):
+    """ Encodes and decodes JSON with the fastest available library
+
+    `orjson` or `msgspec` is used when installed, with the `json` module as
+    the fallback for everything they reject (e.g. `NaN` or integers over
+    64 bits) and when `json` options are passed, so the results and errors
+    are always what `json` would give.
+
+    `dumps()` always produces exactly what `json.dumps()` does, since data
+    files are meant to stay byte-identical whichever library is installed;
+    use `dumps_compact()` wherever the formatting doesn't matter (web API
+    responses, database rows, messages between processes).
+
+    Attributes:
+        name (str): The library in use (`orjson`, `msgspec` or `json`)
+
+    Args:
+        native (bool, optional): Whether to use a native library if one is
+            installed
+
+    """
+
+    def __init__(self, native=True):
+        backend = _native_json() if native else None
+        if backend is None:
+            backend = ("json", None, None)
+        self.name, self._loads, self._dumps = backend
+
+    def loads(self, data, **kwargs):
+        """ Decodes a JSON `str` or `bytes`; `**kwargs` are passed to
+            `json.loads()`
+        """
+        if self._loads is not None and not kwargs:
+            try:
+                return self._loads(data)
+            except Exception:
+                # let `json` raise its usual error (or accept what the
+                # native library rejected)
+                pass
+        return json.loads(data, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        """ Encodes `obj` exactly like `json.dumps(obj, **kwargs)` """
+        return json.dumps(obj, **kwargs)
+
+    def dumps_compact(self, obj):
+        """ Encodes `obj` as compact UTF-8 JSON (no whitespace or escaped
+            non-ASCII characters)
+        """
+        if self._dumps is not None:
+            try:
+                return self._dumps(obj)
+            except Exception:
+                pass
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+#: :obj:`JSONCodec`: The codec used by DyphanBot's storage and web API
+json_codec = JSONCodec()
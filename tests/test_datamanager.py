@@ -0,0 +1,81 @@
+""" Tests for loading and saving data through the DataManager from different
+    threads
+"""
+
+import os
+import sys
+import json
+import types
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dyphanbot.datamanager import DataManager
+
+def make_datamanager(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"token": "test"}))
+    bot = types.SimpleNamespace(loop=None)
+    return bot, DataManager(bot, str(config_path))
+
+def test_save_from_worker_thread(tmp_path):
+    bot, data = make_datamanager(tmp_path)
+
+    async def main():
+        bot.loop = asyncio.get_running_loop()
+        loop = bot.loop
+        # e.g. a plugin creating its data file while initialized on a thread
+        loaded = await loop.run_in_executor(None, data.load_json, "Plugin/data.json", {"a": 1})
+        assert loaded == {"a": 1}
+        assert json.loads((tmp_path / "Plugin" / "data.json").read_text()) == {"a": 1}
+
+        await loop.run_in_executor(None, data.save_json, "Plugin/data.json", {"a": 2})
+        assert data.load_json("Plugin/data.json") == {"a": 2}
+
+    try:
+        asyncio.run(main())
+    finally:
+        data.close()
+
+def test_save_on_loop_is_buffered(tmp_path):
+    bot, data = make_datamanager(tmp_path)
+
+    async def main():
+        bot.loop = asyncio.get_running_loop()
+        data.save_json("Plugin/data.json", {"a": 3})
+        assert not (tmp_path / "Plugin" / "data.json").exists()
+        await data.flush()
+        assert json.loads((tmp_path / "Plugin" / "data.json").read_text()) == {"a": 3}
+
+    try:
+        asyncio.run(main())
+    finally:
+        data.close()
+
+def test_buffered_document_is_copied(tmp_path):
+    bot, data = make_datamanager(tmp_path)
+
+    async def main():
+        bot.loop = asyncio.get_running_loop()
+        data.save_json("Plugin/data.json", {"a": 4})
+        loaded = data.load_json("Plugin/data.json")
+        loaded["junk"] = 1
+        assert data.load_json("Plugin/data.json") == {"a": 4}
+        await data.flush()
+        assert json.loads((tmp_path / "Plugin" / "data.json").read_text()) == {"a": 4}
+
+    try:
+        asyncio.run(main())
+    finally:
+        data.close()
+
+def test_journal_shared_between_threads(tmp_path):
+    _, data = make_datamanager(tmp_path)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            journals = list(executor.map(lambda _: data.journal("Plugin/settings.json"), range(32)))
+        assert all(journal is journals[0] for journal in journals)
+    finally:
+        data.close()